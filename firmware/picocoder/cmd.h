@@ -26,12 +26,15 @@
 
 // picocode glitching commands
 #define P_CMD_ARM					0x20	/* Enable glitch handler						*/
+#define P_CMD_ARM_SETTINGS			0x21	/* Set all glitch parameters and arm in a single frame */
+#define P_CMD_ARM_BATCH				0x22	/* Upload a block of glitch parameters and run them back to back */
 
 #define P_CMD_FORCE					0x30	/* Force write to PMBus to perform a glitch		*/
 #define P_CMD_SET_VOLTAGE			0x31	/* Set glitch voltage							*/
 #define P_CMD_SET_EXT_OFFST			0x32	/* Set external offset (wait after trig.) in us	*/
 #define P_CMD_SET_WIDTH				0x33	/* Set glitch width	(duration of glitch) in us	*/
 #define P_CMD_SET_PREP_VOLTAGE		0x34	/* Set Vp (preparation voltage) before glitch	*/
+#define P_CMD_GET_STATE				0x35	/* Read back all glitch parameters				*/
 
 // picocode glitch results
 #define P_CMD_RESULT_RESET			0x50	/* Target reset									*/
@@ -40,7 +43,7 @@
 #define P_CMD_RESULT_DATA_TIMEOUT	0x53	/* Target timeout after glitch when sending data back (target is alive) */
 #define P_CMD_RESULT_UNREACHABLE	0x54	/* Target unavailable when starting glitch: did not receive anything on the serial port */
 #define P_CMD_RESULT_PMIC_FAIL		0x55	/* Could not send command to PMIC				*/
-#define P_CMD_RESULT_ANSI_CTRL_CODE	0x56	/* Target sent an ANSI control code, data will follow */
+#define P_CMD_RESULT_ANSI_CTRL_CODE	0x56	/* Target sent an ANSI control code, data follows as u16-length-prefixed chunks, empty chunk ends */
 
 // picocode command responses
 #define P_CMD_RETURN_OK				0x61	/* Command successful							*/
@@ -55,6 +58,12 @@
 #define P_CMD_MEASURE_LOOP_DURATION	0x76	/* Measure the length (in us) of opcode loop	*/
 #define P_CMD_UART_TOGGLE_DEBUG_PIN	0x77	/* Toggle debug pin on UART data in				*/
 #define P_CMD_DEBUG_PULSE			0x78	/* Single 10 us pulse on debug pin				*/
+#define P_CMD_VERSION				0x79	/* Protocol version of the firmware				*/
+
+// Protocol version returned by P_CMD_VERSION, bump it when commands are added or changed.
+// 1: P_CMD_ARM_SETTINGS, P_CMD_ARM_BATCH, P_CMD_GET_STATE and P_CMD_VERSION. Older firmware
+// answers P_CMD_VERSION with S_NAK, the client counts it as version 0
+#define P_PROTOCOL_VERSION			1
 
 // Commands to/from the target board
 #define T_CMD_READY					'R'		/* The target is alive and ready				*/
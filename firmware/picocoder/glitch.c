@@ -1,6 +1,7 @@
 #include "glitch.h"
 
 glitch_t glitch = {0, 0, {TPS_REG_BUCK2CTRL, TPS_VCORE_MAX}, {TPS_REG_BUCK2CTRL, TPS_VCORE_MIN}, {TPS_REG_BUCK2CTRL, TPS_VCORE_MAX}};
+glitch_settings_t glitch_batch[GLITCH_BATCH_MAX];
 
 #define UART_HW_NO_INPUT 0x100
 #define ESTIMATE_ROUNDS 100
@@ -42,6 +43,19 @@ static void uart_hw_readu32(readu32_t *r) {
 	return;
 }
 
+static void put_chunk(const uint8_t *buf, uint16_t len) {
+	/*
+	 * Sends a chunk of data to the host, prefixed by its length (u16 little endian).
+	 * A zero-length chunk terminates the stream.
+	 */
+	putchar(len & 0xFF);
+	putchar((len >> 8) & 0xFF);
+	if (len) {
+		fwrite(buf, 1, len, stdout);
+	}
+	fflush(stdout);
+}
+
 void target_uart_init(void) {
 	uart_init(UART_TARGET, UART_TARGET_BAUD);
 
@@ -113,22 +127,24 @@ void uart_echo(void) {
 	}
 }
 
-bool glitcher_arm(uint8_t expected_ints) {
+static uint8_t glitcher_run(uint8_t expected_ints, uint32_t *rets, uint8_t *last) {
 	/*
 	 * Performs a glitch with the current glitch parameters and checks the target response.
+	 * Nothing is sent to the host, the caller reports the result.
 	 *
 	 * Arguments:
 	 *	- expected_ints: the number of uint32_t values expected to be received from the target (max 10)
+	 *	- rets: filled with the values received from the target when the result is P_CMD_RESULT_ALIVE
+	 *	- last: the last byte received from the target (P_CMD_RESULT_ZOMBIE, P_CMD_RESULT_ANSI_CTRL_CODE)
+	 *
+	 * Returns:
+	 *	- The P_CMD_RESULT_* code for this attempt
 	 */
 	volatile uint8_t data;
 	uint32_t th, tl;
-	readu32_t rets[10];
+	readu32_t ret;
 	int write_prep_res = PICO_ERROR_GENERIC, write_glitch_res = PICO_ERROR_GENERIC, write_restore_res = PICO_ERROR_GENERIC;
 
-	if (expected_ints > 10) {
-		return false;
-	}
-
 	data = uart_hw_read(); // Clear the RX FIFO
 
 	// Wait for trigger
@@ -141,8 +157,7 @@ bool glitcher_arm(uint8_t expected_ints) {
 			if (uart_hw_read() == T_CMD_READY) goto triggered;
 		}
 	} while (timer_hw->timerawh < th || timer_hw->timerawl < tl);
-	putchar(P_CMD_RESULT_UNREACHABLE);
-	return false;
+	return P_CMD_RESULT_UNREACHABLE;
 
 	triggered:
 	write_prep_res = i2c_write_timeout_us(I2C_PMBUS, PMBUS_PMIC_ADDRESS, glitch.cmd_prep, TPS_WRITE_REG_CMD_LEN, false, 100);
@@ -152,8 +167,7 @@ bool glitcher_arm(uint8_t expected_ints) {
 	write_restore_res = i2c_write_timeout_us(I2C_PMBUS, PMBUS_PMIC_ADDRESS, glitch.cmd_restore, TPS_WRITE_REG_CMD_LEN, false, 100);
 
 	if (write_prep_res != TPS_WRITE_REG_CMD_LEN | write_glitch_res != TPS_WRITE_REG_CMD_LEN || write_restore_res != TPS_WRITE_REG_CMD_LEN) {
-		putchar(P_CMD_RESULT_PMIC_FAIL);
-		return false;
+		return P_CMD_RESULT_PMIC_FAIL;
 	}
 
 	// Check if target is still alive
@@ -164,48 +178,137 @@ bool glitcher_arm(uint8_t expected_ints) {
 	do {
 		if (uart_hw_readable()) goto alive;
 	} while (timer_hw->timerawh < th || timer_hw->timerawl < tl);
-	putchar(P_CMD_RESULT_RESET);
-	return false;
+	return P_CMD_RESULT_RESET;
 
 	alive:
 	data = uart_hw_read();
+	*last = data;
 	switch (data) {
 	case T_CMD_DONE:
 		// done with target code, retrieve results
-		for (uint8_t i = 0; i < expected_ints; i++) { // First read all the results
-			uart_hw_readu32(&rets[i]);
-			if (!rets[i].valid) {
-				putchar(P_CMD_RESULT_DATA_TIMEOUT);
-				return false;
-			}
-		}
-		putchar(P_CMD_RESULT_ALIVE); // Since we got all the results, the target is alive
 		for (uint8_t i = 0; i < expected_ints; i++) {
-			putu32(rets[i].val);
+			uart_hw_readu32(&ret);
+			if (!ret.valid) {
+				return P_CMD_RESULT_DATA_TIMEOUT;
+			}
+			rets[i] = ret.val;
 		}
-		break;
+		return P_CMD_RESULT_ALIVE; // Since we got all the results, the target is alive
 	case T_CMD_ANSI_ESC:
-		// target is sending some crash debug info, probably.
-		th = timer_hw->timerawh;
-		tl = timer_hw->timerawl;
-		th += tl + CRASH_INFO_TIMEOUT_US < tl;
-		tl += CRASH_INFO_TIMEOUT_US;
-		putchar(P_CMD_RESULT_ANSI_CTRL_CODE);
-		while (timer_hw->timerawh < th || timer_hw->timerawl < tl) {
-			// Sometimes the target will start dumping the whole ram, so we need to timeout or we'll get stuck here
-			putchar(data);
-			if (!uart_is_readable_within_us(UART_TARGET, 1000)) break;
-			data = uart_hw_read();
-		}
+		// target is sending some crash debug info, probably. See forward_crash_info()
+		return P_CMD_RESULT_ANSI_CTRL_CODE;
 	case T_CMD_READY:
 		// ready -> target reset? Why no done?
 		// fallback
 	default:
-		putchar(P_CMD_RESULT_ZOMBIE);
-		putchar(data);
-		break;
+		return P_CMD_RESULT_ZOMBIE;
+	}
+}
+
+static void forward_crash_info(uint8_t data) {
+	/*
+	 * Forwards the crash info the target is sending as length-prefixed chunks terminated by an
+	 * empty chunk, so the host can read it in bulk without guessing when it ends.
+	 *
+	 * Arguments:
+	 *	- data: the first byte of crash info, already read from the UART
+	 */
+	uint8_t chunk[CRASH_INFO_CHUNK_LEN];
+	uint16_t chunk_len = 0;
+	uint32_t th = timer_hw->timerawh;
+	uint32_t tl = timer_hw->timerawl;
+	th += tl + CRASH_INFO_TIMEOUT_US < tl;
+	tl += CRASH_INFO_TIMEOUT_US;
+	while (timer_hw->timerawh < th || timer_hw->timerawl < tl) {
+		// Sometimes the target will start dumping the whole ram, so we need to timeout or we'll get stuck here
+		chunk[chunk_len++] = data;
+		if (chunk_len == CRASH_INFO_CHUNK_LEN) {
+			put_chunk(chunk, chunk_len);
+			chunk_len = 0;
+		}
+		if (!uart_is_readable_within_us(UART_TARGET, 1000)) break;
+		data = uart_hw_read();
+	}
+	if (chunk_len)
+		put_chunk(chunk, chunk_len);
+	put_chunk(NULL, 0);
+}
+
+bool glitcher_arm(uint8_t expected_ints) {
+	/*
+	 * Performs a glitch with the current glitch parameters and sends the result to the host.
+	 *
+	 * Arguments:
+	 *	- expected_ints: the number of uint32_t values expected to be received from the target (max 10)
+	 */
+	uint32_t rets[GLITCH_MAX_RETS];
+	uint8_t last = 0;
+	uint8_t res;
+
+	if (expected_ints > GLITCH_MAX_RETS) {
+		return false;
+	}
+
+	res = glitcher_run(expected_ints, rets, &last);
+	putchar(res);
+	switch (res) {
+	case P_CMD_RESULT_ALIVE:
+		for (uint8_t i = 0; i < expected_ints; i++) {
+			putu32(rets[i]);
+		}
+		return true;
+	case P_CMD_RESULT_ANSI_CTRL_CODE:
+		forward_crash_info(last);
+		return true;
+	case P_CMD_RESULT_ZOMBIE:
+		putchar(last);
+		return true;
+	default:
+		return false;
+	}
+}
+
+void glitcher_batch(uint16_t count, uint8_t expected_ints) {
+	/*
+	 * Performs a glitch for each of the first `count` entries of `glitch_batch`, back to back.
+	 * Each attempt is reported with a fixed-size record:
+	 *	- index (u16), result code (u8), extra byte (u8), `expected_ints` values (u32)
+	 * The extra byte is the unexpected byte received from the target for P_CMD_RESULT_ZOMBIE
+	 * and 0 otherwise. The values are those received from the target for P_CMD_RESULT_ALIVE
+	 * and 0 otherwise.
+	 * A P_CMD_RESULT_ANSI_CTRL_CODE record is followed by the crash info chunks (see forward_crash_info()).
+	 *
+	 * The batch stops early after a result that requires the host to power cycle the target
+	 * (reset, unreachable, PMIC failure, crash info).
+	 *
+	 * Arguments:
+	 *	- count: number of entries of `glitch_batch` to run
+	 *	- expected_ints: the number of uint32_t values expected to be received from the target (max 10)
+	 */
+	uint32_t rets[GLITCH_MAX_RETS];
+	uint8_t last, res;
+
+	for (uint16_t i = 0; i < count; i++) {
+		glitch.ext_offset = glitch_batch[i].ext_offset;
+		glitch.width = glitch_batch[i].width;
+		glitch.cmd_glitch[1] = glitch_batch[i].voltage;
+		glitch.cmd_prep[1] = glitch_batch[i].prep_voltage;
+
+		last = 0;
+		res = glitcher_run(expected_ints, rets, &last);
+		putchar(i & 0xFF);
+		putchar((i >> 8) & 0xFF);
+		putchar(res);
+		putchar(res == P_CMD_RESULT_ZOMBIE ? last : 0);
+		for (uint8_t j = 0; j < expected_ints; j++)
+			putu32(res == P_CMD_RESULT_ALIVE ? rets[j] : 0);
+		if (res == P_CMD_RESULT_ANSI_CTRL_CODE)
+			forward_crash_info(last);
+		fflush(stdout);
+
+		if (res == P_CMD_RESULT_RESET || res == P_CMD_RESULT_UNREACHABLE || res == P_CMD_RESULT_PMIC_FAIL || res == P_CMD_RESULT_ANSI_CTRL_CODE)
+			break;
 	}
-	return true;
 }
 
 int measure_loop(void) {
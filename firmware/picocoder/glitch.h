@@ -8,11 +8,14 @@
 
 #define READ_TIMEOUT_CYCLES			5000 // At the standard 125MHz, this is 8ns*5000 = 40us (plus loop overhead)
 #define CRASH_INFO_TIMEOUT_US		1000000 // Receive crash info for 1s max
+#define CRASH_INFO_CHUNK_LEN		256 // Crash info is forwarded to the host in length-prefixed chunks of up to this size
 #define TARGET_REACHABLE_US			9000 // The target sends a `R` every ~3-7,5ms, if after 9ms we haven't seen it, it's dead
 #define VOLT_TEST_TIMEOUT_US		6000 // 6ms timeout to receive all bytes in a voltage test (it normally takes ~5ms)
 #define PING_VCORE_STABLE_TIME_US	350000
 #define PING_VCORE_STABLE_CHARS		5
 #define PING_VCORE_STABLE_CHARS_SLOW	1 // With ucode updates, it can take up to 6,6 us per cycle
+#define GLITCH_MAX_RETS				10 // Maximum number of uint32_t values the target can send back
+#define GLITCH_BATCH_MAX			512 // Maximum number of settings in a P_CMD_ARM_BATCH upload
 
 typedef struct glitch_s {
 	uint32_t ext_offset;
@@ -23,6 +26,14 @@ typedef struct glitch_s {
 } glitch_t;
 extern glitch_t glitch;
 
+typedef struct glitch_settings_s {
+	uint32_t ext_offset;
+	uint32_t width;
+	uint8_t voltage;
+	uint8_t prep_voltage;
+} glitch_settings_t;
+extern glitch_settings_t glitch_batch[GLITCH_BATCH_MAX];
+
 typedef struct readu32_s {
 	bool valid;
 	uint32_t val;
@@ -32,6 +43,7 @@ void target_uart_init(void);
 bool ping_target(uint target_count);
 void uart_echo(void);
 bool glitcher_arm(uint8_t expected_ints);
+void glitcher_batch(uint16_t count, uint8_t expected_ints);
 int measure_loop(void);
 bool uart_debug_pin_toggle(void);
 
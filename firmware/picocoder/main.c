@@ -36,6 +36,9 @@ unsigned char write_buffer[4096];
 
 void process(pio_spi_inst_t *spi, int command) {
 	uint8_t expected_ints, new_voltage, new_prep_voltage; // Old gcc does not like variable declarations after a label
+	uint32_t new_ext_offset, new_width;
+	uint16_t batch_count;
+	bool batch_valid;
 	switch(command) {
 		case S_CMD_NOP:
 			putchar(S_ACK);
@@ -125,6 +128,53 @@ void process(pio_spi_inst_t *spi, int command) {
 			expected_ints = getchar();
 			glitcher_arm(expected_ints);
 			break;
+		case P_CMD_ARM_SETTINGS:
+			// Frame: ext_offset (u32), width (u32), voltage (u8), prep_voltage (u8), expected_ints (u8)
+			new_ext_offset = getu32();
+			new_width = getu32();
+			new_voltage = getchar();
+			new_prep_voltage = getchar();
+			expected_ints = getchar();
+			if (new_voltage > TPS_VCORE_MAX || new_prep_voltage > TPS_VCORE_MAX) {
+				putchar(P_CMD_RETURN_KO);
+				puts("[!] Value risks frying the CPU. Ignoring");
+				break;
+			}
+			glitch.ext_offset = new_ext_offset;
+			glitch.width = new_width;
+			glitch.cmd_glitch[1] = new_voltage;
+			glitch.cmd_prep[1] = new_prep_voltage;
+			glitcher_arm(expected_ints);
+			break;
+		case P_CMD_ARM_BATCH:
+			// Frame: count (u16), expected_ints (u8), then `count` times:
+			// ext_offset (u32), width (u32), voltage (u8), prep_voltage (u8)
+			batch_count = getchar();
+			batch_count |= getchar() << 8;
+			expected_ints = getchar();
+			batch_valid = batch_count <= GLITCH_BATCH_MAX && expected_ints <= GLITCH_MAX_RETS;
+			for (uint16_t i = 0; i < batch_count; i++) {
+				// Always consume the whole frame, even if it is going to be refused
+				new_ext_offset = getu32();
+				new_width = getu32();
+				new_voltage = getchar();
+				new_prep_voltage = getchar();
+				if (new_voltage > TPS_VCORE_MAX || new_prep_voltage > TPS_VCORE_MAX || i >= GLITCH_BATCH_MAX) {
+					batch_valid = false;
+					continue;
+				}
+				glitch_batch[i].ext_offset = new_ext_offset;
+				glitch_batch[i].width = new_width;
+				glitch_batch[i].voltage = new_voltage;
+				glitch_batch[i].prep_voltage = new_prep_voltage;
+			}
+			if (!batch_valid) {
+				putchar(P_CMD_RETURN_KO);
+				puts("[!] Invalid batch (too many entries or return values, or value risks frying the CPU). Ignoring");
+				break;
+			}
+			glitcher_batch(batch_count, expected_ints);
+			break;
 		case P_CMD_FORCE:
 			busy_wait_us_32(glitch.ext_offset);
 			int write_glitch_res = i2c_write_timeout_us(
@@ -166,6 +216,14 @@ void process(pio_spi_inst_t *spi, int command) {
 			glitch.cmd_prep[1] = new_prep_voltage;
 			putchar(P_CMD_RETURN_OK);
 			break;
+		case P_CMD_GET_STATE:
+			// Frame: ext_offset (u32), width (u32), voltage (u8), prep_voltage (u8)
+			putchar(P_CMD_RETURN_OK);
+			putu32(glitch.ext_offset);
+			putu32(glitch.width);
+			putchar(glitch.cmd_glitch[1]);
+			putchar(glitch.cmd_prep[1]);
+			break;
 		case P_CMD_UART_ECHO:
 			uart_echo();
 			break;
@@ -190,6 +248,10 @@ void process(pio_spi_inst_t *spi, int command) {
 			gpio_put(PIN_DEBUG, 0);
 			putchar(P_CMD_RETURN_OK);
 			break;
+		case P_CMD_VERSION:
+			putchar(P_CMD_RETURN_OK);
+			putchar(P_PROTOCOL_VERSION);
+			break;
 		default:
 			putchar(S_NAK);
 	}
@@ -0,0 +1,103 @@
+#! /usr/bin/env python3
+
+'''
+Benchmark the host side of `Picocoder.glitch()` against the virtual picocoder
+(see `picocoder_client/emulator.py`), comparing the per-setter path (with random settings and
+with a boustrophedon sweep that changes one setting per attempt), the combined
+P_CMD_ARM_SETTINGS frame and on-device batches (P_CMD_ARM_BATCH).
+'''
+
+from argparse import ArgumentParser, Namespace
+from itertools import islice
+import random
+import time
+
+import numpy as np
+
+import picocoder_client
+from picocoder_client import Picocoder, GlitchSettings
+from picocoder_client.emulator import EmulatedTarget, PicocoderEmulator, TargetProfile, TARGET_PROFILES
+from picocoder_client.sampling import SnakeOrder, changed_coordinates
+
+AXES = {
+	'ext_offset': range(100, 300),
+	'width': range(50, 100),
+	'voltage': range(30, 40),
+	'prep_voltage': range(40, 45),
+}
+
+def random_settings(n: int, seed: int) -> list[GlitchSettings]:
+	'''
+	`n` settings that change every iteration
+	'''
+	rng = random.Random(seed)
+	return [{param: rng.choice(axis) for param, axis in AXES.items()} for _ in range(n)] # type: ignore
+
+def sweep_settings(n: int) -> list[GlitchSettings]:
+	'''
+	First `n` settings of a boustrophedon sweep of the lattice (ext_offset fastest, prep_voltage slowest)
+	'''
+	walk = SnakeOrder([len(axis) for axis in AXES.values()], order=range(len(AXES) - 1, -1, -1))
+	points = np.vstack([walk.points(i, i + 4096) for i in range(0, walk.size, 4096)])
+	return [{param: axis[i] for (param, axis), i in zip(AXES.items(), point)} for point in islice(points.tolist(), n)] # type: ignore
+
+def round_trips(settings: list[GlitchSettings]) -> float:
+	'''
+	Setter round-trips per attempt of the per-setter path, which skips unchanged settings
+	'''
+	points = np.array([[gs[param] for param in AXES] for gs in settings])
+	return (len(AXES) + changed_coordinates(points)) / len(settings) # The first attempt sends every setting
+
+def run(glitcher: Picocoder, settings: list[GlitchSettings], batch_size: int = 1) -> float:
+	'''
+	Perform a glitch with each of the `settings`, returns the rate in Hz
+	'''
+	n = len(settings)
+	start = time.perf_counter()
+	if batch_size > 1:
+		for i in range(0, n, batch_size):
+			glitcher.glitch_batch(settings[i:i + batch_size])
+	else:
+		for gs in settings:
+			glitcher.glitch(gs)
+	return n / (time.perf_counter() - start)
+
+def main(a: Namespace) -> int:
+	tc = picocoder_client.target_from_opname(a.operation)
+	base = TARGET_PROFILES[type(tc)]
+	# Target never crashes: we are only measuring the glitch round-trip
+	profile = TargetProfile(base.normal, base.success, {'normal': 1.0}, base.loop_duration, a.glitch_time / 1000)
+	rates = {}
+	randomised, sweep = random_settings(a.iterations, a.seed), sweep_settings(a.iterations)
+	paths = {
+		'P_CMD_SET_* + P_CMD_ARM': (False, 1, randomised),
+		'P_CMD_SET_* (sweep)': (False, 1, sweep),
+		'P_CMD_ARM_SETTINGS': (True, 1, randomised),
+		f'P_CMD_ARM_BATCH ({a.batch_size})': (True, a.batch_size, randomised),
+	}
+	for name, (fast_arm, batch_size, settings) in paths.items():
+		with PicocoderEmulator(EmulatedTarget(tc, profile), a.latency / 1000) as emulator:
+			glitcher = Picocoder(emulator.port)
+			glitcher.tc = tc
+			glitcher.fast_arm = fast_arm
+			rates[name] = run(glitcher, settings, batch_size)
+			del glitcher
+		setters = f' ({round_trips(settings):.2f} setter round-trips/attempt)' if not fast_arm else ''
+		print(f'{name:<24} {rates[name]:8.2f} Hz{setters}')
+	if a.min_rate and rates['P_CMD_ARM_SETTINGS'] < a.min_rate:
+		print(f'Rate below {a.min_rate:.2f} Hz')
+		return 1
+	return 0
+
+if __name__ == '__main__':
+	argparser = ArgumentParser(description='Benchmark the glitch round-trip of the picocoder client against the emulator')
+	argparser.add_argument('operation', nargs='?', default='mul', type=str, choices=picocoder_client.target_op_names(), help='Target operation (default mul)')
+	argparser.add_argument('-n', '--iterations', default=500, type=int, help='Glitches per path (default 500)')
+	argparser.add_argument('--latency', default=1.0, type=float, help='Host <-> glitcher latency in ms (default 1.0)')
+	argparser.add_argument('--glitch-time', default=5.0, type=float, help='Duration of a glitch attempt on the target in ms (default 5.0)')
+	argparser.add_argument('--batch-size', default=64, type=int, help='Settings per P_CMD_ARM_BATCH upload (default 64)')
+	argparser.add_argument('--seed', default=0, type=int, help='Seed for the settings generator (default 0)')
+	argparser.add_argument('--min-rate', default=0.0, type=float, help='Exit with an error if the P_CMD_ARM_SETTINGS rate is below this value (Hz)')
+	args = argparser.parse_args()
+
+	exit(main(args))
@@ -0,0 +1,90 @@
+#! /usr/bin/env python3
+
+'''
+Compare the glitch samplers of `GlitchController` in successes per hour against the virtual
+picocoder (see `picocoder_client/emulator.py`), with a target that only glitches successfully
+in a small region of the parameter space.
+'''
+
+from argparse import ArgumentParser, Namespace
+from itertools import islice
+import time
+
+import picocoder_client
+from picocoder_client import GlitchController, GlitchResult, KA3305P, Picocoder, TargetType
+from picocoder_client.emulator import EmulatedTarget, Hotspot, KA3305PEmulator, PicocoderEmulator, TargetProfile, TARGET_PROFILES
+from data_collector import make_controller, reset_target
+
+SUCCESSES = (GlitchResult.SUCCESS, GlitchResult.HALF_SUCCESS)
+
+def make_profile(tc: TargetType, a: Namespace) -> TargetProfile:
+	'''
+	Mostly harmless target: it resets a lot at low voltages and only glitches successfully in `a.hotspot`
+	'''
+	base = TARGET_PROFILES[type(tc)]
+	quiet = {'normal': 1 - a.reset_rate, 'reset': a.reset_rate}
+	hotspot = dict(zip(('ext_offset', 'width', 'voltage'), a.hotspot))
+	hotspots = [
+		Hotspot(hotspot, {'normal': 1 - a.reset_rate - a.hit_rate, 'reset': a.reset_rate, 'success': a.hit_rate}),
+		Hotspot({'voltage': (0, a.voltage[0] + 1)}, {'normal': 0.5, 'reset': 0.5}),
+	]
+	return TargetProfile(base.normal, base.success, quiet, base.loop_duration, a.glitch_time / 1000, hotspots)
+
+def run(gc: GlitchController, glitcher: Picocoder, ps: KA3305P, n: int) -> tuple[int, int, float]:
+	'''
+	Perform up to `n` glitches with the values of `gc`, returns (attempts, successes, duration in s)
+	'''
+	attempts = successes = 0
+	start = time.perf_counter()
+	for gs in islice(gc.glitch_values(), n):
+		result, data = glitcher.glitch(gs)
+		gc.add_result(gs, result, data)
+		attempts += 1
+		if result in SUCCESSES:
+			successes += 1
+		elif result in (GlitchResult.RESET, GlitchResult.BROKEN):
+			reset_target(ps, glitcher)
+	return attempts, successes, time.perf_counter() - start
+
+def main(a: Namespace) -> int:
+	tc = picocoder_client.target_from_opname(a.operation)
+	profile = make_profile(tc, a)
+	for sampler in a.samplers:
+		target = EmulatedTarget(tc, profile)
+		with PicocoderEmulator(target, time_scale=a.time_scale, seed=a.seed) as emulator, KA3305PEmulator(target) as ps_emulator:
+			glitcher = Picocoder(emulator.port)
+			glitcher.tc = tc
+			glitcher.fast_arm = True
+			ps = KA3305P(port=ps_emulator.port, cycle_wait=a.cycle_wait)
+			ps.con()
+			reset_target(ps, glitcher)
+			gc = make_controller(a)
+			gc.set_sampler(sampler, a.seed)
+			attempts, successes, duration = run(gc, glitcher, ps, a.iterations)
+			ps.dis()
+			del glitcher
+		print(f'{sampler:<12} {attempts:7d} attempts {successes:6d} successes {successes / duration * 3600:10.1f} successes/h')
+	return 0
+
+if __name__ == '__main__':
+	argparser = ArgumentParser(description='Compare the glitch samplers in successes per hour against the emulator')
+	argparser.add_argument('operation', nargs='?', default='mul', type=str, choices=picocoder_client.target_op_names(), help='Target operation (default mul)')
+	argparser.add_argument('--samplers', nargs='+', default=['random', 'zoom', 'bandit'], choices=GlitchController.SAMPLERS, help='Samplers to compare (default random zoom bandit)')
+	argparser.add_argument('-n', '--iterations', default=10000, type=int, help='Glitches per sampler (default 10000)')
+	argparser.add_argument('--ext-offset', nargs=3, default=[100, 300, 2], type=int, metavar=('START', 'END', 'STEP'), help='Glitch offset range (default 100 300 2)')
+	argparser.add_argument('--width', nargs=3, default=[50, 100, 2], type=int, metavar=('START', 'END', 'STEP'), help='Glitch width range (default 50 100 2)')
+	argparser.add_argument('--voltage', nargs=3, default=[30, 40, 1], type=int, metavar=('START', 'END', 'STEP'), help='Glitch voltage range (default 30 40 1)')
+	argparser.add_argument('--prep-voltage', nargs=3, default=[40, 44, 1], type=int, metavar=('START', 'END', 'STEP'), help='Preparation voltage range (default 40 44 1)')
+	argparser.add_argument('--hotspot', nargs=6, default=[200, 215, 60, 70, 33, 35], type=int, metavar=('EXT_LO', 'EXT_HI', 'W_LO', 'W_HI', 'V_LO', 'V_HI'),
+		help='Inclusive bounds of ext_offset, width and voltage where the target glitches (default 200 215 60 70 33 35)')
+	argparser.add_argument('--hit-rate', default=0.3, type=float, help='Success probability inside the hotspot (default 0.3)')
+	argparser.add_argument('--reset-rate', default=0.02, type=float, help='Reset probability outside the low voltage region (default 0.02)')
+	argparser.add_argument('--glitch-time', default=5.0, type=float, help='Duration of a glitch attempt on the target in ms (default 5.0)')
+	argparser.add_argument('--time-scale', default=1.0, type=float, help='Multiplier for every emulated delay (default 1.0)')
+	argparser.add_argument('--cycle-wait', default=0.5, type=float, help='Power supply off time when resetting the target in s (default 0.5)')
+	argparser.add_argument('--seed', default=0, type=int, help='Seed for the emulator and the samplers (default 0)')
+	args = argparser.parse_args()
+	args.hotspot = [tuple(args.hotspot[i:i + 2]) for i in range(0, 6, 2)]
+	args.sampler, args.sampler_seed, args.sweep_order = 'random', args.seed, None # Read by make_controller
+
+	exit(main(args))
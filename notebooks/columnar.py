@@ -0,0 +1,176 @@
+#! /usr/bin/env python3
+
+'''
+Columnar copies of the campaigns of a `GlitchSQLite` database, for analysis.
+
+A campaign is exported to a directory of Parquet files (`<out>/campaign=<name>/part-N.parquet`),
+streamed from SQLite with `fetchmany` in chunks, with typed columns and the result as a
+dictionary-encoded label. :py:func:`~load_columns` reads back a subset of columns as NumPy (or
+Arrow) arrays, skipping the row groups excluded by the filters, and :py:func:`~load_rows`
+returns them in the `(columns, rows)` shape of a `SELECT *` on the legacy campaign tables, for
+the plotting code in `plot_from_db.ipynb` and `mayavi_plot.py`.
+
+Requires pyarrow.
+'''
+
+from argparse import ArgumentParser, Namespace
+import pathlib
+import sqlite3
+import time
+from typing import Any, Iterator, Sequence
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from picocoder_client import GlitchResult
+from data_collector import RESULTS
+
+PARAMS = ('ext_offset', 'width', 'voltage', 'prep_voltage')
+RESULT_TYPE = pa.dictionary(pa.int8(), pa.string())
+RESULT_LABELS = pa.array([result.name for result in RESULTS], type=pa.string()) # Indexed by result code
+
+Filters = Sequence[tuple[str, str, Any]] # pyarrow filters, e.g. [('result', '==', 'SUCCESS'), ('voltage', '<', 35)]
+
+def campaign_schema(ret_vars: Sequence[str]) -> pa.Schema:
+	'''
+	Parquet schema of a campaign with the given return values
+	'''
+	return pa.schema(
+		[pa.field(param, pa.int32(), nullable=False) for param in PARAMS] +
+		[pa.field('result', RESULT_TYPE, nullable=False), pa.field('data', pa.binary())] +
+		[pa.field(var, pa.uint32()) for var in ret_vars]
+	)
+
+def campaign_dir(path: str|pathlib.Path, campaign: str) -> pathlib.Path:
+	return pathlib.Path(path) / f'campaign={campaign}'
+
+def export_campaign(conn: sqlite3.Connection, campaign: str, out: str|pathlib.Path,
+		chunk_size: int = 65536, rows_per_file: int = 8_388_608) -> int:
+	'''
+	Stream a campaign to Parquet files, one row group per chunk
+
+	Args:
+		conn: Database in the `GlitchSQLite` schema
+		campaign: Campaign name
+		out: Root directory of the export, the campaign goes to `campaign=<name>` (replaced if present)
+		chunk_size: Rows fetched and written at a time
+		rows_per_file: Rows in every Parquet file
+
+	Returns:
+		Number of attempts exported
+	'''
+	row = conn.execute('SELECT id, ret_vars FROM campaigns WHERE name=?', (campaign,)).fetchone()
+	if row is None:
+		raise ValueError(f'Campaign {campaign} not found')
+	campaign_id, ret_vars = row[0], [var for var in row[1].split(',') if var]
+	schema = campaign_schema(ret_vars)
+	directory = campaign_dir(out, campaign)
+	directory.mkdir(parents=True, exist_ok=True)
+	for old in directory.glob('part-*.parquet'):
+		old.unlink()
+
+	c = conn.cursor()
+	ret_cols = ''.join(f', ret{i}' for i in range(len(ret_vars)))
+	c.execute(f'SELECT ext_offset, width, voltage, prep_voltage, result, data{ret_cols} FROM attempts NOT INDEXED WHERE campaign=? ORDER BY rowid', (campaign_id,))
+	writer: pq.ParquetWriter|None = None
+	count = in_file = files = 0
+	try:
+		while rows := c.fetchmany(chunk_size):
+			columns = list(zip(*rows))
+			arrays = [pa.array(np.array(column, dtype=np.int32)) for column in columns[:len(PARAMS)]]
+			arrays.append(pa.DictionaryArray.from_arrays(pa.array(np.array(columns[len(PARAMS)], dtype=np.int8)), RESULT_LABELS))
+			arrays.append(pa.array(columns[len(PARAMS) + 1], type=pa.binary()))
+			arrays += [pa.array(column, type=pa.uint32()) for column in columns[len(PARAMS) + 2:]]
+			if writer is None or in_file >= rows_per_file:
+				if writer is not None:
+					writer.close()
+				writer = pq.ParquetWriter(directory / f'part-{files:05d}.parquet', schema, compression='zstd')
+				files += 1
+				in_file = 0
+			writer.write_table(pa.Table.from_arrays(arrays, schema=schema), row_group_size=chunk_size)
+			count += len(rows)
+			in_file += len(rows)
+			print(f'{campaign}: {count} attempts         ', end='\r', flush=True) # spaces to overwrite prev line
+	finally:
+		if writer is not None:
+			writer.close()
+		c.close()
+	if writer is None:
+		pq.write_table(schema.empty_table(), directory / 'part-00000.parquet') # Keep the schema of empty campaigns
+	print(f'{campaign}: {count} attempts in {files} files         ')
+	return count
+
+def load_columns(path: str|pathlib.Path, campaign: str, columns: Sequence[str]|None = None,
+		filters: Filters|None = None, as_numpy: bool = True) -> dict[str, np.ndarray]|pa.Table:
+	'''
+	Read the columns of an exported campaign
+
+	Args:
+		path: Root directory of the export
+		campaign: Campaign name
+		columns: Columns to read (default: all)
+		filters: Only read the rows that match all of these `(column, op, value)` conditions, e.g.
+			`[('result', '==', 'SUCCESS')]`. Row groups whose statistics exclude them are not read
+		as_numpy: Return a dict of NumPy arrays (results as label strings, missing return values as
+			0) instead of an Arrow table
+
+	Returns:
+		{column: array}, or the Arrow table
+	'''
+	table = pq.read_table(campaign_dir(path, campaign), columns=list(columns) if columns is not None else None,
+		filters=list(filters) if filters else None, partitioning=None)
+	if not as_numpy:
+		return table
+	ret = {}
+	for name, column in zip(table.column_names, table.columns):
+		if pa.types.is_dictionary(column.type):
+			column = column.cast(pa.string())
+		if pa.types.is_integer(column.type):
+			ret[name] = column.fill_null(0).to_numpy()
+		else:
+			ret[name] = column.to_numpy(zero_copy_only=False)
+	return ret
+
+def load_rows(path: str|pathlib.Path, campaign: str, result: GlitchResult|None = None,
+		exclude: GlitchResult|None = None) -> tuple[list[str], Iterator[tuple]]:
+	'''
+	Rows of an exported campaign as returned by `SELECT * FROM {campaign}` on a legacy database:
+	the names of the columns and an iterator of tuples (results as names, empty data as b'')
+
+	Args:
+		result: Only the rows with this result
+		exclude: Skip the rows with this result
+	'''
+	filters = []
+	if result is not None:
+		filters.append(('result', '==', result.name))
+	if exclude is not None:
+		filters.append(('result', '!=', exclude.name))
+	arrays = load_columns(path, campaign, filters=filters)
+	columns = list(arrays)
+	data = arrays['data']
+	arrays['data'] = np.array([b'' if value is None else value for value in data], dtype=object)
+	return columns, zip(*(arrays[column].tolist() for column in columns))
+
+def main(a: Namespace) -> int:
+	conn = sqlite3.connect(f'file:{a.db_file}?mode=ro', uri=True)
+	campaigns = a.campaigns or [row[0] for row in conn.execute('SELECT name FROM campaigns ORDER BY id')]
+	start_time = time.time()
+	total = 0
+	for campaign in campaigns:
+		total += export_campaign(conn, campaign, a.out, a.chunk_size, a.rows_per_file)
+	print(f'Exported {total} attempts in {time.time() - start_time:.2f}s')
+	conn.close()
+	return 0
+
+if __name__ == '__main__':
+	argparser = ArgumentParser(description='Export the campaigns of a glitch database to Parquet files')
+	argparser.add_argument('db_file', type=str, help='Database file name')
+	argparser.add_argument('out', type=str, help='Output directory, every campaign goes to out/campaign=<name>/')
+	argparser.add_argument('campaigns', nargs='*', help='Campaigns to export (default: all)')
+	argparser.add_argument('--chunk-size', default=65536, type=int, help='Rows fetched and written at a time, also the Parquet row group size (default 65536)')
+	argparser.add_argument('--rows-per-file', default=8_388_608, type=int, help='Rows in every Parquet file (default 8388608)')
+	args = argparser.parse_args()
+
+	exit(main(args))
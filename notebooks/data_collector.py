@@ -1,24 +1,245 @@
 #! /usr/bin/env python3
 
+import asyncio
+import hashlib
+import json
+import os
 import pathlib
+import queue
 import sys
+import threading
 from argparse import ArgumentParser, Namespace
+from itertools import islice
+from typing import Iterator
 import sqlite3
 from sqlite3 import Error
+import struct
 import time
 
 import picocoder_client
-from picocoder_client import Picocoder, GlitchController, GlitchControllerTPS65094, GlitchResult, TargetType
+from picocoder_client import Picocoder, GlitchController, GlitchControllerTPS65094, GlitchResult, GlitchSettings, TargetType, RESET_RESULTS
 from picocoder_client import PowerSupply, KA3305P
+from picocoder_client import PhaseTimer
 
 GLITCHER_BAUD = 115200
 
+class BatchWriter(threading.Thread):
+	'''
+	Writes rows to a SQLite database from a background thread with its own connection: rows are
+	taken from a bounded queue and stored with `executemany`, committing every `commit_rows` rows
+	or `commit_interval` seconds. A full queue blocks :py:meth:`~put`, so a slow disk slows the
+	acquisition down instead of growing the memory, and :py:attr:`~depth` shows it.
+
+	An error of the writer thread is raised again by the next call to :py:meth:`~put` or :py:meth:`~flush`.
+	'''
+
+	def __init__(self, db_name: str, commit_rows: int = 256, commit_interval: float = 1.0, queue_size: int = 4096):
+		'''
+		Args:
+			db_name: Database filename
+			commit_rows: Commit after this many rows
+			commit_interval: Commit at least every `commit_interval` seconds while rows are written
+			queue_size: Rows waiting to be written before :py:meth:`~put` blocks
+		'''
+		super().__init__(name='db-writer', daemon=True)
+		self.db_name = db_name
+		self.commit_rows = commit_rows
+		self.commit_interval = commit_interval
+		self.queue: queue.Queue = queue.Queue(queue_size)
+		self.max_depth = 0 # Highest queue depth seen by put()
+		self.written = 0 # Rows committed
+		self.error: BaseException|None = None
+		self.start()
+
+	@property
+	def depth(self) -> int:
+		'''
+		Rows waiting in the queue
+		'''
+		return self.queue.qsize()
+
+	def _check(self) -> None:
+		if self.error is not None:
+			raise ConnectionError(f'Database writer failed: {self.error}') from self.error
+
+	def put(self, query: str, row: tuple) -> None:
+		'''
+		Queue a row to be inserted with `query`, blocks while the queue is full
+		'''
+		self._check()
+		self.queue.put((query, row))
+		self.max_depth = max(self.max_depth, self.queue.qsize())
+
+	def flush(self) -> None:
+		'''
+		Wait until all the queued rows are committed
+		'''
+		self._check()
+		if self.is_alive():
+			done = threading.Event()
+			self.queue.put(done)
+			while not done.wait(0.1):
+				self._check()
+		self._check()
+
+	def stop(self) -> None:
+		'''
+		Commit the queued rows and stop the thread
+		'''
+		if self.is_alive():
+			self.queue.put(None)
+			self.join()
+		self._check()
+
+	def run(self) -> None:
+		conn = sqlite3.connect(self.db_name)
+		try:
+			batches: dict[str, list[tuple]] = {}
+			pending = 0 # Rows written but not committed
+			last_commit = time.monotonic()
+			while True:
+				try:
+					item = self.queue.get(timeout=self.commit_interval)
+				except queue.Empty:
+					item = False # Time to commit
+				if isinstance(item, tuple):
+					query, row = item
+					batches.setdefault(query, []).append(row)
+					pending += 1
+					if pending < self.commit_rows and time.monotonic() - last_commit < self.commit_interval and not self.queue.empty():
+						continue # Keep filling the batch
+				for query, rows in batches.items():
+					conn.executemany(query, rows)
+				batches.clear()
+				if pending >= self.commit_rows or time.monotonic() - last_commit >= self.commit_interval or not isinstance(item, tuple):
+					conn.commit()
+					self.written += pending
+					pending = 0
+					last_commit = time.monotonic()
+				if isinstance(item, threading.Event):
+					item.set()
+				elif item is None:
+					break
+		except BaseException as e:
+			self.error = e
+			# Unblock the producers, their next call raises the error
+			while True:
+				try:
+					item = self.queue.get_nowait()
+				except queue.Empty:
+					break
+				if isinstance(item, threading.Event):
+					item.set()
+		finally:
+			conn.close()
+
+RESULTS = list(GlitchResult) # Result of every code stored in attempts.result
+RESULT_CODES: dict[GlitchResult, int] = {result: code for code, result in enumerate(RESULTS)}
+RET_COLUMNS = 4 # Typed columns ret0... for the values returned by the target
+SCHEMA_VERSION = 1 # PRAGMA user_version, legacy one-table-per-campaign databases have 0
+UUID_FIELDS = struct.Struct('<5q') # Position and settings of an attempt, see attempt_uuid()
+
+def attempt_uuid(key: bytes, index: int, ext_offset: int, width: int, voltage: int, prep_voltage: int) -> bytes:
+	'''
+	`uuid` of an attempt: a hash of the source of the attempt (a run of :py:class:`~GlitchSQLite`
+	or a legacy campaign table, see `migrate_db.py`), its position in the source and its settings.
+	Also available in SQL as `attempt_uuid()` on the connections of :py:class:`~GlitchSQLite`.
+
+	Args:
+		key: Identifies the source
+		index: Position of the attempt in the source (e.g. the rowid in a legacy table)
+	'''
+	return hashlib.sha256(key + UUID_FIELDS.pack(index, ext_offset, width, voltage, prep_voltage)).digest()[:16]
+
+SCHEMA = f'''
+CREATE TABLE campaigns (
+	id INTEGER PRIMARY KEY,
+	name TEXT NOT NULL UNIQUE,
+	target TEXT,
+	ret_vars TEXT NOT NULL DEFAULT '',
+	settings TEXT,
+	extra TEXT,
+	runtime REAL NOT NULL DEFAULT 0,
+	checkpoint TEXT,
+	checkpoint_time REAL
+);
+CREATE TABLE result_codes (code INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE VIEW settings AS SELECT name AS table_name, settings, extra FROM campaigns;
+CREATE VIEW runtimes AS SELECT name AS table_name, runtime FROM campaigns;
+'''
+
+ATTEMPTS_SCHEMA = f'''
+CREATE TABLE attempts (
+	campaign INTEGER NOT NULL REFERENCES campaigns(id),
+	ext_offset INTEGER NOT NULL,
+	width INTEGER NOT NULL,
+	voltage INTEGER NOT NULL,
+	prep_voltage INTEGER NOT NULL,
+	result INTEGER NOT NULL REFERENCES result_codes(code),
+	data BLOB,
+	{', '.join(f'ret{i} INTEGER' for i in range(RET_COLUMNS))},
+	uuid BLOB NOT NULL -- Identifies the attempt when databases are merged (see attempt_uuid() and merge_db.py)
+);
+CREATE INDEX attempts_by_result ON attempts(campaign, result, ext_offset, width, voltage, prep_voltage);
+CREATE INDEX attempts_by_settings ON attempts(campaign, ext_offset, width, voltage, prep_voltage, result);
+CREATE UNIQUE INDEX attempts_by_uuid ON attempts(uuid);
+'''
+ATTEMPTS_COLUMNS = 'campaign, ext_offset, width, voltage, prep_voltage, result, data' + ''.join(f', ret{i}' for i in range(RET_COLUMNS))
+
+# Attempts aggregated per cell of the lattice and result, kept up to date by a trigger on every insert
+ROLLUPS_SCHEMA = f'''
+CREATE TABLE rollups (
+	campaign INTEGER NOT NULL REFERENCES campaigns(id),
+	ext_offset INTEGER NOT NULL,
+	width INTEGER NOT NULL,
+	voltage INTEGER NOT NULL,
+	prep_voltage INTEGER NOT NULL,
+	result INTEGER NOT NULL REFERENCES result_codes(code),
+	count INTEGER NOT NULL, -- Attempts
+	returned INTEGER NOT NULL, -- Attempts with return values (ret0... not NULL)
+	{', '.join(f'ret{i}_min INTEGER, ret{i}_max INTEGER, ret{i}_sum INTEGER NOT NULL' for i in range(RET_COLUMNS))},
+	PRIMARY KEY (campaign, ext_offset, width, voltage, prep_voltage, result)
+) WITHOUT ROWID;
+'''
+ROLLUPS_TRIGGER = f'''
+CREATE TRIGGER attempts_rollup AFTER INSERT ON attempts BEGIN
+	INSERT INTO rollups VALUES (NEW.campaign, NEW.ext_offset, NEW.width, NEW.voltage, NEW.prep_voltage, NEW.result,
+		1, NEW.ret0 IS NOT NULL, {', '.join(f'NEW.ret{i}, NEW.ret{i}, COALESCE(NEW.ret{i}, 0)' for i in range(RET_COLUMNS))})
+	ON CONFLICT DO UPDATE SET count = count + 1, returned = returned + (NEW.ret0 IS NOT NULL),
+		{', '.join(f'ret{i}_min = MIN(COALESCE(ret{i}_min, NEW.ret{i}), COALESCE(NEW.ret{i}, ret{i}_min)), '
+			f'ret{i}_max = MAX(COALESCE(ret{i}_max, NEW.ret{i}), COALESCE(NEW.ret{i}, ret{i}_max)), '
+			f'ret{i}_sum = ret{i}_sum + COALESCE(NEW.ret{i}, 0)' for i in range(RET_COLUMNS))};
+END;
+'''
+# Adds pre-aggregated rows (same columns as rollups) to the roll-ups
+ROLLUPS_UPSERT = 'ON CONFLICT DO UPDATE SET count = count + excluded.count, returned = returned + excluded.returned' + ''.join(
+	f', ret{i}_min = MIN(COALESCE(ret{i}_min, excluded.ret{i}_min), COALESCE(excluded.ret{i}_min, ret{i}_min))'
+	f', ret{i}_max = MAX(COALESCE(ret{i}_max, excluded.ret{i}_max), COALESCE(excluded.ret{i}_max, ret{i}_max))'
+	f', ret{i}_sum = ret{i}_sum + excluded.ret{i}_sum' for i in range(RET_COLUMNS))
+
 class GlitchSQLite():
+	'''
+	Glitch campaigns in a SQLite database: one row per campaign in `campaigns` and one row per
+	attempt in `attempts`, keyed by campaign id. Results are stored as small integers (see
+	:py:data:`~RESULT_CODES` and the `result_codes` table), the values returned by the target in
+	the integer columns `ret0`... (named in `campaigns.ret_vars`) and raw data in `data`.
+	Queries by result or by settings within a campaign are answered from covering indexes, and a
+	trigger keeps `rollups` up to date: the number of attempts and the min/max/sum of the return
+	values for every setting and result, so plots and summaries do not scan the attempts. Every
+	attempt gets a `uuid` (see :py:func:`~attempt_uuid`), used to skip duplicates when databases
+	are merged (`merge_db.py`).
+
+	Every campaign also gets a view named after it with the columns of the legacy
+	one-table-per-campaign layout, and `settings` and `runtimes` are views, so existing
+	notebook queries keep working. Legacy databases are converted with `migrate_db.py`.
+	'''
+	RESERVED_NAMES = ('campaigns', 'result_codes', 'attempts', 'rollups', 'settings', 'runtimes')
+
 	def __init__(self, db_name: str, table_name: str, settings: str, extra: str):
 		'''
 		Args:
 			db_name (str): Database filename
-			table_name (str): Table name (some name that identifies this glitch campaign)
+			table_name (str): Campaign name (some name that identifies this glitch campaign)
 			settings (str): Settings string (e.g. `ext_offset=100:300(1),width=75:125(1),voltage=35:36(1),prep_voltage=42(1)`)
 			extra (str): Extra string that helps in identifying the experiment (e.g. target software commit hash)
 		'''
@@ -27,64 +248,192 @@ class GlitchSQLite():
 		self.settings: str = settings
 		self.extra: str = extra
 		self.conn: sqlite3.Connection = sqlite3.connect(db_name)
+		self.conn.execute('PRAGMA journal_mode=WAL') # Readers (e.g. notebooks) do not block the writer
+		self.conn.create_function('attempt_uuid', 6, attempt_uuid, deterministic=True)
 		self.c: sqlite3.Cursor = self.conn.cursor()
-		if not self.has_table('settings'):
-			self.c.execute('CREATE TABLE settings (table_name TEXT PRIMARY KEY, settings TEXT, extra TEXT)')
-		if not self.has_table('runtimes'):
-			self.c.execute('CREATE TABLE runtimes (table_name TEXT PRIMARY KEY, runtime REAL)')
+		self.writer: BatchWriter|None = None
+		self._inserts: dict[int, str] = {} # INSERT statement for every number of return values
+		self._run = os.urandom(16) # Source key of the attempts inserted by this instance, see attempt_uuid()
+		self._inserted = 0
+		version = self.c.execute('PRAGMA user_version').fetchone()[0]
+		if version == 0:
+			if self.has_table('settings'):
+				raise ValueError(f'{db_name} uses the legacy one-table-per-campaign layout, convert it with migrate_db.py')
+			self.c.executescript(SCHEMA + ATTEMPTS_SCHEMA + ROLLUPS_SCHEMA + ROLLUPS_TRIGGER)
+			self.c.executemany('INSERT INTO result_codes VALUES (?, ?)', [(code, result.name) for result, code in RESULT_CODES.items()])
+			self.c.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+			self.conn.commit()
+		elif version != SCHEMA_VERSION:
+			raise ValueError(f'{db_name} has schema version {version}, expected {SCHEMA_VERSION}')
+		self.campaign_id: int|None = self.get_campaign_id()
 
 	def __del__(self):
 		self.close()
 
-	def has_table(self, table_name: str = '') -> bool:
+	def start_writer(self, commit_rows: int = 256, commit_interval: float = 1.0, queue_size: int = 4096) -> None:
+		'''
+		Store the results of :py:meth:`~insert_result` from a background thread, in batches (see
+		:py:class:`~BatchWriter`). Other methods flush the queued results first.
+		'''
+		self.conn.commit()
+		self.writer = BatchWriter(self.db_name, commit_rows, commit_interval, queue_size)
+
+	@property
+	def queue_depth(self) -> int:
+		'''
+		Results waiting to be stored by the background writer
+		'''
+		return self.writer.depth if self.writer is not None else 0
+
+	def flush(self) -> None:
+		'''
+		Wait until the results queued for the background writer are committed
+		'''
+		if self.writer is not None:
+			self.writer.flush()
+
+	def has_table(self, table_name: str) -> bool:
 		'''
 		Check if a table exists in the database
+		'''
+		self.c.execute('SELECT name FROM sqlite_master WHERE type="table" AND name=?', (table_name,))
+		return self.c.fetchone() is not None
+
+	def get_campaign_id(self, table_name: str = '') -> int|None:
+		'''
+		Id of a campaign, None if it does not exist
 
 		Args:
-			table_name (str): Table name to check for. If empty, it will check for the default table name
+			table_name (str): Campaign name. If empty, the default campaign
 		'''
-		self.c.execute(f'SELECT name FROM sqlite_master WHERE type="table" AND name="{table_name if table_name else self.table_name}"')
-		return self.c.fetchone() is not None
+		self.c.execute('SELECT id FROM campaigns WHERE name=?', (table_name if table_name else self.table_name,))
+		row = self.c.fetchone()
+		return row[0] if row else None
+
+	def _campaign(self, table_name: str = '') -> int:
+		campaign = self.campaign_id if not table_name else self.get_campaign_id(table_name)
+		if campaign is None:
+			raise ValueError(f'Campaign {table_name if table_name else self.table_name} not found in {self.db_name}')
+		return campaign
+
+	def has_campaign(self, table_name: str = '') -> bool:
+		'''
+		Check if a campaign exists in the database
+
+		Args:
+			table_name (str): Campaign name to check for. If empty, it will check for the default campaign
+		'''
+		return self.get_campaign_id(table_name) is not None
 
 	def get_settings(self, table_name: str = '') -> tuple[str, str]:
 		'''
-		Get settings and extra associated with a table name
+		Get settings and extra associated with a campaign
 
 		Args:
-			table_name (str): Table name to get settings from. If empty, it will get settings from the default table name
+			table_name (str): Campaign name to get settings from. If empty, it will get settings from the default campaign
 
 		Returns:
 			(str, str): settings, extra
 		'''
-		self.c.execute(f'SELECT settings, extra FROM settings WHERE table_name="{table_name if table_name else self.table_name}"')
+		self.c.execute('SELECT settings, extra FROM campaigns WHERE name=?', (table_name if table_name else self.table_name,))
 		return self.c.fetchone()
 
 	def count_rows(self, table_name: str = '') -> int:
 		'''
-		Count the number of rows in a table
+		Count the attempts of a campaign
 
 		Args:
-			table_name (str): Table name to count rows from. If empty, it will count rows from the default table name
+			table_name (str): Campaign name to count attempts from. If empty, it will count attempts from the default campaign
 		'''
-		self.c.execute(f'SELECT COUNT(*) FROM {table_name if table_name else self.table_name}')
+		self.flush()
+		self.c.execute('SELECT COALESCE(SUM(count), 0) FROM rollups WHERE campaign=?', (self._campaign(table_name),))
 		return self.c.fetchone()[0]
 
-	def create_table(self, target_type: TargetType) -> None:
+	def result_counts(self, table_name: str = '') -> dict[GlitchResult, int]:
+		'''
+		Count the attempts of a campaign by result, from the roll-ups
 
-		query  = f'CREATE TABLE {self.table_name} '
-		query += '(ext_offset INTEGER, width INTEGER, voltage INTEGER, prep_voltage INTEGER, result STRING, data BLOB'
-		for var in target_type.ret_vars:
-			query += f', {var} INTEGER'
-		query += ')'
-		self.c.execute(query)
-		self.c.execute('INSERT INTO settings VALUES (?, ?, ?)', (self.table_name, self.settings, self.extra))
+		Args:
+			table_name (str): Campaign name. If empty, the default campaign
+		'''
+		self.flush()
+		self.c.execute('SELECT result, SUM(count) FROM rollups WHERE campaign=? GROUP BY result', (self._campaign(table_name),))
+		return {RESULTS[result]: count for result, count in self.c.fetchall()}
+
+	def rebuild_rollups(self, table_name: str = '') -> None:
+		'''
+		Recompute the roll-ups from the attempts, e.g. after attempts were deleted (the trigger only
+		handles inserts)
+
+		Args:
+			table_name (str): Campaign name. If empty, every campaign
+		'''
+		self.flush()
+		where = ''
+		args: tuple = ()
+		if table_name:
+			where = 'WHERE campaign=?'
+			args = (self._campaign(table_name),)
+		self.c.execute(f'DELETE FROM rollups {where}', args)
+		ret_cols = ''.join(f', MIN(ret{i}), MAX(ret{i}), COALESCE(SUM(ret{i}), 0)' for i in range(RET_COLUMNS))
+		self.c.execute(f'''INSERT INTO rollups
+			SELECT campaign, ext_offset, width, voltage, prep_voltage, result, COUNT(*), COUNT(ret0){ret_cols}
+			FROM attempts {where} GROUP BY campaign, ext_offset, width, voltage, prep_voltage, result''', args)
+		self.conn.commit()
+
+	def rollup_attempts(self, after: int) -> None:
+		'''
+		Add the attempts with a rowid greater than `after` to the roll-ups, without committing. For
+		bulk copies made with the roll-up trigger dropped (see `merge_db.py`): one update per cell
+		instead of one per attempt
+		'''
+		ret_cols = ''.join(f', MIN(ret{i}), MAX(ret{i}), COALESCE(SUM(ret{i}), 0)' for i in range(RET_COLUMNS))
+		self.c.execute(f'''INSERT INTO rollups
+			SELECT campaign, ext_offset, width, voltage, prep_voltage, result, COUNT(*), COUNT(ret0){ret_cols}
+			FROM attempts WHERE rowid > ? GROUP BY campaign, ext_offset, width, voltage, prep_voltage, result
+			{ROLLUPS_UPSERT}''', (after,))
+
+	def add_campaign(self, name: str, target: str|None, ret_vars: list[str], settings: str|None, extra: str|None,
+			runtime: float = 0.0) -> int:
+		'''
+		Add a campaign and its legacy view, without committing
+
+		Args:
+			name: Campaign name
+			target: Operation name of the target (see :py:func:`~target_op_names`), if known
+			ret_vars: Names of the values returned by the target
+			settings: Settings string (see :py:func:`~settings_to_str`)
+			extra: Description of the campaign
+			runtime: Acquisition time already spent (s)
+
+		Returns:
+			The campaign id
+		'''
+		if name.lower() in self.RESERVED_NAMES or name.startswith('sqlite_'):
+			raise ValueError(f'Invalid campaign name {name}')
+		if len(ret_vars) > RET_COLUMNS:
+			raise ValueError(f'Too many return values ({len(ret_vars)}), at most {RET_COLUMNS} are stored')
+		self.c.execute('INSERT INTO campaigns(name, target, ret_vars, settings, extra, runtime) VALUES (?, ?, ?, ?, ?, ?)',
+			(name, target, ','.join(ret_vars), settings, extra, runtime))
+		campaign = self.c.lastrowid
+		ret_cols = ''.join(f', COALESCE(a.ret{i}, 0) AS "{var}"' for i, var in enumerate(ret_vars))
+		self.c.execute(f'''CREATE VIEW "{name.replace('"', '""')}" AS
+			SELECT a.ext_offset, a.width, a.voltage, a.prep_voltage, r.name AS result, COALESCE(a.data, x'') AS data{ret_cols}
+			FROM attempts a JOIN result_codes r ON r.code = a.result WHERE a.campaign = {campaign}''')
+		return campaign # type: ignore
+
+	def create_campaign(self, target_type: TargetType) -> None:
+		'''
+		Add the default campaign
+		'''
+		self.campaign_id = self.add_campaign(self.table_name, target_type.op_name, target_type.ret_vars, self.settings, self.extra)
 		self.conn.commit()
 
 	def insert_result(self, target_type: TargetType,
 				   ext_offset: int, width: int, voltage: int, prep_voltage: int, result: GlitchResult,
-				   data: tuple|bytes|None = b'', ) -> None:
+				   data: tuple|bytes|None = None, ) -> None:
 		'''
-		Insert a result into the database
+		Insert a result into the default campaign
 
 		Args:
 			target_type (TargetType): Target type
@@ -93,37 +442,86 @@ class GlitchSQLite():
 			voltage (int): Glitch voltage
 			prep_voltage (int): Preparation voltage
 			result (GlitchResult): Glitch result
-			data (tuple|bytes|None): Data associated with the result
+			data (tuple|bytes|None): Values returned by the target (stored in `ret0`...) or raw data (stored in `data`)
 		'''
-
 		if type(data) is tuple:
 			data_tuple = data
-			data_blob = b''
+			data_blob = None
 		elif type(data) is bytes:
-			data_tuple = tuple([0] * target_type.ret_count)
+			data_tuple = (None,) * target_type.ret_count
 			data_blob = data
 		elif data is None:
-			data_tuple = tuple([0] * target_type.ret_count)
-			data_blob = b''
+			data_tuple = (None,) * target_type.ret_count
+			data_blob = None
 		else:
 			raise ValueError(f'Invalid data type {type(data)}')
 
-		query = f'INSERT INTO {self.table_name} VALUES (?, ?, ?, ?, ?, ?' # ext_offset, width, voltage, prep_voltage, result, data
-		query += ', ?' * target_type.ret_count
-		query += ')'
-		self.c.execute(query, (ext_offset, width, voltage, prep_voltage, result.name, data_blob, *data_tuple))
-		self.conn.commit()
+		query = self._inserts.get(target_type.ret_count)
+		if query is None:
+			if target_type.ret_count > RET_COLUMNS:
+				raise ValueError(f'Too many return values ({target_type.ret_count}), at most {RET_COLUMNS} are stored')
+			ret_cols = ''.join(f', ret{i}' for i in range(target_type.ret_count))
+			query = f'INSERT INTO attempts(campaign, ext_offset, width, voltage, prep_voltage, result, uuid, data{ret_cols}) VALUES (?, ?, ?, ?, ?, ?, ?, ?'
+			query += ', ?' * target_type.ret_count
+			query += ')'
+			self._inserts[target_type.ret_count] = query
+		uuid = attempt_uuid(self._run, self._inserted, ext_offset, width, voltage, prep_voltage)
+		self._inserted += 1
+		row = (self._campaign(), ext_offset, width, voltage, prep_voltage, RESULT_CODES[result], uuid, data_blob, *data_tuple)
+		if self.writer is not None:
+			self.writer.put(query, row)
+		else:
+			self.c.execute(query, row)
+			self.conn.commit()
 
-	def set_runtime(self, runtime: float) -> None: # Inserts or increases the runtime
-		self.c.execute(f'INSERT INTO runtimes(table_name, runtime) VALUES(?, ?) ON CONFLICT(table_name) DO UPDATE SET runtime=runtime+{runtime}', (self.table_name, runtime))
+	def set_runtime(self, runtime: float) -> None: # Increases the runtime
+		self.flush()
+		self.c.execute('UPDATE campaigns SET runtime = runtime + ? WHERE id=?', (runtime, self._campaign()))
 		self.conn.commit()
 
-	def set_schema(self, schema: str) -> None:
-		self.c.execute(f'CREATE TABLE {self.table_name} {schema}')
+	def save_checkpoint(self, state: dict) -> None:
+		'''
+		Store the sampler state of the campaign (see :py:meth:`~GlitchController.checkpoint`), replacing the previous one.
+		The queued results are stored first, so the state never gets ahead of the table.
+		'''
+		self.flush()
+		self.c.execute('UPDATE campaigns SET checkpoint=?, checkpoint_time=? WHERE id=?', (json.dumps(state), time.time(), self._campaign()))
 		self.conn.commit()
 
+	def load_checkpoint(self) -> dict|None:
+		'''
+		Last sampler state stored with :py:meth:`~save_checkpoint`, if any
+		'''
+		self.c.execute('SELECT checkpoint FROM campaigns WHERE id=?', (self._campaign(),))
+		row = self.c.fetchone()
+		return json.loads(row[0]) if row and row[0] else None
+
+	def iter_results(self, chunk_size: int = 4096) -> Iterator[tuple[GlitchSettings, GlitchResult]]:
+		'''
+		Stream the settings and result of every attempt of the campaign, in insertion order
+
+		Args:
+			chunk_size: Rows fetched at a time
+		'''
+		self.flush()
+		c = self.conn.cursor()
+		# Walk the table in rowid order rather than sorting the index entries of the campaign
+		c.execute('SELECT ext_offset, width, voltage, prep_voltage, result FROM attempts NOT INDEXED WHERE campaign=? ORDER BY rowid', (self._campaign(),))
+		while rows := c.fetchmany(chunk_size):
+			for ext_offset, width, voltage, prep_voltage, result in rows:
+				yield {'ext_offset': ext_offset, 'width': width, 'voltage': voltage, 'prep_voltage': prep_voltage}, RESULTS[result]
+		c.close()
+
 	def close(self) -> None:
-		self.conn.close()
+		'''
+		Store the queued results, stop the background writer and close the database
+		'''
+		try:
+			if self.writer is not None:
+				writer, self.writer = self.writer, None
+				writer.stop()
+		finally:
+			self.conn.close()
 
 
 
@@ -135,6 +533,14 @@ def reset_target(ps: PowerSupply, glitcher: Picocoder, retries: int = 3) -> None
 	else:
 		raise ConnectionError('Target not responding after reset')
 
+async def reset_target_async(ps: PowerSupply, glitcher: 'AsyncPicocoder', retries: int = 3) -> None:
+	for _ in range(retries):
+		await asyncio.to_thread(ps.power_cycle)
+		if await glitcher.ping_target():
+			break
+	else:
+		raise ConnectionError('Target not responding after reset')
+
 def settings_to_str(ext_offset: list, width: list, voltage: list, prep_voltage: list) -> str:
 	ret = 'ext_offset'
 	if ext_offset[0] == ext_offset[1]:
@@ -162,22 +568,77 @@ def settings_to_str(ext_offset: list, width: list, voltage: list, prep_voltage:
 		ret += f'({prep_voltage[2]})'
 	return ret
 
+class Checkpointer:
+	'''
+	Saves the sampler state of a campaign to the database every `interval` seconds
+	'''
+	def __init__(self, db: GlitchSQLite, gc: GlitchController, interval: float):
+		self.db = db
+		self.gc = gc
+		self.interval = interval
+		self.last = time.monotonic()
+
+	def __call__(self) -> None:
+		if time.monotonic() - self.last >= self.interval:
+			self.save()
+
+	def save(self) -> None:
+		self.db.save_checkpoint(self.gc.checkpoint())
+		self.last = time.monotonic()
+
 def glitch_loop(
 			db: GlitchSQLite,
 			ps: PowerSupply,
 			gc: GlitchController,
 			glitcher: Picocoder,
 			stop_half_success: bool,
-			stop_success: bool
+			stop_success: bool,
+			timer: PhaseTimer|None = None,
+			checkpoint_interval: float = 60.0
 		) -> int:
+	'''
+	Args:
+		timer: If given, the phases of every attempt are timed (see :py:attr:`~Picocoder.timer`),
+			plus 'insert' (DB write), 'reset' (target power cycle) and 'controller' (feedback to
+			the sampler, see :py:meth:`~GlitchController.add_result`)
+		checkpoint_interval: Seconds between two checkpoints of the sampler state in `campaigns.checkpoint`
+			(see :py:class:`~Checkpointer` and :py:meth:`~GlitchSQLite.save_checkpoint`)
+	'''
+	glitcher.timer = timer
+	checkpoint = Checkpointer(db, gc, checkpoint_interval)
 	start_time = time.time()
-	for i, gs in enumerate(gc.rand_glitch_values()):
+	for i, gs in enumerate(gc.glitch_values()):
 		if i % 5 == 0:
-			print(f'Iteration {i}, rate {i/(time.time()-start_time):.2f}Hz         ', end='\r', flush=True) # spaces to overwrite prev line
+			print(f'Iteration {i}, rate {i/(time.time()-start_time):.2f}Hz, DB queue {db.queue_depth}         ', end='\r', flush=True) # spaces to overwrite prev line
+			checkpoint()
 		try:
+			if timer is not None:
+				timer.begin()
+			t = time.perf_counter()
 			result, data = glitcher.glitch(gs)
 			db.insert_result(glitcher.tc, gs['ext_offset'], gs['width'], gs['voltage'], gs['prep_voltage'], result, data)
+			if timer is not None:
+				timer.lap('insert')
 
+			reset_failed = False
+			# A half-success that stops the campaign leaves the target in its current state
+			if result in RESET_RESULTS and not (stop_half_success and result == GlitchResult.HALF_SUCCESS):
+				try:
+					reset_target(ps, glitcher)
+				except ConnectionError:
+					reset_failed = True
+				if timer is not None:
+					timer.lap('reset')
+			gc.add_result(gs, result, data, time.perf_counter() - t) # The cost includes the reset
+			if timer is not None:
+				timer.lap('controller')
+				timer.end(result.name) # Before the attempt can end the campaign
+
+			if reset_failed:
+				print('Failed to reset target, shutting down')
+				checkpoint.save()
+				ps.on = False
+				return 1
 			if stop_half_success and result == GlitchResult.HALF_SUCCESS:
 				print('Half-success detected, stopping. Target is left in its current state')
 				break
@@ -185,13 +646,106 @@ def glitch_loop(
 				print('Success detected, stopping. Target is left in its current state')
 				break
 
-			if result in [GlitchResult.RESET, GlitchResult.BROKEN, GlitchResult.HALF_SUCCESS]:
+		except KeyboardInterrupt:
+			end_time = time.time()
+			print(f'\nExiting. Total runtime: {end_time-start_time:.2f}s')
+			db.set_runtime(end_time-start_time)
+			ps.power_cycle()
+			break
+	else:
+		print('\nAll glitch values attempted')
+		db.set_runtime(time.time()-start_time)
+	checkpoint.save()
+	if timer is not None:
+		timer.dump()
+		print(timer.summary())
+	return 0
+
+def glitch_loop_batch(
+			db: GlitchSQLite,
+			ps: PowerSupply,
+			gc: GlitchController,
+			glitcher: Picocoder,
+			stop_half_success: bool,
+			stop_success: bool,
+			batch_size: int,
+			schedule: bool = False,
+			checkpoint_interval: float = 60.0
+		) -> int:
+	'''
+	Same as :py:func:`~glitch_loop`, but settings are uploaded to the glitcher `batch_size` at a time.
+	Pick the batch size according to the reset rate of the target: a batch stops at the first
+	reset, and the settings that were not attempted are sent again with the next batch.
+
+	Args:
+		schedule: Order the settings by their learned probability of resetting the target and size
+			the batches accordingly (see :py:meth:`~GlitchController.scheduled_glitch_values`)
+		checkpoint_interval: Seconds between two checkpoints of the sampler state
+	'''
+	checkpoint = Checkpointer(db, gc, checkpoint_interval)
+	start_time = time.time()
+	if schedule:
+		batches = gc.scheduled_glitch_values(batch_size)
+	else:
+		values = gc.glitch_values()
+	queue: list[GlitchSettings] = []
+	i = 0
+	while True:
+		status = f'Iteration {i}, rate {i/(time.time()-start_time):.2f}Hz, DB queue {db.queue_depth}'
+		if gc.scheduler is not None:
+			status += f', expected cost {gc.scheduler.expected_cost * 1000:.1f}ms/attempt'
+		print(f'{status}         ', end='\r', flush=True) # spaces to overwrite prev line
+		checkpoint()
+		try:
+			if not schedule:
+				queue.extend(islice(values, batch_size - len(queue)))
+			elif not queue:
+				queue.extend(next(batches, []))
+			if not queue:
+				print('\nAll glitch values attempted')
+				db.set_runtime(time.time()-start_time)
+				break
+			t = time.perf_counter()
+			results = glitcher.glitch_batch(queue)
+			elapsed = time.perf_counter() - t
+			if gc.scheduler is not None:
+				gc.scheduler.observe_attempts(elapsed, len(results))
+			attempted = queue[:len(results)]
+			for gs, (result, data) in zip(attempted, results):
+				db.insert_result(glitcher.tc, gs['ext_offset'], gs['width'], gs['voltage'], gs['prep_voltage'], result, data)
+			del queue[:len(results)]
+			i += len(results)
+
+			half_success = stop_half_success and any(result == GlitchResult.HALF_SUCCESS for result, _ in results)
+			success = stop_success and any(result == GlitchResult.SUCCESS for result, _ in results)
+			reset_time, reset_failed = 0.0, False
+			result, _ = results[-1]
+			if result in RESET_RESULTS and not (half_success or success):
+				t = time.perf_counter()
 				try:
 					reset_target(ps, glitcher)
 				except ConnectionError:
-					print('Failed to reset target, shutting down')
-					ps.on = False
-					return 1
+					reset_failed = True
+				reset_time = time.perf_counter() - t
+				if gc.scheduler is not None and not reset_failed:
+					gc.scheduler.observe_reset(reset_time)
+			# The batch time is shared by its attempts, the reset is charged to the last one that caused it
+			costs = [elapsed / len(results)] * len(results)
+			costs[-1] += reset_time
+			for gs, (result, data), cost in zip(attempted, results, costs):
+				gc.add_result(gs, result, data, cost)
+
+			if reset_failed:
+				print('Failed to reset target, shutting down')
+				checkpoint.save()
+				ps.on = False
+				return 1
+			if half_success:
+				print('Half-success detected, stopping. Target is left in its current state')
+				break
+			if success:
+				print('Success detected, stopping. Target is left in its current state')
+				break
 
 		except KeyboardInterrupt:
 			end_time = time.time()
@@ -199,36 +753,115 @@ def glitch_loop(
 			db.set_runtime(end_time-start_time)
 			ps.power_cycle()
 			break
+	checkpoint.save()
 	return 0
 
-def main(a: Namespace) -> int:
-	settings_str = settings_to_str(a.ext_offset, a.width, a.voltage, a.prep_voltage)
-	db = GlitchSQLite(a.db_file, a.db_table, settings_str, a.extra_descr)
-	if db.has_table():
-		count = db.count_rows()
-		resp = input(f'Table {a.db_table} already exists in {a.db_file} with {count} rows. Append to it? [Y/n] ')
-		if resp.lower() != 'y' and resp.lower() != '':
-			return 1
-	else:
-		db.create_table(picocoder_client.target_from_opname(a.operation))
+async def glitch_loop_async(
+			db: GlitchSQLite,
+			ps: PowerSupply,
+			gc: GlitchController,
+			glitcher: 'AsyncPicocoder',
+			stop_half_success: bool,
+			stop_success: bool,
+			checkpoint_interval: float = 60.0
+		) -> int:
+	'''
+	Same as :py:func:`~glitch_loop`, but the result of an attempt is stored and the settings for
+	the next one are drawn while the glitcher is busy with the following attempt.
+	'''
+	checkpoint = Checkpointer(db, gc, checkpoint_interval)
+	start_time = time.time()
+	values = gc.glitch_values()
+	gs = next(values, None)
+	pending = None # Result not yet stored in the DB, with the cost of its attempt
+	def store_pending():
+		nonlocal pending
+		if pending is not None:
+			pgs, presult, pdata, pcost = pending
+			db.insert_result(glitcher.tc, pgs['ext_offset'], pgs['width'], pgs['voltage'], pgs['prep_voltage'], presult, pdata)
+			gc.add_result(pgs, presult, pdata, pcost)
+			pending = None
+
+	i = 0
+	try:
+		while gs is not None:
+			if i % 5 == 0:
+				print(f'Iteration {i}, rate {i/(time.time()-start_time):.2f}Hz, DB queue {db.queue_depth}         ', end='\r', flush=True) # spaces to overwrite prev line
+				checkpoint()
+			t = time.perf_counter()
+			attempt = asyncio.create_task(glitcher.glitch(gs))
+			await asyncio.sleep(0) # Let the attempt reach the glitcher before doing local work
+			store_pending()
+			next_gs = next(values, None)
+			result, data = await attempt
+			cost = time.perf_counter() - t
+			pending = (gs, result, data, cost)
 
-	ps = KA3305P(port=a.power_supply_port, cycle_wait=0.5)
-	ps.con()
-	ps.power_cycle()
+			if stop_half_success and result == GlitchResult.HALF_SUCCESS:
+				store_pending()
+				print('Half-success detected, stopping. Target is left in its current state')
+				break
+			if stop_success and result == GlitchResult.SUCCESS:
+				store_pending()
+				print('Success detected, stopping. Target is left in its current state')
+				break
 
-	glitcher = Picocoder(a.glitcher_port, GLITCHER_BAUD)
+			if result in RESET_RESULTS:
+				t = time.perf_counter()
+				try:
+					await reset_target_async(ps, glitcher)
+				except ConnectionError:
+					store_pending()
+					print('Failed to reset target, shutting down')
+					checkpoint.save()
+					ps.on = False
+					return 1
+				# The cost includes the reset, the result is stored during the next attempt
+				pending = (gs, result, data, cost + time.perf_counter() - t)
+			gs = next_gs
+			i += 1
+		else:
+			store_pending()
+			print('\nAll glitch values attempted')
+			db.set_runtime(time.time()-start_time)
+
+	except (KeyboardInterrupt, asyncio.CancelledError):
+		store_pending()
+		end_time = time.time()
+		print(f'\nExiting. Total runtime: {end_time-start_time:.2f}s')
+		db.set_runtime(end_time-start_time)
+		ps.power_cycle()
+	checkpoint.save()
+	return 0
+
+async def main_async(a: Namespace, db: GlitchSQLite, ps: PowerSupply, gc: GlitchController) -> int:
+	from picocoder_client.picocoder_async import AsyncPicocoder # Requires pyserial-asyncio
+
+	glitcher = await AsyncPicocoder.open(a.glitcher_port, GLITCHER_BAUD)
 	glitcher.tc = picocoder_client.target_from_opname(a.operation)
-	if not glitcher.ping():
+	if a.per_setter:
+		glitcher.fast_arm = False # Otherwise picked according to the firmware version
+	if not await glitcher.ping():
 		raise ConnectionError('Glitcher not responding')
-	if not glitcher.ping_target():
+	if not await glitcher.ping_target():
 		raise ConnectionError('Target not responding')
 
-	max_total_duration = glitcher.measure_loop_duration()
+	check_loop_duration(a, await glitcher.measure_loop_duration())
+	ret = await glitch_loop_async(db, ps, gc, glitcher, a.stop_half_success, a.stop_success, a.checkpoint_interval)
+	glitcher.close()
+	return ret
+
+def check_loop_duration(a: Namespace, max_total_duration: int) -> None:
 	if max_total_duration < 0:
 		raise ValueError(f'Invalid duration {max_total_duration}')
 	if a.ext_offset[2] + a.width[2] > max_total_duration:
 		raise ValueError(f'Max ext_offset + max width > max_total_duration: ({a.ext_offset[2]} + {a.width[2]} > {max_total_duration})')
 
+def make_controller(a: Namespace, history: GlitchSQLite|None = None) -> GlitchController:
+	'''
+	Args:
+		history: Continue the campaign stored in this database (see :py:meth:`~GlitchController.resume`)
+	'''
 	gc = GlitchControllerTPS65094(groups=[r.name for r in GlitchResult], parameters=['ext_offset', 'width', 'voltage', 'prep_voltage'], nominal_voltage=1.24)
 	gc.set_range('ext_offset', a.ext_offset[0], a.ext_offset[1])
 	gc.set_step('ext_offset', a.ext_offset[2])
@@ -238,14 +871,66 @@ def main(a: Namespace) -> int:
 	gc.set_step('voltage', a.voltage[2])
 	gc.set_range('prep_voltage', a.prep_voltage[0], a.prep_voltage[1])
 	gc.set_step('prep_voltage', a.prep_voltage[2])
+	gc.set_sampler(a.sampler, a.sampler_seed, **({'order': a.sweep_order} if a.sampler == 'sweep' and a.sweep_order else {}))
+	if history is not None:
+		gc.resume(history.load_checkpoint(), history.iter_results())
+	return gc
 
-	glitch_loop(db, ps, gc, glitcher, a.stop_half_success, a.stop_success)
+def main(a: Namespace) -> int:
+	settings_str = settings_to_str(a.ext_offset, a.width, a.voltage, a.prep_voltage)
+	db = GlitchSQLite(a.db_file, a.db_table, settings_str, a.extra_descr)
+	resume = db.has_campaign()
+	if resume:
+		count = db.count_rows()
+		resp = input(f'Campaign {a.db_table} already exists in {a.db_file} with {count} attempts. Append to it? [Y/n] ')
+		if resp.lower() != 'y' and resp.lower() != '':
+			return 1
+	else:
+		db.create_campaign(picocoder_client.target_from_opname(a.operation))
+	gc = make_controller(a, db if resume and not a.no_resume else None)
+	if not a.sync_writes:
+		db.start_writer(a.commit_rows, a.commit_interval)
+	writer = db.writer
+	try:
+		return run_campaign(a, db, gc)
+	finally:
+		db.close() # Stores the queued results, also on fatal errors
+		if writer is not None:
+			print(f'Stored {writer.written} results, highest DB queue depth {writer.max_depth}')
+
+def run_campaign(a: Namespace, db: GlitchSQLite, gc: GlitchController) -> int:
+	'''
+	Connect to the rig and run the acquisition loop selected by the command line arguments
+	'''
+	ps = KA3305P(port=a.power_supply_port, cycle_wait=0.5)
+	ps.con()
+	ps.power_cycle()
+
+	if a.use_async:
+		return asyncio.run(main_async(a, db, ps, gc))
+
+	glitcher = Picocoder(a.glitcher_port, GLITCHER_BAUD)
+	glitcher.tc = picocoder_client.target_from_opname(a.operation)
+	if a.per_setter:
+		glitcher.fast_arm = False # Otherwise picked according to the firmware version
+	if not glitcher.ping():
+		raise ConnectionError('Glitcher not responding')
+	if not glitcher.ping_target():
+		raise ConnectionError('Target not responding')
+
+	check_loop_duration(a, glitcher.measure_loop_duration())
+
+	if a.batch_size > 1:
+		glitch_loop_batch(db, ps, gc, glitcher, a.stop_half_success, a.stop_success, a.batch_size, a.schedule, a.checkpoint_interval)
+	else:
+		timer = PhaseTimer(a.timings, a.timings_interval) if a.timings else None
+		glitch_loop(db, ps, gc, glitcher, a.stop_half_success, a.stop_success, timer, a.checkpoint_interval)
 	return 0
 
 if __name__ == '__main__':
 	argparser = ArgumentParser(description='Simple script to run a glitch campaign and save results to a database')
 	argparser.add_argument('db_file', default='glitch_results.db', type=str, help='Database file name')
-	argparser.add_argument('db_table', type=str, help='Database table name (e.g. target commit hash) - Don\'t name it `; OR 1=1` please')
+	argparser.add_argument('db_table', type=str, help='Campaign name (e.g. target commit hash)')
 	argparser.add_argument('operation', type=str, choices=picocoder_client.target_op_names(), help='The operation to glitch')
 	argparser.add_argument('--power-supply-port', default='/dev/ttyACM0', type=str, help='Power supply serial port (default /dev/ttyACM0)')
 	argparser.add_argument('--glitcher-port', default='/dev/ttyACM1', type=str, help='Glitcher serial port (default /dev/ttyACM1)')
@@ -256,6 +941,21 @@ if __name__ == '__main__':
 	argparser.add_argument('--extra-descr', default='', type=str, help='Description of the glitch campaign (e.g. target software commit hash)')
 	argparser.add_argument('-s', '--stop-half-success', default=False, action='store_true', help='Stop the glitch campaign if a half-success is detected')
 	argparser.add_argument('-S', '--stop-success', default=False, action='store_true', help='Stop the glitch campaign if a success is detected')
+	argparser.add_argument('--sampler', default='random', type=str, choices=GlitchController.SAMPLERS, help='random: independent draws, repetitions possible; exhaustive: every lattice point once, in pseudo-random order; sweep: every lattice point once, changing one parameter at a time; zoom: coarse sweep, then refine around (half) successes; bandit: Thompson sampling of (half) successes per second (default random)')
+	argparser.add_argument('--sampler-seed', default=None, type=int, help='Seed of the sampler (default: random, or the one of the campaign when resuming it)')
+	argparser.add_argument('--sweep-order', nargs=4, default=None, type=str, choices=['ext_offset', 'width', 'voltage', 'prep_voltage'], metavar='PARAM',
+		help='Parameters of the sweep sampler from the slowest to the fastest changing (default prep_voltage voltage width ext_offset)')
+	argparser.add_argument('--per-setter', default=False, action='store_true', help='Send the settings that changed with one command each and then arm, as with firmware without P_CMD_ARM_SETTINGS, which is detected on connection (pairs with --sampler sweep)')
+	argparser.add_argument('--batch-size', default=1, type=int, help=f'Upload settings to the glitcher in batches of this size (max {picocoder_client.GLITCH_BATCH_MAX}, default 1: no batching)')
+	argparser.add_argument('--schedule', default=False, action='store_true', help='With --batch-size: group the settings by their learned probability of resetting the target, so that batches of safe settings run to the end')
+	argparser.add_argument('--async', dest='use_async', default=False, action='store_true', help='Use the asyncio client, overlapping DB writes with the glitcher (requires pyserial-asyncio)')
+	argparser.add_argument('--timings', default=None, type=str, metavar='FILE', help='Time every phase of the glitch loop and dump latency histograms to this JSON file (not with --batch-size or --async)')
+	argparser.add_argument('--timings-interval', default=10.0, type=float, help='Seconds between two dumps of the timings (default 10)')
+	argparser.add_argument('--checkpoint-interval', default=60.0, type=float, help='Seconds between two checkpoints of the sampler state in the database (default 60)')
+	argparser.add_argument('--no-resume', default=False, action='store_true', help='When appending to an existing table, start the sampler from scratch instead of continuing the previous runs')
+	argparser.add_argument('--commit-rows', default=256, type=int, help='Commit the results to the database every this many rows (default 256)')
+	argparser.add_argument('--commit-interval', default=1.0, type=float, help='Commit the results to the database at least every this many seconds (default 1)')
+	argparser.add_argument('--sync-writes', default=False, action='store_true', help='Store and commit every result from the acquisition loop instead of a background writer')
 	args = argparser.parse_args()
 
 	exit(main(args))
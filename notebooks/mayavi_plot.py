@@ -9,6 +9,21 @@ from picocoder_client import GlitchResult
 
 conn: sqlite3.Connection = sqlite3.connect('/tmp/glitch2.db')
 c: sqlite3.Cursor = conn.cursor()
+PARQUET_DIR: str|None = None # Output of columnar.py, if set the rows are read from there instead of the database
+
+def fetch_rows(table_name: str, result: GlitchResult|None = None) -> tuple[list[str], list[tuple]]:
+	'''
+	Columns and rows of a campaign table, optionally only those with the given result
+	'''
+	if PARQUET_DIR is not None:
+		from columnar import load_rows # Requires pyarrow
+		columns, rows = load_rows(PARQUET_DIR, table_name, result)
+		return columns, list(rows)
+	if result is None:
+		c.execute(f'SELECT * FROM {table_name}')
+	else:
+		c.execute(f'SELECT * FROM {table_name} WHERE result == ?', (result.name,))
+	return [col for (col, *_) in c.description], c.fetchall()
 
 def get_settings(table_name: str = '') -> tuple[str, str]:
 	'''
@@ -57,9 +72,7 @@ def plot_hist_rsa_modulus_3d_mayavi(data_source_table: str, png_export: bool):
 	settings, extra_descr = get_settings(data_source_table)
 
 	# Query the database for rows with a successful result.
-	c.execute(f'SELECT * FROM {data_source_table} WHERE result == ?', (GlitchResult.SUCCESS.name,))
-	columns = [col for (col, *_) in c.description]
-	rows = c.fetchall()
+	columns, rows = fetch_rows(data_source_table, GlitchResult.SUCCESS)
 
 	if 'time' not in columns:
 		print('No time column found, run this on rsa modulus tests')
@@ -0,0 +1,216 @@
+#! /usr/bin/env python3
+
+'''
+Merge glitch databases, e.g. the ones filled by several rigs running the same campaign, into one.
+Every source is attached read-only to the destination and its attempts are copied inside SQLite
+with INSERT ... SELECT, in a single transaction per source. Attempts already in the destination (same
+`uuid`) are skipped, so merging a database twice or merging overlapping copies is harmless.
+Campaigns with the same name are merged: their settings are reconciled and runtimes summed.
+'''
+
+from argparse import ArgumentParser, Namespace
+import os
+import pathlib
+import sqlite3
+import time
+
+from data_collector import GlitchSQLite, ATTEMPTS_COLUMNS, ROLLUPS_TRIGGER, ROLLUPS_UPSERT, SCHEMA_VERSION
+
+SEPARATOR = '; ' # Between the settings (and extra) of campaigns merged from different databases
+
+def reconcile(dst: str|None, src: str|None) -> str|None:
+	'''
+	Settings or extra string of a merged campaign: the distinct values of both databases
+	'''
+	values = [value for string in (dst, src) if string for value in string.split(SEPARATOR)]
+	return SEPARATOR.join(dict.fromkeys(values)) if values else None
+
+def source_uri(path: str) -> str:
+	'''
+	URI that opens a source database read-only
+	'''
+	return pathlib.Path(path).absolute().as_uri() + '?mode=ro'
+
+def check_source(path: str) -> str|None:
+	'''
+	Why a database cannot be merged, None if it can
+	'''
+	if not os.path.exists(path):
+		return f'{path} not found'
+	conn = sqlite3.connect(source_uri(path), uri=True)
+	try:
+		version = conn.execute('PRAGMA user_version').fetchone()[0]
+	finally:
+		conn.close()
+	if version == 0:
+		return f'{path} uses the legacy one-table-per-campaign layout, convert it with migrate_db.py first'
+	if version != SCHEMA_VERSION:
+		return f'{path} has schema version {version}, expected {SCHEMA_VERSION}'
+	return None
+
+def merge_campaigns(db: GlitchSQLite, names: list[str]) -> dict[int, str]:
+	'''
+	Add the campaigns of the attached `src` database to `db`, or reconcile them with the ones
+	already there, and fill `temp.campaign_map` with the id of every campaign in both databases
+
+	Args:
+		names: Campaigns to merge (default: all)
+
+	Returns:
+		{destination campaign id: name}
+	'''
+	conn = db.conn
+	conn.execute('CREATE TEMP TABLE campaign_map (src INTEGER PRIMARY KEY, dst INTEGER NOT NULL)')
+	ret = {}
+	campaigns = conn.execute('SELECT id, name, target, ret_vars, settings, extra, checkpoint, checkpoint_time FROM src.campaigns ORDER BY id').fetchall()
+	for src_id, name, target, ret_vars, settings, extra, checkpoint, checkpoint_time in campaigns:
+		if names and name not in names:
+			continue
+		row = conn.execute('SELECT id, target, ret_vars, settings, extra FROM main.campaigns WHERE name=?', (name,)).fetchone()
+		if row is None:
+			dst_id = db.add_campaign(name, target, [var for var in ret_vars.split(',') if var], settings, extra)
+			conn.execute('UPDATE main.campaigns SET checkpoint=?, checkpoint_time=? WHERE id=?', (checkpoint, checkpoint_time, dst_id))
+		else:
+			dst_id, dst_target, dst_ret_vars, dst_settings, dst_extra = row
+			if ret_vars != dst_ret_vars or (target and dst_target and target != dst_target):
+				raise ValueError(f'Campaign {name} has different targets: {dst_target} ({dst_ret_vars}) and {target} ({ret_vars})')
+			conn.execute('UPDATE main.campaigns SET target=COALESCE(target, ?), settings=?, extra=? WHERE id=?',
+				(target, reconcile(dst_settings, settings), reconcile(dst_extra, extra), dst_id))
+		conn.execute('INSERT INTO campaign_map VALUES (?, ?)', (src_id, dst_id))
+		ret[dst_id] = name
+	return ret
+
+def copy_attempts(db: GlitchSQLite, chunk_size: int) -> int:
+	'''
+	Copy the attempts of the mapped campaigns of `src` to `db`, skipping the ones already present,
+	without committing. The roll-ups are updated once at the end instead of by the trigger: from
+	the roll-ups of `src` if every attempt was copied, from the copied attempts otherwise.
+
+	Returns:
+		Number of attempts copied
+	'''
+	conn = db.conn
+	columns = ATTEMPTS_COLUMNS.split(', ')
+	query = f'''INSERT OR IGNORE INTO main.attempts({ATTEMPTS_COLUMNS}, uuid)
+		SELECT m.dst, {', '.join(f'a.{column}' for column in columns[1:])}, a.uuid
+		FROM src.attempts a CROSS JOIN campaign_map m ON m.src = a.campaign
+		WHERE a.rowid > ? AND a.rowid <= ? ORDER BY a.rowid'''
+	first = conn.execute('SELECT COALESCE(MAX(rowid), 0) FROM main.attempts').fetchone()[0]
+	last = conn.execute('SELECT COALESCE(MAX(rowid), 0) FROM src.attempts').fetchone()[0]
+	existing = conn.execute('SELECT COALESCE(SUM(count), 0) FROM main.rollups').fetchone()[0]
+	new = conn.execute('''SELECT COUNT(*) FROM src.attempts a CROSS JOIN campaign_map m ON m.src = a.campaign
+		WHERE NOT EXISTS (SELECT 1 FROM main.attempts d WHERE d.uuid = a.uuid)''').fetchone()[0]
+	conn.execute('DROP TRIGGER main.attempts_rollup')
+	# When the attempts to insert outnumber the ones already there, it is faster to build the
+	# indexes from scratch than to update them for every attempt. The uuid index stays, it is
+	# needed to skip the duplicates
+	indexes = []
+	if new > existing:
+		indexes = conn.execute('SELECT name, sql FROM main.sqlite_master WHERE type="index" AND tbl_name="attempts" AND name != "attempts_by_uuid" AND sql IS NOT NULL').fetchall()
+		for name, _ in indexes:
+			conn.execute(f'DROP INDEX main.{name}')
+	count = 0
+	for start in range(0, last, chunk_size):
+		count += conn.execute(query, (start, start + chunk_size)).rowcount
+		print(f'{count} attempts         ', end='\r', flush=True) # spaces to overwrite prev line
+	print(f'{count} attempts         ')
+	for _, sql in indexes:
+		conn.execute(sql)
+	attempts = conn.execute('SELECT COALESCE(SUM(r.count), 0) FROM src.rollups r JOIN campaign_map m ON m.src = r.campaign').fetchone()[0]
+	if count == attempts:
+		columns = [row[1] for row in conn.execute('PRAGMA main.table_info(rollups)')]
+		conn.execute(f'''INSERT INTO main.rollups SELECT m.dst, {', '.join(f'r.{column}' for column in columns[1:])}
+			FROM src.rollups r, campaign_map m WHERE m.src = r.campaign {ROLLUPS_UPSERT}''')
+	else:
+		db.rollup_attempts(first)
+	conn.execute(ROLLUPS_TRIGGER) # Not executescript(), that would commit
+	return count
+
+def verify(db: GlitchSQLite, campaigns: dict[int, str], before: dict[int, int], copied: int) -> None:
+	'''
+	Check that every attempt of `src` is in the destination campaign it was mapped to, that the
+	destination campaigns grew by the number of attempts copied and that their roll-ups match
+	'''
+	conn = db.conn
+	missing = conn.execute('''SELECT COUNT(*) FROM src.attempts a CROSS JOIN campaign_map m ON m.src = a.campaign
+		WHERE NOT EXISTS (SELECT 1 FROM main.attempts d WHERE d.uuid = a.uuid AND d.campaign = m.dst)''').fetchone()[0]
+	if missing:
+		raise ValueError(f'{missing} attempts were not copied: their uuid belongs to a different campaign in the destination')
+	after = count_attempts(conn, 'main')
+	grown = sum(after.get(campaign, 0) - before.get(campaign, 0) for campaign in campaigns)
+	if grown != copied:
+		raise ValueError(f'Destination campaigns grew by {grown} attempts, {copied} were copied')
+	for campaign, name in campaigns.items():
+		rollup = conn.execute('SELECT COALESCE(SUM(count), 0) FROM main.rollups WHERE campaign=?', (campaign,)).fetchone()[0]
+		if rollup != after.get(campaign, 0):
+			raise ValueError(f'Campaign {name}: roll-ups count {rollup} attempts, the table has {after.get(campaign, 0)}')
+
+def count_attempts(conn: sqlite3.Connection, schema: str) -> dict[int, int]:
+	'''
+	{campaign id: number of attempts} in the `main` or `src` database
+	'''
+	return dict(conn.execute(f'SELECT campaign, COUNT(*) FROM {schema}.attempts GROUP BY campaign').fetchall())
+
+def merge_database(db: GlitchSQLite, path: str, names: list[str], chunk_size: int) -> int:
+	'''
+	Merge a database into `db` in a single transaction, rolled back on any error
+
+	Returns:
+		Number of attempts copied
+	'''
+	conn = db.conn
+	conn.commit()
+	conn.execute('ATTACH DATABASE ? AS src', (source_uri(path),))
+	try:
+		conn.execute('BEGIN')
+		try:
+			campaigns = merge_campaigns(db, names)
+			before = count_attempts(conn, 'main')
+			copied = copy_attempts(db, chunk_size)
+			verify(db, campaigns, before, copied)
+
+			after = count_attempts(conn, 'main')
+			src_counts = count_attempts(conn, 'src')
+			for src_id, dst_id in conn.execute('SELECT src, dst FROM campaign_map').fetchall():
+				new = after.get(dst_id, 0) - before.get(dst_id, 0)
+				print(f'{campaigns[dst_id]}: {new} attempts copied, {src_counts.get(src_id, 0) - new} already present')
+				if new: # Do not count the runtime of a database merged twice
+					conn.execute('UPDATE main.campaigns SET runtime = runtime + (SELECT runtime FROM src.campaigns WHERE id=?) WHERE id=?', (src_id, dst_id))
+			conn.execute('DROP TABLE campaign_map')
+			conn.commit()
+		except BaseException:
+			conn.rollback()
+			raise
+	finally:
+		conn.execute('DETACH DATABASE src')
+	return copied
+
+def main(a: Namespace) -> int:
+	dst = os.path.abspath(a.dst)
+	for src in a.src:
+		if os.path.abspath(src) == dst:
+			print('Sources and destination must differ')
+			return 1
+		error = check_source(src)
+		if error:
+			print(error)
+			return 1
+	db = GlitchSQLite(a.dst, '', '', '')
+	start_time = time.time()
+	total = 0
+	for src in a.src:
+		print(f'Merging {src}')
+		total += merge_database(db, src, a.campaigns, a.chunk_size)
+	db.close()
+	print(f'Merged {total} attempts in {time.time() - start_time:.2f}s')
+	return 0
+
+if __name__ == '__main__':
+	argparser = ArgumentParser(description='Merge glitch databases, skipping the attempts already in the destination')
+	argparser.add_argument('dst', type=str, help='Merged database (created if missing)')
+	argparser.add_argument('src', type=str, nargs='+', help='Databases to merge (left unchanged)')
+	argparser.add_argument('--campaign', dest='campaigns', action='append', default=[], help='Only merge this campaign (can be repeated, default: all)')
+	argparser.add_argument('--chunk-size', default=1_000_000, type=int, help='Source rows copied per statement (default 1000000)')
+	args = argparser.parse_args()
+
+	exit(main(args))
@@ -0,0 +1,123 @@
+#! /usr/bin/env python3
+
+'''
+Convert a database in the legacy one-table-per-campaign layout (e.g. `glitch2.db`) to the
+campaigns/attempts schema of `GlitchSQLite`. Rows are copied inside SQLite with INSERT ... SELECT
+over ranges of rowids, so memory usage does not depend on the size of the database. Every campaign
+is copied in a single transaction: an interrupted conversion leaves no partial campaign behind and
+is completed by running it again.
+'''
+
+from argparse import ArgumentParser, Namespace
+import hashlib
+import os
+import sqlite3
+import time
+
+from data_collector import GlitchSQLite, RET_COLUMNS
+
+LEGACY_COLUMNS = ['ext_offset', 'width', 'voltage', 'prep_voltage', 'result', 'data']
+LEGACY_TABLES = ('settings', 'runtimes')
+
+def legacy_campaigns(conn: sqlite3.Connection) -> list[tuple[str, list[str]]]:
+	'''
+	Campaign tables of the attached `legacy` database and the names of their return values
+	'''
+	ret = []
+	for (name,) in conn.execute('SELECT name FROM legacy.sqlite_master WHERE type="table" ORDER BY rowid').fetchall():
+		if name in LEGACY_TABLES or name.startswith('sqlite_'):
+			continue
+		columns = [row[1] for row in conn.execute("SELECT * FROM pragma_table_info(?, 'legacy')", (name,))]
+		if columns[:len(LEGACY_COLUMNS)] != LEGACY_COLUMNS:
+			print(f'Skipping table {name}: not a campaign table')
+			continue
+		ret.append((name, columns[len(LEGACY_COLUMNS):]))
+	return ret
+
+def legacy_value(conn: sqlite3.Connection, table: str, column: str, name: str):
+	'''
+	`column` of campaign `name` in a bookkeeping table of the legacy database, None if missing
+	'''
+	if not conn.execute('SELECT 1 FROM legacy.sqlite_master WHERE type="table" AND name=?', (table,)).fetchone():
+		return None
+	row = conn.execute(f'SELECT {column} FROM legacy.{table} WHERE table_name=?', (name,)).fetchone()
+	return row[0] if row else None
+
+def campaign_key(name: str, settings: str|None, extra: str|None) -> bytes:
+	'''
+	Source key of the attempts of a legacy campaign (see :py:func:`~attempt_uuid`), the same every
+	time the table is converted: merging two conversions of the same table does not duplicate it
+	'''
+	return hashlib.sha256('\0'.join(('legacy', name, settings or '', extra or '')).encode()).digest()
+
+def migrate_campaign(db: GlitchSQLite, name: str, ret_vars: list[str], chunk_size: int) -> int:
+	'''
+	Copy a legacy campaign table into `db` in a single transaction, rolled back on any error
+
+	Args:
+		chunk_size: Rows copied per statement, between two progress updates
+
+	Returns:
+		Number of attempts copied
+	'''
+	conn = db.conn
+	table = f'legacy."{name.replace(chr(34), chr(34) * 2)}"'
+	unknown = [row[0] for row in conn.execute(f'SELECT DISTINCT result FROM {table} WHERE result NOT IN (SELECT name FROM result_codes)')]
+	if unknown:
+		raise ValueError(f'Unknown results {unknown} in table {name}')
+	if len(ret_vars) > RET_COLUMNS:
+		raise ValueError(f'Too many return values in table {name} ({len(ret_vars)}), at most {RET_COLUMNS} are stored')
+
+	settings = legacy_value(conn, 'settings', 'settings', name)
+	extra = legacy_value(conn, 'settings', 'extra', name)
+	runtime = legacy_value(conn, 'runtimes', 'runtime', name) or 0.0
+	key = campaign_key(name, settings, extra)
+
+	# Legacy rows store the return values as zeros next to raw data, and b'' as data next to return values
+	ret_cols = ''.join(f', ret{i}' for i in range(len(ret_vars)))
+	ret_values = ''.join(f', CASE WHEN length(l.data) > 0 THEN NULL ELSE l."{var}" END' for var in ret_vars)
+	query = f'''INSERT INTO attempts(campaign, ext_offset, width, voltage, prep_voltage, result, uuid, data{ret_cols})
+		SELECT ?, l.ext_offset, l.width, l.voltage, l.prep_voltage, r.code,
+			attempt_uuid(?, l.rowid, l.ext_offset, l.width, l.voltage, l.prep_voltage), NULLIF(l.data, x''){ret_values}
+		FROM {table} l JOIN result_codes r ON r.name = l.result
+		WHERE l.rowid > ? AND l.rowid <= ? ORDER BY l.rowid'''
+	last = conn.execute(f'SELECT MAX(rowid) FROM {table}').fetchone()[0] or 0
+	count = 0
+	try:
+		campaign = db.add_campaign(name, None, ret_vars, settings, extra, runtime)
+		for start in range(0, last, chunk_size):
+			count += conn.execute(query, (campaign, key, start, start + chunk_size)).rowcount
+			print(f'{name}: {count} attempts         ', end='\r', flush=True) # spaces to overwrite prev line
+		conn.commit()
+	except BaseException:
+		conn.rollback()
+		raise
+	print(f'{name}: {count} attempts         ')
+	return count
+
+def main(a: Namespace) -> int:
+	if os.path.abspath(a.src) == os.path.abspath(a.dst):
+		print('Source and destination must differ')
+		return 1
+	db = GlitchSQLite(a.dst, '', '', '')
+	db.conn.execute('ATTACH DATABASE ? AS legacy', (a.src,))
+	start_time = time.time()
+	total = 0
+	for name, ret_vars in legacy_campaigns(db.conn):
+		if db.has_campaign(name):
+			print(f'Skipping table {name}: campaign already in {a.dst}')
+			continue
+		total += migrate_campaign(db, name, ret_vars, a.chunk_size)
+	db.conn.execute('DETACH DATABASE legacy')
+	db.close()
+	print(f'Migrated {total} attempts in {time.time() - start_time:.2f}s')
+	return 0
+
+if __name__ == '__main__':
+	argparser = ArgumentParser(description='Convert a legacy one-table-per-campaign database to the campaigns/attempts schema')
+	argparser.add_argument('src', type=str, help='Legacy database (left unchanged)')
+	argparser.add_argument('dst', type=str, help='Converted database (created if missing, campaigns already present are skipped)')
+	argparser.add_argument('--chunk-size', default=100_000, type=int, help='Rows copied per statement, between two progress updates (default 100000)')
+	args = argparser.parse_args()
+
+	exit(main(args))
@@ -0,0 +1,364 @@
+#! /usr/bin/env python3
+
+'''
+Run a glitch campaign on several rigs (UP Squared + picocoder + power supply) at once.
+
+Every rig is driven by its own worker process. The coordinator hands chunks of settings from a
+single :py:class:`~GlitchController` to the workers, feeds their results back to it and forwards
+them, with checkpoints of the controller, to a single writer process, the only one that touches
+the database.
+'''
+
+from argparse import ArgumentParser, Namespace
+from contextlib import ExitStack
+from itertools import islice
+import multiprocessing as mp
+from multiprocessing.process import BaseProcess
+from multiprocessing.synchronize import Event
+import queue
+import signal
+import time
+
+import picocoder_client
+from picocoder_client import Picocoder, GlitchController, GlitchResult, GlitchSettings, KA3305P, RESET_RESULTS
+from data_collector import GlitchSQLite, GLITCHER_BAUD, check_loop_duration, make_controller, reset_target, settings_to_str
+
+# Results pushed by a worker: rig index and one (settings, result, data, cost) tuple per attempt,
+# the cost is the time spent on the attempt including the target reset it caused (s)
+RigResults = tuple[int, list[tuple[GlitchSettings, GlitchResult, tuple|bytes|None, float]]]
+
+def rig_worker(rig: int, glitcher_port: str, power_supply_port: str, a: Namespace,
+			settings_q: mp.Queue, results_q: mp.Queue, stop: Event) -> None:
+	'''
+	Drive one rig until its queue is exhausted (`None` is received) or `stop` is set.
+
+	Args:
+		rig: Index of this rig, stored with its results
+		glitcher_port: Serial port of the picocoder
+		power_supply_port: Serial port of the power supply
+		a: Command line arguments
+		settings_q: Queue of this rig, lists of settings
+		results_q: Results queue, see :py:data:`~RigResults`
+		stop: Set by the coordinator when the campaign has to end early
+	'''
+	ps = KA3305P(port=power_supply_port, cycle_wait=a.cycle_wait)
+	ps.con()
+	ps.power_cycle()
+
+	glitcher = Picocoder(glitcher_port, GLITCHER_BAUD)
+	glitcher.tc = picocoder_client.target_from_opname(a.operation)
+	if not glitcher.ping():
+		raise ConnectionError(f'Rig {rig}: glitcher not responding')
+	if not glitcher.ping_target():
+		raise ConnectionError(f'Rig {rig}: target not responding')
+	check_loop_duration(a, glitcher.measure_loop_duration())
+
+	try:
+		rig_loop(rig, ps, glitcher, a, settings_q, results_q, stop)
+	except KeyboardInterrupt:
+		ps.power_cycle() # The coordinator stops the campaign
+	del glitcher
+
+def rig_loop(rig: int, ps: KA3305P, glitcher: Picocoder, a: Namespace,
+			settings_q: mp.Queue, results_q: mp.Queue, stop: Event) -> None:
+	pending: list[GlitchSettings] = [] # Settings pulled from the queue, not yet attempted
+	while not stop.is_set():
+		if not pending:
+			try:
+				chunk = settings_q.get(timeout=0.1)
+			except queue.Empty:
+				continue
+			if chunk is None:
+				break
+			pending = chunk
+
+		t = time.perf_counter()
+		if a.batch_size > 1:
+			results = glitcher.glitch_batch(pending[:a.batch_size])
+		else:
+			results = [glitcher.glitch(pending[0])]
+		costs = [(time.perf_counter() - t) / len(results)] * len(results)
+		attempted, pending = pending[:len(results)], pending[len(results):]
+
+		# Reset before reporting the results, the reset is charged to the attempt that caused it.
+		# A half-success that stops the campaign leaves the target in its current state
+		result, _ = results[-1]
+		reset_failed = False
+		if result in RESET_RESULTS and not stop.is_set() and not (a.stop_half_success and result == GlitchResult.HALF_SUCCESS):
+			t = time.perf_counter()
+			try:
+				reset_target(ps, glitcher)
+			except ConnectionError:
+				print(f'Rig {rig}: failed to reset target, shutting it down')
+				ps.on = False
+				reset_failed = True
+			costs[-1] += time.perf_counter() - t
+		results_q.put((rig, [(gs, r, data, cost) for gs, (r, data), cost in zip(attempted, results, costs)]))
+		if reset_failed:
+			break
+
+def db_writer(a: Namespace, settings_str: str, writer_q: mp.Queue) -> None:
+	'''
+	Store the results and the checkpoints of the campaign, until `None` is received.
+
+	Args:
+		a: Command line arguments
+		settings_str: Campaign settings, see :py:func:`~settings_to_str`
+		writer_q: Results to store, as in :py:data:`~RigResults`, or states of :py:meth:`~GlitchController.checkpoint`
+	'''
+	signal.signal(signal.SIGINT, signal.SIG_IGN) # Keep storing results until the coordinator is done
+	tc = picocoder_client.target_from_opname(a.operation)
+	db = GlitchSQLite(a.db_file, a.db_table, settings_str, a.extra_descr)
+	db.start_writer(a.commit_rows, a.commit_interval)
+	start_time = time.time()
+	while (item := writer_q.get()) is not None:
+		if isinstance(item, dict):
+			db.save_checkpoint(item) # After the results queued before it
+			continue
+		for gs, result, data, _ in item:
+			db.insert_result(tc, gs['ext_offset'], gs['width'], gs['voltage'], gs['prep_voltage'], result, data)
+	db.set_runtime(time.time()-start_time)
+	db.close()
+
+class Coordinator:
+	'''
+	Hands out the glitch values of a :py:class:`~GlitchController` to the rigs in chunks and feeds
+	their results back to it. The settings handed to a rig are outstanding until their results
+	arrive: those of a rig that exits are handed to the other rigs.
+	'''
+	def __init__(self, gc: GlitchController, a: Namespace, workers: list[BaseProcess], settings_qs: list[mp.Queue],
+			results_q: mp.Queue, writer_q: mp.Queue, stop: Event):
+		'''
+		Args:
+			gc: Controller of the campaign
+			a: Command line arguments
+			workers: Rig processes, see :py:func:`~rig_worker`
+			settings_qs: Queue of every rig
+			results_q: Results queue, see :py:data:`~RigResults`
+			writer_q: Queue of :py:func:`~db_writer`
+			stop: Set when the campaign has to end early
+		'''
+		self.gc = gc
+		self.a = a
+		self.workers = workers
+		self.settings_qs = settings_qs
+		self.results_q = results_q
+		self.writer_q = writer_q
+		self.stop = stop
+		self.chunk_size = max(a.chunk_size, a.batch_size)
+		self.values = gc.glitch_values()
+		self.exhausted = False # All glitch values drawn
+		self.fed = 0 # Glitch values drawn
+		self.alive = set(range(len(workers)))
+		self.outstanding: dict[int, list[GlitchSettings]] = {rig: [] for rig in self.alive} # Handed to a rig, without results
+		self.retry: list[GlitchSettings] = [] # Outstanding settings of the rigs that exited
+		self.count = 0
+		self.per_rig: dict[int, int] = {}
+		self.start_time = time.time()
+		self.last_checkpoint = time.monotonic()
+
+	def _chunk(self) -> list[GlitchSettings]:
+		chunk = self.retry[:self.chunk_size]
+		del self.retry[:len(chunk)]
+		n = self.chunk_size - len(chunk)
+		if self.a.iterations:
+			n = min(n, self.a.iterations - self.fed)
+		if n and not self.exhausted:
+			drawn = list(islice(self.values, n))
+			self.fed += len(drawn)
+			self.exhausted = len(drawn) < n or bool(self.a.iterations) and self.fed >= self.a.iterations
+			chunk += drawn
+		return chunk
+
+	def feed(self) -> None:
+		'''
+		Keep up to two chunks outstanding on every rig
+		'''
+		for rig in sorted(self.alive):
+			while len(self.outstanding[rig]) < 2 * self.chunk_size and (chunk := self._chunk()):
+				self.outstanding[rig] += chunk
+				self.settings_qs[rig].put(chunk)
+
+	def done(self) -> bool:
+		return self.exhausted and not self.retry and not any(self.outstanding.values())
+
+	def collect(self, timeout: float) -> None:
+		'''
+		Wait up to `timeout` for results, then take over the outstanding settings of the rigs that exited
+		'''
+		try:
+			self._store(*self.results_q.get(timeout=timeout))
+			return
+		except queue.Empty:
+			pass
+		exited = {rig for rig in self.alive if not self.workers[rig].is_alive()}
+		if not exited:
+			return
+		while True: # A rig flushes its results before exiting
+			try:
+				self._store(*self.results_q.get_nowait())
+			except queue.Empty:
+				break
+		for rig in sorted(exited):
+			self.alive.discard(rig)
+			self.retry += self.outstanding[rig]
+			self.outstanding[rig] = []
+
+	def _store(self, rig: int, results: list[tuple[GlitchSettings, GlitchResult, tuple|bytes|None, float]]) -> None:
+		del self.outstanding[rig][:len(results)] # Rigs attempt their settings in order
+		for gs, result, data, cost in results:
+			self.gc.add_result(gs, result, data, cost)
+			if (self.a.stop_half_success and result == GlitchResult.HALF_SUCCESS) or (self.a.stop_success and result == GlitchResult.SUCCESS):
+				if not self.stop.is_set():
+					print(f'\n{result.name} on rig {rig}, stopping. Target is left in its current state')
+					self.stop.set()
+		self.writer_q.put(results)
+		self.count += len(results)
+		self.per_rig[rig] = self.per_rig.get(rig, 0) + len(results)
+		print(f'Iteration {self.count}, rate {self.count/(time.time()-self.start_time):.2f}Hz         ', end='\r', flush=True) # spaces to overwrite prev line
+		if time.monotonic() - self.last_checkpoint >= self.a.checkpoint_interval:
+			self.checkpoint()
+
+	def checkpoint(self) -> None:
+		self.writer_q.put(self.gc.checkpoint())
+		self.last_checkpoint = time.monotonic()
+
+	def drain(self) -> None:
+		'''
+		Stop the rigs and store the results they flush on the way out, then take the final checkpoint
+		'''
+		self.stop.set()
+		stored = self.count
+		for w in self.workers:
+			while w.is_alive():
+				try:
+					self._store(*self.results_q.get(timeout=0.1))
+				except queue.Empty:
+					pass
+		while True: # Flushed just before exiting
+			try:
+				self._store(*self.results_q.get_nowait())
+			except queue.Empty:
+				break
+		if self.count > stored:
+			self.checkpoint()
+
+	def run(self) -> None:
+		'''
+		Run the campaign until all glitch values are attempted, a (half) success is found, all rigs
+		exited or the user interrupts it, then wait for the rigs to finish
+		'''
+		try:
+			while self.alive and not self.stop.is_set() and not self.done():
+				self.feed()
+				self.collect(0.1)
+		except KeyboardInterrupt:
+			self.stop.set()
+		for rig in self.alive:
+			self.settings_qs[rig].put(None) # Let the rigs drain their queue
+		while self.alive:
+			self.collect(0.1)
+		if self.retry and not self.stop.is_set():
+			print(f'\n{len(self.retry)} glitch settings were not attempted, all rigs exited')
+		end_time = time.time()
+		print(f'\nTotal: {self.count} attempts in {end_time-self.start_time:.2f}s ({self.count/(end_time-self.start_time):.2f}Hz), per rig: {self.per_rig}')
+		self.checkpoint()
+
+def start_emulators(stack: ExitStack, a: Namespace) -> list[tuple[str, str]]:
+	'''
+	Serve `a.emulate` virtual rigs in this process, returns their (glitcher, power supply) ports
+	'''
+	from picocoder_client.emulator import EmulatedTarget, KA3305PEmulator, PicocoderEmulator
+
+	rigs = []
+	for i in range(a.emulate):
+		target = EmulatedTarget(picocoder_client.target_from_opname(a.operation))
+		seed = None if a.seed is None else a.seed + i
+		glitcher = stack.enter_context(PicocoderEmulator(target, time_scale=a.time_scale, seed=seed))
+		ps = stack.enter_context(KA3305PEmulator(target))
+		rigs.append((glitcher.port, ps.port))
+	return rigs
+
+def main(a: Namespace) -> int:
+	settings_str = settings_to_str(a.ext_offset, a.width, a.voltage, a.prep_voltage)
+	db = GlitchSQLite(a.db_file, a.db_table, settings_str, a.extra_descr)
+	resume = db.has_campaign()
+	if resume:
+		count = db.count_rows()
+		resp = input(f'Campaign {a.db_table} already exists in {a.db_file} with {count} attempts. Append to it? [Y/n] ')
+		if resp.lower() != 'y' and resp.lower() != '':
+			db.close()
+			return 1
+	else:
+		db.create_campaign(picocoder_client.target_from_opname(a.operation))
+	gc = make_controller(a, db if resume and not a.no_resume else None) # Streams the results when the sampler starts
+
+	with ExitStack() as stack:
+		rigs = [tuple(r.split(',')) for r in a.rig] + start_emulators(stack, a)
+		if not rigs:
+			print('No rigs, use --rig or --emulate')
+			db.close()
+			return 1
+
+		ctx = mp.get_context('spawn') # Do not fork the emulator threads
+		settings_qs = [ctx.Queue() for _ in rigs]
+		results_q = ctx.Queue()
+		writer_q = ctx.Queue()
+		stop = ctx.Event()
+		writer = ctx.Process(target=db_writer, args=(a, settings_str, writer_q), name='writer')
+		workers = [
+			ctx.Process(target=rig_worker, args=(i, glitcher_port, ps_port, a, settings_qs[i], results_q, stop), name=f'rig{i}')
+			for i, (glitcher_port, ps_port) in enumerate(rigs)
+		]
+		coordinator = Coordinator(gc, a, workers, settings_qs, results_q, writer_q, stop) # Starts the sampler
+		db.close() # The writer process owns the database from now on
+		writer.start()
+		try:
+			for w in workers:
+				w.start()
+			coordinator.run()
+		finally:
+			coordinator.drain()
+			writer_q.put(None)
+			writer.join()
+
+	failed = [w.name for w in workers if w.exitcode != 0]
+	if failed:
+		print(f'Rigs {", ".join(failed)} failed')
+		return 1
+	if writer.exitcode != 0:
+		print('The database writer failed')
+		return 1
+	return 0
+
+if __name__ == '__main__':
+	argparser = ArgumentParser(description='Run a glitch campaign on several rigs in parallel and save results to a single database')
+	argparser.add_argument('db_file', default='glitch_results.db', type=str, help='Database file name')
+	argparser.add_argument('db_table', type=str, help='Campaign name (e.g. target commit hash)')
+	argparser.add_argument('operation', type=str, choices=picocoder_client.target_op_names(), help='The operation to glitch')
+	argparser.add_argument('--rig', default=[], action='append', type=str, metavar='GLITCHER_PORT,POWER_SUPPLY_PORT', help='Serial ports of a rig, repeat for every rig')
+	argparser.add_argument('--emulate', default=0, type=int, metavar='N', help='Add N emulated rigs (see picocoder_client/emulator.py)')
+	argparser.add_argument('--time-scale', default=1.0, type=float, help='Multiplier for all emulated delays (default 1.0)')
+	argparser.add_argument('--seed', default=None, type=int, help='Seed for the emulated glitch outcomes (rig i uses seed + i)')
+	argparser.add_argument('--ext-offset', nargs=3, type=int, metavar=('start', 'end', 'step'), help='External offset range', required=True)
+	argparser.add_argument('--width', nargs=3, type=int, metavar=('start', 'end', 'step'), help='Width range', required=True)
+	argparser.add_argument('--voltage', nargs=3, type=int, metavar=('start', 'end', 'step'), help='Glitch voltage range', required=True)
+	argparser.add_argument('--prep-voltage', default=[0b0101010,0b0101010,1], nargs=3, type=int, metavar=('start', 'end', 'step'), help='Preparation voltage (default 0b0101010 = 0.91V)')
+	argparser.add_argument('--extra-descr', default='', type=str, help='Description of the glitch campaign (e.g. target software commit hash)')
+	argparser.add_argument('-s', '--stop-half-success', default=False, action='store_true', help='Stop the glitch campaign if a half-success is detected')
+	argparser.add_argument('-S', '--stop-success', default=False, action='store_true', help='Stop the glitch campaign if a success is detected')
+	argparser.add_argument('--sampler', default='random', type=str, choices=GlitchController.SAMPLERS, help='random: independent draws, repetitions possible; exhaustive: every lattice point once, in pseudo-random order; sweep: every lattice point once, changing one parameter at a time; zoom: coarse sweep, then refine around (half) successes; bandit: Thompson sampling of (half) successes per second (default random)')
+	argparser.add_argument('--sampler-seed', default=None, type=int, help='Seed of the sampler (default: random, or the one of the campaign when resuming it)')
+	argparser.add_argument('--sweep-order', nargs=4, default=None, type=str, choices=['ext_offset', 'width', 'voltage', 'prep_voltage'], metavar='PARAM',
+		help='Parameters of the sweep sampler from the slowest to the fastest changing (default prep_voltage voltage width ext_offset)')
+	argparser.add_argument('-n', '--iterations', default=0, type=int, help='Stop after this many attempts over all rigs (default 0: run until interrupted)')
+	argparser.add_argument('--batch-size', default=1, type=int, help=f'Upload settings to the glitchers in batches of this size (max {picocoder_client.GLITCH_BATCH_MAX}, default 1: no batching)')
+	argparser.add_argument('--chunk-size', default=16, type=int, help='Settings handed to a rig at a time (default 16)')
+	argparser.add_argument('--cycle-wait', default=0.5, type=float, help='Power supply off time when resetting a target in s (default 0.5)')
+	argparser.add_argument('--commit-rows', default=256, type=int, help='Commit the results to the database every this many rows (default 256)')
+	argparser.add_argument('--commit-interval', default=1.0, type=float, help='Commit the results to the database at least every this many seconds (default 1)')
+	argparser.add_argument('--checkpoint-interval', default=60.0, type=float, help='Seconds between two checkpoints of the sampler state in the database (default 60)')
+	argparser.add_argument('--no-resume', default=False, action='store_true', help='When appending to an existing table, start the sampler from scratch instead of continuing the previous runs')
+	args = argparser.parse_args()
+
+	exit(main(args))
@@ -4,4 +4,8 @@ from typing import TypedDict
 
 from .glitch_targets import *
 from .picocoder import *
+from .pmic import *
 from .power_supply import *
+from .profiling import *
+from .results import *
+from .timeouts import *
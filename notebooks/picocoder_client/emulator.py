@@ -0,0 +1,442 @@
+'''
+Virtual picocoder and power supply, exposed as pseudo-terminals.
+
+The emulators speak the same byte protocol as the firmware (see `firmware/picocoder/cmd.h`)
+and the KORAD power supply, so :py:class:`~Picocoder`, :py:class:`~KA3305P` and
+`data_collector.py` run against them unchanged. Useful to profile the host side of a
+campaign without a Pico, an UP Squared board and a power supply.
+'''
+
+from dataclasses import dataclass, field
+import os
+import random
+import select
+import struct
+import threading
+import time
+import tty
+
+from . import Target, TargetType
+from . import glitch_targets as gt
+from .picocoder import (
+	P_CMD_ARM, P_CMD_ARM_SETTINGS, P_CMD_ARM_BATCH, P_CMD_FORCE, P_CMD_SET_VOLTAGE, P_CMD_SET_EXT_OFFST, P_CMD_SET_WIDTH,
+	P_CMD_SET_PREP_VOLTAGE, P_CMD_GET_STATE, P_CMD_PING, P_CMD_TARGET_PING, P_CMD_TARGET_PING_SLOW, P_CMD_MEASURE_LOOP_DURATION,
+	P_CMD_UART_TOGGLE_DEBUG_PIN, P_CMD_DEBUG_PULSE, P_CMD_RESULT_RESET, P_CMD_RESULT_ALIVE, P_CMD_RESULT_ZOMBIE,
+	P_CMD_RESULT_DATA_TIMEOUT, P_CMD_RESULT_UNREACHABLE, P_CMD_RESULT_PMIC_FAIL, P_CMD_RESULT_ANSI_CTRL_CODE,
+	P_CMD_VERSION, P_CMD_RETURN_OK, P_CMD_RETURN_KO, P_CMD_PONG, S_NAK, PROTOCOL_VERSION, ANSI_CHUNK_HEADER,
+	ARM_SETTINGS_FRAME, STATE_FRAME, ARM_BATCH_HEADER, ARM_BATCH_ENTRY, BATCH_RECORD_HEADER, BATCH_STOP_RESULTS, GLITCH_BATCH_MAX,
+)
+
+TPS_VCORE_MAX				= 0b1001011	# Highest VID accepted by the firmware (1.24V)
+TARGET_REACHABLE			= 0.009		# s, see TARGET_REACHABLE_US in glitch.h
+MAX_EXPECTED_INTS			= 10		# The firmware does not answer P_CMD_ARM with more return values
+ANSI_CHUNK_LEN				= 256		# See CRASH_INFO_CHUNK_LEN in glitch.h
+UART_TARGET_BAUD			= 115200	# Target <-> glitcher UART
+
+@dataclass
+class Hotspot:
+	'''
+	Region of the glitch parameters where the target behaves differently
+
+	Args:
+		bounds: Inclusive (low, high) bounds of some glitch parameters (e.g. `{'ext_offset': (150, 160)}`),
+			missing parameters are not constrained
+		weights: Outcome weights inside the region, see :py:attr:`~TargetProfile.weights`
+	'''
+	bounds: dict[str, tuple[int, int]]
+	weights: dict[str, float]
+
+	def contains(self, settings: dict[str, int]) -> bool:
+		return all(lo <= settings[param] <= hi for param, (lo, hi) in self.bounds.items())
+
+@dataclass
+class TargetProfile:
+	'''
+	Behavior of the emulated target for a given :py:class:`~Target`
+
+	Args:
+		normal: Return values of an unfaulted run
+		success: Return values of a faulted run (must satisfy `Target.is_success`)
+		weights: Relative probability of each glitch outcome, keys are
+			`normal`, `success`, `reset`, `zombie`, `data_timeout`, `pmic_fail`, `ansi`
+		loop_duration: Value returned by P_CMD_MEASURE_LOOP_DURATION (in us)
+		attempt_time: Time it takes the target to run the glitched code and report back (in s)
+		hotspots: Regions with their own outcome weights, the first one containing the settings wins
+	'''
+	normal: tuple
+	success: tuple
+	weights: dict[str, float] = field(default_factory=lambda: {
+		'normal': 0.80, 'success': 0.01, 'reset': 0.15, 'zombie': 0.02, 'data_timeout': 0.01, 'pmic_fail': 0.0, 'ansi': 0.01,
+	})
+	loop_duration: int = 3000
+	attempt_time: float = 0.005
+	hotspots: list[Hotspot] = field(default_factory=list)
+
+	def weights_at(self, settings: dict[str, int]) -> dict[str, float]:
+		'''
+		Outcome weights for the given glitch settings
+		'''
+		for hotspot in self.hotspots:
+			if hotspot.contains(settings):
+				return hotspot.weights
+		return self.weights
+
+def _slow(normal: tuple, success: tuple) -> TargetProfile:
+	return TargetProfile(normal, success, loop_duration=20000, attempt_time=0.05)
+
+TARGET_PROFILES: dict[type[Target], TargetProfile] = {
+	gt.TargetMul:				TargetProfile((0, ), (1, )),
+	gt.TargetLoad:				TargetProfile((0, 0), (1, 0xDEADBEEF)),
+	gt.TargetCmp:				TargetProfile((0, ), (1, )),
+	gt.TargetReg:				TargetProfile((271000, ), (270999, )),
+	gt.TargetRdrandSubAdd:		TargetProfile((0, ), (1, )),
+	gt.TargetRdrandAdd:			TargetProfile((120000, ), (119999, )),
+	gt.TargetRdrandAddMany:		TargetProfile((900000, ), (899990, )),
+	gt.TargetRdrandMovRegs:		TargetProfile((0xFFFFFFFF, ), (0xFFFF0000, )),
+	gt.TargetRdrandLoopAdd:		_slow((0x29FFFD, ), (0x29FFFC, )),
+	gt.TargetRdrandURAM:		_slow((0xFFFC0000, ), (0xFFFB0000, )),
+	gt.TargetRdrandURAMCmpSet:	_slow((0, ), (1, )),
+	gt.TargetUcodeUpdate:		_slow((0x20, 4375847), (0x28, 6740000)),
+	gt.TargetUcodeUpdateTime:	_slow((0x20, 4375847), (0x20, 6740000)),
+}
+
+class EmulatedTarget:
+	'''
+	Power and crash state of the emulated target board, shared by the glitcher and power supply emulators
+	'''
+	def __init__(self, tc: TargetType, profile: TargetProfile|None = None, boot_time: float = 0.1):
+		'''
+		Args:
+			tc: The kind of code running on the target
+			profile: Target behavior (default: the entry for `type(tc)` in :py:attr:`~TARGET_PROFILES`)
+			boot_time: Time after power on before the target starts its loop (in s)
+		'''
+		self.tc = tc
+		self.profile = profile if profile is not None else TARGET_PROFILES[type(tc)]
+		self.boot_time = boot_time
+		self.powered = True
+		self.crashed = False
+		self._boot_at = 0.0
+
+	@property
+	def alive(self) -> bool:
+		return self.powered and not self.crashed and time.monotonic() >= self._boot_at
+
+	def power(self, on: bool) -> None:
+		if on and not self.powered:
+			self.crashed = False
+			self._boot_at = time.monotonic() + self.boot_time
+		self.powered = on
+
+class _PtyDevice:
+	'''
+	Base class for devices served on the master end of a pseudo-terminal by a background thread
+	'''
+	def __init__(self):
+		self._master, self._slave = os.openpty()
+		tty.setraw(self._slave) # No echo nor line discipline, like a CDC ACM device
+		self.port: str = os.ttyname(self._slave)
+		self._stop = threading.Event()
+		self._thread = threading.Thread(target=self._serve, daemon=True)
+
+	def __enter__(self):
+		self.start()
+		return self
+
+	def __exit__(self, *_):
+		self.close()
+
+	def start(self) -> None:
+		self._thread.start()
+
+	def close(self) -> None:
+		if self._stop.is_set():
+			return
+		self._stop.set()
+		if self._thread.is_alive():
+			self._thread.join()
+		os.close(self._master)
+		os.close(self._slave)
+
+	def _read(self, n: int) -> bytes:
+		'''
+		Blocking read of exactly `n` bytes from the host, raises EOFError when the device is closed
+		'''
+		ret = b''
+		while len(ret) < n:
+			if self._stop.is_set():
+				raise EOFError
+			ready, _, _ = select.select([self._master], [], [], 0.1)
+			if ready:
+				ret += os.read(self._master, n - len(ret))
+		return ret
+
+	def _write(self, data: bytes) -> None:
+		os.write(self._master, data)
+
+	def _serve(self) -> None:
+		try:
+			while True:
+				self._handle(self._read(1))
+		except EOFError:
+			pass
+
+	def _handle(self, cmd: bytes) -> None:
+		raise NotImplementedError('Do not use the base class')
+
+class PicocoderEmulator(_PtyDevice):
+	'''
+	Emulates the picocoder firmware and the target it is connected to
+	'''
+
+	# Per-command processing time on the glitcher (s), on top of `usb_latency`
+	DEFAULT_LATENCY: dict[bytes, float] = {
+		P_CMD_TARGET_PING:			0.35,	# PING_VCORE_STABLE_TIME_US when the target is alive
+		P_CMD_TARGET_PING_SLOW:		0.35,
+		P_CMD_MEASURE_LOOP_DURATION: 0.5,
+	}
+
+	# Commands added by every protocol version, older firmware answers them with S_NAK
+	PROTOCOL_COMMANDS: dict[int, tuple[bytes, ...]] = {
+		1: (P_CMD_ARM_SETTINGS, P_CMD_ARM_BATCH, P_CMD_GET_STATE, P_CMD_VERSION),
+	}
+
+	def __init__(self, target: EmulatedTarget, usb_latency: float = 0.0005,
+			latency: dict[bytes, float]|None = None, time_scale: float = 1.0, seed: int|None = None,
+			protocol: int = PROTOCOL_VERSION):
+		'''
+		Args:
+			target: The emulated target board
+			usb_latency: Time between a command and its answer (in s)
+			latency: Per-command extra latency overrides (see :py:attr:`~DEFAULT_LATENCY`)
+			time_scale: Multiplier for every delay, 0 answers as fast as possible
+			seed: Seed for the glitch outcome generator
+			protocol: Protocol version of the emulated firmware, 0 for the one without P_CMD_VERSION
+		'''
+		super().__init__()
+		self.target = target
+		self.protocol = protocol
+		self.unsupported = {cmd for version, cmds in self.PROTOCOL_COMMANDS.items() if version > protocol for cmd in cmds}
+		self.usb_latency = usb_latency
+		self.latency = dict(self.DEFAULT_LATENCY)
+		if latency:
+			self.latency.update(latency)
+		self.time_scale = time_scale
+		self.rng = random.Random(seed)
+		self.ext_offset = 0
+		self.width = 0
+		self.voltage = 1
+		self.prep_voltage = TPS_VCORE_MAX
+		self.counts: dict[str, int] = {} # Emulated glitch outcomes, for bookkeeping
+
+	def _sleep(self, seconds: float) -> None:
+		if seconds > 0 and self.time_scale > 0:
+			time.sleep(seconds * self.time_scale)
+
+	def _set_voltage(self, attr: str) -> None:
+		value = self._read(1)[0]
+		self._sleep(self.usb_latency)
+		if value > TPS_VCORE_MAX:
+			self._write(P_CMD_RETURN_KO + b'[!] Value risks frying the CPU. Ignoring\n')
+			return
+		setattr(self, attr, value)
+		self._write(P_CMD_RETURN_OK)
+
+	def _handle(self, cmd: bytes) -> None:
+		if cmd in self.unsupported:
+			self._sleep(self.usb_latency)
+			self._write(S_NAK) # The rest of the frame is read as commands, as the firmware does
+		elif cmd == P_CMD_PING:
+			self._sleep(self.usb_latency)
+			self._write(P_CMD_PONG)
+		elif cmd in (P_CMD_TARGET_PING, P_CMD_TARGET_PING_SLOW):
+			alive = self.target.alive
+			self._sleep(self.usb_latency + (self.latency[cmd] if alive else TARGET_REACHABLE))
+			self._write(bytes([alive]))
+		elif cmd == P_CMD_SET_EXT_OFFST:
+			self.ext_offset = struct.unpack('<I', self._read(4))[0]
+			self._sleep(self.usb_latency)
+			self._write(P_CMD_RETURN_OK)
+		elif cmd == P_CMD_SET_WIDTH:
+			self.width = struct.unpack('<I', self._read(4))[0]
+			self._sleep(self.usb_latency)
+			self._write(P_CMD_RETURN_OK)
+		elif cmd == P_CMD_SET_VOLTAGE:
+			self._set_voltage('voltage')
+		elif cmd == P_CMD_SET_PREP_VOLTAGE:
+			self._set_voltage('prep_voltage')
+		elif cmd == P_CMD_GET_STATE:
+			self._sleep(self.usb_latency)
+			self._write(P_CMD_RETURN_OK + STATE_FRAME.pack(self.ext_offset, self.width, self.voltage, self.prep_voltage))
+		elif cmd == P_CMD_ARM:
+			self._arm(self._read(1)[0])
+		elif cmd == P_CMD_ARM_SETTINGS:
+			_, ext_offset, width, voltage, prep_voltage, expected_ints = ARM_SETTINGS_FRAME.unpack(cmd + self._read(ARM_SETTINGS_FRAME.size - 1))
+			if voltage > TPS_VCORE_MAX or prep_voltage > TPS_VCORE_MAX:
+				self._sleep(self.usb_latency)
+				self._write(P_CMD_RETURN_KO + b'[!] Value risks frying the CPU. Ignoring\n')
+				return
+			self.ext_offset, self.width, self.voltage, self.prep_voltage = ext_offset, width, voltage, prep_voltage
+			self._arm(expected_ints)
+		elif cmd == P_CMD_ARM_BATCH:
+			self._arm_batch()
+		elif cmd == P_CMD_MEASURE_LOOP_DURATION:
+			alive = self.target.alive
+			self._sleep(self.usb_latency + (self.latency[cmd] if alive else TARGET_REACHABLE))
+			self._write(struct.pack('<i', self.target.profile.loop_duration if alive else -1))
+		elif cmd == P_CMD_UART_TOGGLE_DEBUG_PIN:
+			alive = self.target.alive
+			self._sleep(self.usb_latency + (0 if alive else TARGET_REACHABLE))
+			self._write(bytes([alive]))
+		elif cmd == P_CMD_VERSION:
+			self._sleep(self.usb_latency)
+			self._write(P_CMD_RETURN_OK + bytes([self.protocol]))
+		elif cmd in (P_CMD_FORCE, P_CMD_DEBUG_PULSE):
+			self._sleep(self.usb_latency)
+			self._write(P_CMD_RETURN_OK)
+		else:
+			self._write(S_NAK)
+
+	def _run(self, expected_ints: int) -> tuple[bytes, tuple, bytes]:
+		'''
+		Emulates `glitcher_run()`: draws an outcome from the target profile and waits for the attempt to complete
+
+		Returns:
+			The result code, the values sent by the target (the unexpected byte for P_CMD_RESULT_ZOMBIE)
+			and the crash info for P_CMD_RESULT_ANSI_CTRL_CODE
+		'''
+		profile = self.target.profile
+		if not self.target.alive:
+			self._sleep(TARGET_REACHABLE)
+			self._count('unreachable')
+			return P_CMD_RESULT_UNREACHABLE, (), b''
+
+		weights = profile.weights_at({'ext_offset': self.ext_offset, 'width': self.width, 'voltage': self.voltage, 'prep_voltage': self.prep_voltage})
+		outcome = self.rng.choices(list(weights), weights=list(weights.values()))[0]
+		self._count(outcome)
+		self._sleep(profile.attempt_time + (self.ext_offset + self.width) / 1e6)
+		if outcome == 'normal' or outcome == 'success':
+			values = profile.normal if outcome == 'normal' else profile.success
+			return P_CMD_RESULT_ALIVE, (tuple(values) + (0, ) * expected_ints)[:expected_ints], b''
+		elif outcome == 'reset':
+			self.target.crashed = True
+			return P_CMD_RESULT_RESET, (), b''
+		elif outcome == 'zombie':
+			return P_CMD_RESULT_ZOMBIE, (ord('R'), ), b''
+		elif outcome == 'data_timeout':
+			return P_CMD_RESULT_DATA_TIMEOUT, (), b''
+		elif outcome == 'pmic_fail':
+			return P_CMD_RESULT_PMIC_FAIL, (), b''
+		elif outcome == 'ansi':
+			# coreboot crash output
+			self.target.crashed = True
+			dump = b'\x1b[0m[ERROR]  Unexpected Exception: 6 @ 10:000a0ecd - Halting\n' * self.rng.randrange(1, 40)
+			self._sleep(len(dump) * 10 / UART_TARGET_BAUD) # The glitcher receives it over the target UART
+			return P_CMD_RESULT_ANSI_CTRL_CODE, (), dump
+		else:
+			raise ValueError(f'Unknown outcome {outcome}')
+
+	def _write_chunks(self, dump: bytes) -> None:
+		'''
+		Crash info is forwarded in length-prefixed chunks terminated by an empty one
+		'''
+		for i in range(0, len(dump), ANSI_CHUNK_LEN):
+			chunk = dump[i:i + ANSI_CHUNK_LEN]
+			self._write(ANSI_CHUNK_HEADER.pack(len(chunk)) + chunk)
+		self._write(ANSI_CHUNK_HEADER.pack(0))
+
+	def _arm(self, expected_ints: int) -> None:
+		'''
+		Emulates `glitcher_arm()`, answers with the same byte sequence the firmware would send
+		'''
+		if expected_ints > MAX_EXPECTED_INTS:
+			return # The firmware silently refuses
+		self._sleep(self.usb_latency)
+		code, values, dump = self._run(expected_ints)
+		if code == P_CMD_RESULT_ALIVE:
+			self._write(code + struct.pack(f'<{expected_ints}I', *values))
+		elif code == P_CMD_RESULT_ZOMBIE:
+			self._write(code + bytes(values[:1]))
+		elif code == P_CMD_RESULT_ANSI_CTRL_CODE:
+			self._write(code)
+			self._write_chunks(dump)
+		else:
+			self._write(code)
+
+	def _arm_batch(self) -> None:
+		'''
+		Emulates the P_CMD_ARM_BATCH handler and `glitcher_batch()`
+		'''
+		_, count, expected_ints = ARM_BATCH_HEADER.unpack(P_CMD_ARM_BATCH + self._read(ARM_BATCH_HEADER.size - 1))
+		entries = [ARM_BATCH_ENTRY.unpack(self._read(ARM_BATCH_ENTRY.size)) for _ in range(count)]
+		self._sleep(self.usb_latency)
+		if count > GLITCH_BATCH_MAX or expected_ints > MAX_EXPECTED_INTS or \
+				any(voltage > TPS_VCORE_MAX or prep_voltage > TPS_VCORE_MAX for _, _, voltage, prep_voltage in entries):
+			self._write(P_CMD_RETURN_KO + b'[!] Invalid batch (too many entries or return values, or value risks frying the CPU). Ignoring\n')
+			return
+		for i, (self.ext_offset, self.width, self.voltage, self.prep_voltage) in enumerate(entries):
+			code, values, dump = self._run(expected_ints)
+			extra = values[0] if code == P_CMD_RESULT_ZOMBIE else 0
+			if code != P_CMD_RESULT_ALIVE:
+				values = (0, ) * expected_ints
+			self._write(BATCH_RECORD_HEADER.pack(i, code[0], extra) + struct.pack(f'<{expected_ints}I', *values))
+			if code == P_CMD_RESULT_ANSI_CTRL_CODE:
+				self._write_chunks(dump)
+			if code in BATCH_STOP_RESULTS:
+				break
+
+	def _count(self, outcome: str) -> None:
+		self.counts[outcome] = self.counts.get(outcome, 0) + 1
+
+class KA3305PEmulator(_PtyDevice):
+	'''
+	Emulates the subset of the KORAD KA3305P protocol used by :py:class:`~KA3305P`.
+	Switching the output powers the emulated target on and off.
+	'''
+	def __init__(self, target: EmulatedTarget):
+		super().__init__()
+		self.target = target
+
+	def _serve(self) -> None:
+		line = b''
+		try:
+			while True:
+				c = self._read(1)
+				if c != b'\n':
+					line += c
+					continue
+				self._handle(line.strip())
+				line = b''
+		except EOFError:
+			pass
+
+	def _handle(self, cmd: bytes) -> None:
+		if cmd == b'*IDN?':
+			self._write(b'KORAD KA3305P V5.8 SN:00000000\n')
+		elif cmd == b'STATUS?':
+			self._write(bytes([0b1000000 if self.target.powered else 0]))
+		elif cmd in (b'OUT0', b'OUT1'):
+			self.target.power(cmd == b'OUT1')
+
+if __name__ == '__main__':
+	from argparse import ArgumentParser
+	from . import target_from_opname, target_op_names
+
+	argparser = ArgumentParser(description='Serve a virtual picocoder and KA3305P power supply on pseudo-terminals')
+	argparser.add_argument('operation', type=str, choices=target_op_names(), help='The operation running on the emulated target')
+	argparser.add_argument('--usb-latency', default=0.5, type=float, help='Host <-> glitcher latency in ms (default 0.5)')
+	argparser.add_argument('--time-scale', default=1.0, type=float, help='Multiplier for all emulated delays (default 1.0)')
+	argparser.add_argument('--seed', default=None, type=int, help='Seed for the glitch outcome generator')
+	argparser.add_argument('--protocol', default=PROTOCOL_VERSION, type=int, help=f'Protocol version of the emulated firmware, 0 for firmware without P_CMD_VERSION (default {PROTOCOL_VERSION})')
+	args = argparser.parse_args()
+
+	emulated_target = EmulatedTarget(target_from_opname(args.operation))
+	with PicocoderEmulator(emulated_target, args.usb_latency / 1000, time_scale=args.time_scale, seed=args.seed, protocol=args.protocol) as glitcher, \
+			KA3305PEmulator(emulated_target) as ps:
+		print(f'Glitcher:     {glitcher.port}')
+		print(f'Power supply: {ps.port}')
+		try:
+			while True:
+				time.sleep(1)
+		except KeyboardInterrupt:
+			print(f'\nOutcomes: {glitcher.counts}')
@@ -2,6 +2,7 @@
 Container for all target code type-related information.
 '''
 
+import struct
 from typing import TypeAlias
 
 class Target:
@@ -12,6 +13,12 @@ class Target:
 	op_name: str = 'unknown'
 	ret_vars: list[str] = []
 	is_slow: bool = False
+	ret_struct: struct.Struct = struct.Struct('<') # Layout of the return values (u32 each), see __init_subclass__
+
+	def __init_subclass__(cls, **kwargs):
+		super().__init_subclass__(**kwargs)
+		# Precompile the return values layout once per target class
+		cls.ret_struct = struct.Struct(f'<{len(cls.ret_vars)}I')
 
 	@property
 	def ret_count(self) -> int:
@@ -53,7 +60,7 @@ class TargetLoad(Target):
 		'''
 		Filter function that determines whether a glitch attempt was successful.
 		'''
-		(fault_count, ) = from_target
+		(fault_count, _) = from_target
 		return fault_count > 0
 
 class TargetCmp(Target):
@@ -236,7 +243,7 @@ class TargetUcodeUpdate(Target):
 		'''
 		Filter function that determines whether a glitch attempt was successful.
 		'''
-		(ucode_rev, ) = from_target
+		(ucode_rev, _) = from_target
 		return ucode_rev == 0x28  # My modified ucode is based off rev 0x28, ucode in FIT package is 0x20
 
 class TargetUcodeUpdateTime(Target):
@@ -1,18 +1,24 @@
 from enum import Enum
-from math import ceil
 import random
 import struct
 import time
-from typing import Iterator, TypedDict
+from typing import Iterable, Iterator, Sequence, TypedDict
 
 import matplotlib
 import matplotlib.axes
 import matplotlib.figure
 import matplotlib.pyplot as plt
 from matplotlib.ticker import MaxNLocator
+import numpy as np
 import serial
 
 from . import Target, TargetType
+from .plotting import LivePlot
+from .pmic import PMICModel, TPS65094
+from .profiling import PhaseTimer
+from .results import ResultStore
+from .sampling import ExhaustiveSampler, Lattice, ResetScheduler, Sampler, SAMPLER_TYPES
+from .timeouts import AdaptiveTimeout, TimeoutPolicy, READ_SLICE
 
 class GlitchSettings(TypedDict):
 	'''
@@ -37,14 +43,29 @@ class GlitchResult(str, Enum):
 	HALF_SUCCESS			= '^c'	# Cyan		Triangle pointing up (solid)
 	BROKEN					= 'Xm'	# Magenta	X (filled)
 
+# The target has to be power cycled after these results
+RESET_RESULTS = (GlitchResult.RESET, GlitchResult.BROKEN, GlitchResult.HALF_SUCCESS)
+# Outcome class of every result for the samplers
+SAMPLER_OUTCOMES = {
+	GlitchResult.RESET			: Sampler.RESET,
+	GlitchResult.NORMAL			: Sampler.OTHER,
+	GlitchResult.WEIRD			: Sampler.OTHER,
+	GlitchResult.SUCCESS		: Sampler.HIT,
+	GlitchResult.HALF_SUCCESS	: Sampler.HIT,
+	GlitchResult.BROKEN			: Sampler.RESET,
+}
+
 
 P_CMD_ARM					= b'\x20'	# Arm glitch handler
+P_CMD_ARM_SETTINGS			= b'\x21'	# Set all glitch parameters and arm in a single frame
+P_CMD_ARM_BATCH				= b'\x22'	# Upload a block of glitch parameters and run them back to back
 
 P_CMD_FORCE					= b'\x30'	# Force write to PMBus to perform a glitch
 P_CMD_SET_VOLTAGE			= b'\x31'	# Set glitch voltage
 P_CMD_SET_EXT_OFFST			= b'\x32'	# Set external offset (wait after trig.) in us
 P_CMD_SET_WIDTH				= b'\x33'	# Set glitch width	(duration of glitch) in us
 P_CMD_SET_PREP_VOLTAGE		= b'\x34'	# Set Vp (preparation voltage) before glitch
+P_CMD_GET_STATE				= b'\x35'	# Read back all glitch parameters
 
 P_CMD_PING					= b'\x70'	# Ping from host to picocoder
 P_CMD_TARGET_PING			= b'\x71'	# Ping from picocoder to target
@@ -53,6 +74,7 @@ P_CMD_UART_ECHO				= b'\x75'	# Echo UART data from target to USB
 P_CMD_MEASURE_LOOP_DURATION	= b'\x76'	# Measure the length (in us) of opcode loop
 P_CMD_UART_TOGGLE_DEBUG_PIN	= b'\x77'	# Toggle debug pin on UART data in
 P_CMD_DEBUG_PULSE			= b'\x78'	# Single 10 us pulse on debug pin
+P_CMD_VERSION				= b'\x79'	# Protocol version of the firmware
 
 P_CMD_RESULT_RESET			= b'\x50'	# Target reset
 P_CMD_RESULT_ALIVE			= b'\x51'	# Target is alive
@@ -60,7 +82,7 @@ P_CMD_RESULT_ZOMBIE			= b'\x52'	# Target is nor alive nor it reset after glitch
 P_CMD_RESULT_DATA_TIMEOUT	= b'\x53'	# Target timeout after glitch when sending data back (target is alive)
 P_CMD_RESULT_UNREACHABLE	= b'\x54'	# Target unavailable when starting glitch: did not receive anything on the serial port
 P_CMD_RESULT_PMIC_FAIL		= b'\x55'	# Could not send command to PMIC
-P_CMD_RESULT_ANSI_CTRL_CODE	= b'\x56'	# Target sent an ANSI control code, data will follow
+P_CMD_RESULT_ANSI_CTRL_CODE	= b'\x56'	# Target sent an ANSI control code, data follows in chunks (see ANSI_CHUNK_HEADER)
 RESULT_NAMES = {
 	P_CMD_RESULT_RESET			: 'RESET',
 	P_CMD_RESULT_ALIVE			: 'ALIVE',
@@ -74,11 +96,95 @@ RESULT_NAMES = {
 P_CMD_RETURN_OK				= b'\x61'	# Command successful
 P_CMD_RETURN_KO				= b'\x62'	# Command failed
 P_CMD_PONG					= b'\x63'	# Response to ping
+S_NAK						= b'\x15'	# Serprog NAK, the firmware answers unknown commands with it
+
+# Protocol version of the firmware (see P_PROTOCOL_VERSION in cmd.h). Version 1 brought
+# P_CMD_ARM_SETTINGS, P_CMD_ARM_BATCH, P_CMD_GET_STATE and P_CMD_VERSION; older firmware NAKs
+# P_CMD_VERSION and counts as version 0
+PROTOCOL_VERSION = 1
+
+# Length prefix of each chunk of data following P_CMD_RESULT_ANSI_CTRL_CODE, an empty chunk ends the stream
+ANSI_CHUNK_HEADER = struct.Struct('<H')
+# P_CMD_ARM_SETTINGS frame: cmd, ext_offset, width, voltage, prep_voltage, ret_count
+ARM_SETTINGS_FRAME = struct.Struct('<BIIBBB')
+# P_CMD_GET_STATE answer (after P_CMD_RETURN_OK): ext_offset, width, voltage, prep_voltage
+STATE_FRAME = struct.Struct('<IIBB')
+STATE_PARAMS = ('ext_offset', 'width', 'voltage', 'prep_voltage')
+# P_CMD_ARM_BATCH frame: header (cmd, count, ret_count) followed by `count` entries (ext_offset, width, voltage, prep_voltage)
+ARM_BATCH_HEADER = struct.Struct('<BHB')
+ARM_BATCH_ENTRY = struct.Struct('<IIBB')
+# P_CMD_ARM_BATCH result records: index, result code, extra byte (the unexpected byte for
+# P_CMD_RESULT_ZOMBIE), followed by ret_count u32 values
+BATCH_RECORD_HEADER = struct.Struct('<HBB')
+GLITCH_BATCH_MAX = 512 # See GLITCH_BATCH_MAX in glitch.h
+# The glitcher stops a batch after these results, the target needs to be power cycled
+BATCH_STOP_RESULTS = (P_CMD_RESULT_RESET, P_CMD_RESULT_UNREACHABLE, P_CMD_RESULT_PMIC_FAIL, P_CMD_RESULT_ANSI_CTRL_CODE)
+
+def result_payload_len(tc: TargetType, code: bytes) -> int:
+	'''
+	Number of bytes the glitcher sends after a glitch result code.
+	P_CMD_RESULT_ANSI_CTRL_CODE is followed by a variable-length stream and is not covered here.
+
+	Args:
+		tc: Target type the glitch was performed against
+		code: Result code received from the glitcher
+	'''
+	if code == P_CMD_RESULT_ALIVE:
+		return tc.ret_struct.size
+	if code == P_CMD_RESULT_ZOMBIE:
+		return 1
+	return 0
+
+def decode_result(tc: TargetType, code: bytes, payload: bytes|memoryview) -> tuple[GlitchResult, tuple|bytes|None]:
+	'''
+	Turns a raw glitcher result code and the data following it into a :py:class:`~GlitchResult`
+
+	Args:
+		tc: Target type the glitch was performed against
+		code: Result code received from the glitcher
+		payload: Data received after the result code (see :py:func:`~result_payload_len`)
+
+	Returns:
+		The result and the data returned by the target, if any
+	'''
+	if code == P_CMD_RESULT_UNREACHABLE:
+		# No trigger received
+		return GlitchResult.BROKEN, code
+	elif code == P_CMD_RESULT_PMIC_FAIL:
+		# Could not send command to PMIC
+		return GlitchResult.BROKEN, code
+	elif code == P_CMD_RESULT_RESET:
+		# Target died during the glitch
+		return GlitchResult.RESET, None
+	elif code == P_CMD_RESULT_ALIVE:
+		# Target is alive
+		if len(payload) < tc.ret_struct.size:
+			raise ConnectionError(f'Did not receive expected value {tc.ret_vars[len(payload) // 4]} from picocoder after P_CMD_RESULT_ALIVE')
+		ret = tc.ret_struct.unpack_from(payload)
+		if tc.is_success(ret):
+			return GlitchResult.SUCCESS, ret
+		else:
+			return GlitchResult.NORMAL, ret
+	elif code == P_CMD_RESULT_DATA_TIMEOUT:
+		# Target is alive, but it did not send (all) expected data back after glitch
+		return GlitchResult.WEIRD, None
+	elif code == P_CMD_RESULT_ZOMBIE:
+		# Target sent some other unexpected data
+		if not payload:
+			raise ConnectionError('Did not receive unexpected data from picocoder after P_CMD_RESULT_ZOMBIE')
+		return GlitchResult.WEIRD, bytes(payload)
+	elif code == P_CMD_RESULT_ANSI_CTRL_CODE:
+		# Target sent an ANSI control code, payload is the data that followed
+		return GlitchResult.WEIRD, payload
+	else:
+		return GlitchResult.WEIRD, code
 
 class GlitchController:
 	'''
 	Glitch campaign controller. Generates glitch values and stores results
 	'''
+	SAMPLERS = tuple(SAMPLER_TYPES) # See set_sampler()
+
 	def __init__(self, groups: list[str], parameters: list[str], nominal_voltage: float):
 		'''
 		Args:
@@ -89,11 +195,20 @@ class GlitchController:
 		self.groups = groups
 		self.params = {param: {'start': 0, 'end': 0, 'step': 1} for param in parameters}
 		self.nominal_voltage = nominal_voltage
-		self.results: list[tuple[GlitchSettings, GlitchResult, tuple|bytes|None]] = []
+		self.results = ResultStore(parameters, list(GlitchResult)) # Also a list of (glitch_values, result, data)
 		self.fig: matplotlib.figure.Figure = None # type: ignore
 		self.ax: matplotlib.axes.Axes = None # type: ignore
 		self.xparam: str = None # type: ignore
 		self.yparam: str = None # type: ignore
+		self.plot: LivePlot|None = None
+		self.sampler: str = 'random'
+		self.seed: int|None = None
+		self.sampler_options: dict = {}
+		self.active: Sampler|None = None # Sampler started by glitch_values()
+		self.scheduler: ResetScheduler|None = None
+		self.discarded: float = 0.0 # Share of the lattice the samplers skip as unreachable (see lattice() and _update_discarded())
+		self._checkpoint: dict = {} # State to restore in the next sampler, see resume()
+		self._history: Iterable[tuple[GlitchSettings, GlitchResult]]|None = None
 
 	def set_range(self, param: str, start: int, end: int) -> None:
 		'''
@@ -121,39 +236,200 @@ class GlitchController:
 			raise ValueError(f'Parameter {param} not found')
 		self.params[param]['step'] = step
 
-	def rand_glitch_values(self) -> Iterator[GlitchSettings]:
+	def set_sampler(self, sampler: str, seed: int|None = None, **options) -> None:
+		'''
+		Select the sampler used by :py:meth:`~glitch_values`
+
+		Args:
+			sampler: 'random' (see :py:class:`~RandomSampler`), 'exhaustive' (see :py:class:`~ExhaustiveSampler`),
+				'sweep' (see :py:class:`~SweepSampler`), 'zoom' (see :py:class:`~ZoomSampler`)
+				or 'bandit' (see :py:class:`~ThompsonSampler`)
+			seed: Seed of the sampler (default: the one of the checkpoint passed to :py:meth:`~resume`,
+				otherwise a random one drawn by :py:meth:`~glitch_values` and saved in the checkpoints)
+			options: Keyword arguments of the sampler, e.g. the `order` of the sweep
+		'''
+		if sampler not in self.SAMPLERS:
+			raise ValueError(f'Sampler {sampler} not found')
+		self.sampler = sampler
+		self.seed = seed
+		self.sampler_options = options
+
+	def glitch_values(self) -> Iterator[GlitchSettings]:
 		'''
-		Generates an infinite sequence of random glitch values (repetitions are possible).
+		Glitch values from the sampler selected with :py:meth:`~set_sampler`, which is kept in
+		:py:attr:`~active`. Results must be fed back with :py:meth:`~add_result`. The sampler is
+		started, and the history passed to :py:meth:`~resume` replayed, before this returns.
 
 		It also checks if the current settings can achieve the required voltage drops and raises
 		an error if they cannot.
 		'''
+		if self.seed is None:
+			self.seed = random.getrandbits(64) # Checkpoints must describe the same order when resumed
+		self.check_ranges()
+		sampler = self.active = SAMPLER_TYPES[self.sampler](self.lattice(), self.seed, **self.sampler_options)
+		self._replay(sampler)
+		sampler.resume(self._checkpoint.get('state', {}))
+		self._checkpoint = {}
+		return self._draw(sampler)
+
+	def _draw(self, sampler: Sampler) -> Iterator[GlitchSettings]:
+		for values in sampler.points():
+			yield dict(zip(self.params, values)) # type: ignore
+		self._update_discarded()
+
+	def _update_discarded(self) -> None:
+		'''
+		The exhaustive sampler checks the points one by one instead of computing the mask, take
+		:py:attr:`~discarded` from the points it checked so far
+		'''
+		if isinstance(self.active, ExhaustiveSampler) and self.active.checked:
+			self.discarded = self.active.discarded
+
+	def rand_glitch_values(self, seed: int|None = None) -> Iterator[GlitchSettings]:
+		'''
+		Generates an infinite sequence of random feasible glitch values (repetitions are possible),
+		see :py:class:`~RandomSampler`.
+
+		It also checks if the current settings can achieve the required voltage drops and raises
+		an error if they cannot.
+
+		Args:
+			seed: Seed of the sampler (default: random)
+		'''
+		self.set_sampler('random', seed)
+		return self.glitch_values()
+
+	def param_values(self, param: str) -> range:
+		'''
+		Values of a parameter, from its start to its end (both included) with its step. Reversed
+		ranges (start > end) are walked downwards.
+		'''
+		values = self.params[param]
+		step = abs(values['step'])
+		if values['start'] <= values['end']:
+			return range(values['start'], values['end'] + 1, step)
+		return range(values['start'], values['end'] - 1, -step)
+
+	def check_ranges(self) -> None:
+		'''
+		Raise an error if the current settings cannot achieve the required voltage drops
+		'''
 		can_prep_voltage = self.check_prep_voltage()
 		can_voltage = self.check_voltage()
 		if not all([can_prep_voltage, can_voltage]):
 			raise ValueError('The current settings cannot achieve the required voltage drops')
 
-		while True:
-			ret: GlitchSettings = {} # type: ignore
-			for param in self.params:
-				values = self.params[param]
-				ret[param] = random.randrange(values['start'], values['end'] + 1, values['step'])
-			yield ret
+	def lattice(self) -> Lattice:
+		'''
+		Values of every parameter and their feasible combinations, as seen by the samplers: the mask
+		comes from :py:meth:`~feasibility_mask` (on first use, it sets :py:attr:`~discarded` and
+		prints how much of the lattice is skipped) and single points are checked with
+		:py:meth:`~check_settings`
+		'''
+		axes = [self.param_values(param) for param in self.params]
+		return Lattice(list(self.params), axes, lambda: self._feasible_mask(axes), lambda values: self.check_settings(dict(zip(self.params, values)))) # type: ignore
+
+	def _feasible_mask(self, axes: Sequence[range]) -> np.ndarray:
+		mask = self.feasibility_mask(axes)
+		feasible = int(np.count_nonzero(mask))
+		if not feasible:
+			raise ValueError('None of the configured glitch settings can achieve the required voltage drops')
+		self.discarded = 1 - feasible / mask.size
+		if self.discarded:
+			print(f'Skipping {mask.size - feasible} of {mask.size} glitch settings ({self.discarded:.1%}): the required voltage drops cannot be achieved')
+		return mask
+
+	def checkpoint(self) -> dict:
+		'''
+		State of the current sampler (see :py:meth:`~Sampler.checkpoint`) and of the scheduler, to
+		continue the campaign later with :py:meth:`~resume`. JSON serializable.
+		'''
+		self._update_discarded()
+		state = {'sampler': self.sampler, 'seed': self.seed, 'params': self.params, 'results': len(self.results)}
+		if self.active is not None:
+			state['state'] = self.active.checkpoint()
+		elif 'state' in self._checkpoint:
+			state['state'] = self._checkpoint['state'] # Not restored yet
+		if self.scheduler is not None:
+			state['scheduler'] = self.scheduler.checkpoint()
+		return state
+
+	def resume(self, checkpoint: dict|None, history: Iterable[tuple[GlitchSettings, GlitchResult]]) -> None:
+		'''
+		Continue an interrupted campaign: the next sampler started by :py:meth:`~glitch_values`
+		first replays the results of the previous runs (into :py:attr:`~results`, the sampler and
+		the scheduler, see :py:meth:`~Sampler.replay`) and then restores the state in `checkpoint`,
+		if it was taken with the same sampler, seed and ranges. Without a seed in
+		:py:meth:`~set_sampler`, the seed of the checkpoint is used.
 
-	def add_result(self, glitch_values: GlitchSettings, result: GlitchResult, data: tuple|bytes|None = None):
+		Args:
+			checkpoint: State saved with :py:meth:`~checkpoint`, if any
+			history: (glitch_values, result) of the previous runs, consumed once
+		'''
+		if checkpoint and self.seed is None:
+			self.seed = checkpoint.get('seed') # Continue the order of the previous runs
+		if checkpoint and (checkpoint.get('sampler'), checkpoint.get('seed'), checkpoint.get('params')) != (self.sampler, self.seed, self.params):
+			print('Ignoring the checkpoint: it was taken with a different sampler, seed or ranges')
+			checkpoint = None
+		self._checkpoint = checkpoint or {}
+		self._history = history
+
+	def _replay(self, sampler: Sampler) -> None:
+		'''
+		Replay the history passed to :py:meth:`~resume` into :py:attr:`~results`, `sampler` and the scheduler
+		'''
+		if self._history is None:
+			return
+		count = 0
+		for gs, result in self._history:
+			values = [gs[param] for param in self.params] # type: ignore
+			self.results.add(gs, result) # type: ignore
+			sampler.replay(values, SAMPLER_OUTCOMES[result])
+			if self.scheduler is not None:
+				self.scheduler.update(values, result in RESET_RESULTS)
+			count += 1
+		self._history = None
+		print(f'Replayed {count} results of the previous runs')
+
+	def scheduled_glitch_values(self, batch_size: int, window: int|None = None, survival: float = 0.1,
+			cell: dict[str, int]|None = None) -> Iterator[list[GlitchSettings]]:
+		'''
+		Glitch values of :py:meth:`~glitch_values` in batches ordered by the learned probability of
+		a target reset (see :py:class:`~ResetScheduler`): batches of likely-safe settings, then
+		likely-reset ones at the end of short batches. The scheduler is kept in :py:attr:`~scheduler`,
+		results must be fed back with :py:meth:`~add_result`.
+
+		Args:
+			batch_size: Maximum length of a batch
+			window: Settings ordered together (default: 4 batches)
+			survival: A batch is closed once the probability that it runs without a reset drops below this
+			cell: Lattice points per cell for some parameters (default: :py:attr:`~ResetScheduler.CELLS` cells per axis)
+		'''
+		self.scheduler = ResetScheduler(self.lattice(), window or 4 * batch_size, survival, cell)
+		self.scheduler.resume(self._checkpoint.get('scheduler', {}))
+		return self.scheduler.plan(self.glitch_values(), lambda gs: [gs[param] for param in self.params], batch_size)
+
+	def add_result(self, glitch_values: GlitchSettings, result: GlitchResult, data: tuple|bytes|None = None, cost: float|None = None):
 		'''
-		Add a result to the result list, and update the plot if it is displayed
+		Add a result to :py:attr:`~results`, update the plot if it is displayed and feed the result
+		back to the sampler and the scheduler
 
 		Args:
 			glitch_values: The glitch values used to achieve the result
 			result: The result of the glitch
 			data: Additional data returned by the glitcher (default: None)
+			cost: Time spent on the attempt, including the target reset it caused (s), for the
+				samplers that learn it (default: None, not measured)
 		'''
-		self.results.append((glitch_values, result, data))
+		self.results.add(glitch_values, result, data) # type: ignore
+		values = [glitch_values[param] for param in self.params] # type: ignore
+		if self.active is not None:
+			self.active.update(values, SAMPLER_OUTCOMES[result], cost)
+		if self.scheduler is not None:
+			self.scheduler.update(values, result in RESET_RESULTS)
 
-		if self.ax and self.fig:
-			self.ax.plot(glitch_values[self.xparam], glitch_values[self.yparam], result)
-			self.fig.canvas.draw() # Guarantees live update of the plot whenever a new point is added
+		if self.plot is not None:
+			self.plot.update() # Rate limited, see LivePlot
 
 	def check_prep_voltage(self) -> bool:
 		'''
@@ -187,9 +463,22 @@ class GlitchController:
 		'''
 		raise NotImplementedError('Use PMIC-specific glitch controller')
 
-	def draw_graph(self, xparam: str, yparam: str, integer_axis: bool = True):
+	def feasibility_mask(self, axes: Sequence[range]) -> np.ndarray:
 		'''
-		Draws a dynamic graph of the results
+		Vectorised :py:meth:`~check_settings` over a whole lattice
+
+		Args:
+			axes: Values of every parameter, in the order of :py:attr:`~params`
+
+		Returns:
+		Boolean array of shape `(len(axes[0]), len(axes[1]), ...)`, True where the settings
+		can achieve the required voltage drops
+		'''
+		raise NotImplementedError('Use PMIC-specific glitch controller')
+
+	def draw_graph(self, xparam: str, yparam: str, integer_axis: bool = True, max_fps: float = 5.0, max_points: int|None = 100_000):
+		'''
+		Draws a dynamic graph of the results (see :py:class:`~LivePlot`)
 		NOTE If used in a jupyter notebook, the plot will be displayed live only if the figure
 		is generated in a different cell than the one that adds data to the plot
 
@@ -197,28 +486,26 @@ class GlitchController:
 			xparam: The parameter to use as the x-axis
 			yparam: The parameter to use as the y-axis
 			integer_axis: If True, the axis ticks will be integer-only (default: True)
+			max_fps: Maximum number of plot updates per second (default: 5)
+			max_points: Latest results of each kind that are drawn (default: 100000, None for all)
 		'''
-		if self.ax:
-			self.ax.clear()
-		if self.fig:
-			self.fig.clear()
-			plt.close(self.fig)
-		self.fig, self.ax = plt.subplots()
-		if integer_axis:
-			self.ax.yaxis.set_major_locator(MaxNLocator(integer=True))
-			self.ax.xaxis.set_major_locator(MaxNLocator(integer=True))
 		if xparam not in self.params:
 			raise ValueError(f'Parameter {xparam} not found')
-		self.xparam = xparam
 		if yparam not in self.params:
 			raise ValueError(f'Parameter {yparam} not found')
+		if self.plot is not None:
+			self.plot.close()
+		self.plot = LivePlot(self.results, xparam, yparam, integer_axis, max_fps, max_points)
+		self.fig, self.ax = self.plot.fig, self.plot.ax
+		self.xparam = xparam
 		self.yparam = yparam
 
 	def redraw_graph(self):
 		'''
 		Redraws the graph with the current results and x/y axes settings
 		'''
-		self.fig.canvas.draw()
+		if self.plot is not None:
+			self.plot.redraw()
 
 	def draw_graph_view(self, xparam: str, yparam: str, integer_axis: bool = True) -> tuple[matplotlib.figure.Figure, matplotlib.axes.Axes]:
 		'''
@@ -239,8 +526,11 @@ class GlitchController:
 			raise ValueError(f'Parameter {xparam} not found')
 		if yparam not in self.params:
 			raise ValueError(f'Parameter {yparam} not found')
-		for glitch_values, result, _ in self.results:
-			ax.plot(glitch_values[xparam], glitch_values[yparam], result)
+		x, y = self.results.column(xparam), self.results.column(yparam)
+		for result in GlitchResult:
+			selected = self.results.mask(result)
+			if selected.any():
+				ax.plot(x[selected], y[selected], result)
 		return fig, ax
 
 	def draw_graph_view_filter(self, xparam: str, yparam: str, print_last: GlitchResult, integer_axis: bool = True):
@@ -263,33 +553,39 @@ class GlitchController:
 			raise ValueError(f'Parameter {xparam} not found')
 		if yparam not in self.params:
 			raise ValueError(f'Parameter {yparam} not found')
-		delayed = set()
-		for glitch_values, result, _ in self.results:
-			if result == print_last:
-				delayed.add((glitch_values, result))
-			else:
-				ax.plot(glitch_values[xparam], glitch_values[yparam], result)
-		for glitch_values, result in delayed:
-			ax.plot(glitch_values[xparam], glitch_values[yparam], result)
+		x, y = self.results.column(xparam), self.results.column(yparam)
+		for result in sorted(GlitchResult, key=lambda r: r == print_last):
+			selected = self.results.mask(result)
+			if selected.any():
+				ax.plot(x[selected], y[selected], result)
 		return fig, ax
 
-class GlitchControllerTPS65094(GlitchController):
+class GlitchControllerPMIC(GlitchController):
 	'''
-	Glitch controller for TPS65094 PMIC on Up Squared Pentium N4200 boards
+	Glitch controller for boards whose core voltage is set through a PMIC: all the voltage checks
+	run on the lookup table and the timings of a :py:class:`~PMICModel`
 	'''
-	I2C_CMD_TRANSMIT = 36 # us
-	SLEW_RATE = 3 # mV/us
+
+	def __init__(self, groups: list[str], parameters: list[str], nominal_voltage: float, pmic: PMICModel):
+		'''
+		Args:
+			groups: List of result groups (the possible result values)
+			parameters: List of parameters that the glitch controller will generate (the glitch search space)
+			nominal_voltage: Nominal voltage of the target (in V)
+			pmic: Model of the PMIC (see :py:data:`~PMIC_MODELS`)
+		'''
+		super().__init__(groups, parameters, nominal_voltage)
+		self.pmic = pmic
 
 	def check_prep_voltage(self) -> bool:
-		# Convert VID to millivolts
 		prep_voltage_min = min(self.params['prep_voltage']['start'], self.params['prep_voltage']['end'])
-		prep_voltage_min_mv = 0 if prep_voltage_min == 0 else 500 + (prep_voltage_min - 1) * 10
+		prep_voltage_min_mv = int(self.pmic.to_mv(prep_voltage_min))
 
 		ext_offset_min = min(self.params['ext_offset']['start'], self.params['ext_offset']['end'])
 		ext_offset_max = max(self.params['ext_offset']['start'], self.params['ext_offset']['end'])
 
 		max_delta_prep_voltage = abs(prep_voltage_min_mv - self.nominal_voltage * 1000)
-		required_time_voltage_prep = ceil(max_delta_prep_voltage / self.SLEW_RATE - 2*self.I2C_CMD_TRANSMIT) # Time in integer us
+		required_time_voltage_prep = int(self.pmic.required_time(self.nominal_voltage * 1000, prep_voltage_min_mv))
 
 		can_prep_min = required_time_voltage_prep <= ext_offset_min
 		can_prep_max = required_time_voltage_prep <= ext_offset_max
@@ -300,17 +596,16 @@ class GlitchControllerTPS65094(GlitchController):
 		return can_prep_max
 
 	def check_voltage(self) -> bool:
-		# Convert VID to voltage
 		voltage_min = min(self.params['voltage']['start'], self.params['voltage']['end'])
-		voltage_min_mv = 0 if voltage_min == 0 else 500 + (voltage_min - 1) * 10
+		voltage_min_mv = int(self.pmic.to_mv(voltage_min))
 		prep_voltage_max = max(self.params['prep_voltage']['start'], self.params['prep_voltage']['end'])
-		prep_voltage_max_mv = 0 if prep_voltage_max == 0 else 500 + (prep_voltage_max - 1) * 10
+		prep_voltage_max_mv = int(self.pmic.to_mv(prep_voltage_max))
 
 		width_min = min(self.params['width']['start'], self.params['width']['end'])
 		width_max = max(self.params['width']['start'], self.params['width']['end'])
 
 		max_delta_voltage = abs(voltage_min_mv - prep_voltage_max_mv)
-		required_time_voltage = ceil(max_delta_voltage / self.SLEW_RATE - 2*self.I2C_CMD_TRANSMIT) # Time in integer us
+		required_time_voltage = int(self.pmic.required_time(prep_voltage_max_mv, voltage_min_mv))
 
 		can_voltage_min = required_time_voltage <= width_min
 		can_voltage_max = required_time_voltage <= width_max
@@ -320,20 +615,30 @@ class GlitchControllerTPS65094(GlitchController):
 			print(f'Warning: The minimum target of Vf={voltage_min_mv}mV (delta {max_delta_voltage}mV) cannot be achieved within the minimum width={width_min}us. Required width >= {required_time_voltage}us')
 		return can_voltage_max
 
+	def feasible(self, ext_offset: int|np.ndarray, width: int|np.ndarray, voltage: int|np.ndarray, prep_voltage: int|np.ndarray) -> np.ndarray:
+		'''
+		Whether the PMIC can slew from the nominal voltage to Vp within `ext_offset` and from Vp to
+		Vf within `width`. Arguments are broadcast against each other.
+		'''
+		prep_voltage_mv = self.pmic.to_mv(prep_voltage)
+		voltage_mv = self.pmic.to_mv(voltage)
+		return self.pmic.reachable(self.nominal_voltage * 1000, prep_voltage_mv, ext_offset) & self.pmic.reachable(prep_voltage_mv, voltage_mv, width)
+
 	def check_settings(self, gs: GlitchSettings) -> bool:
-		# Convert VID to voltage
-		prep_voltage_v = 0 if gs['prep_voltage'] == 0 else 0.5 + (gs['prep_voltage'] - 1) * 0.01
-		voltage_v = 0 if gs['voltage'] == 0 else 0.5 + (gs['voltage'] - 1) * 0.01
+		return bool(self.feasible(gs['ext_offset'], gs['width'], gs['voltage'], gs['prep_voltage']))
 
-		delta_t_prep = self.I2C_CMD_TRANSMIT + gs['ext_offset']
-		max_voltage_drop_prep = delta_t_prep * self.SLEW_RATE / 1000
-		delta_v_prep = abs(self.nominal_voltage - prep_voltage_v)
+	def feasibility_mask(self, axes: Sequence[range]) -> np.ndarray:
+		grids = dict(zip(self.params, np.ix_(*[np.asarray(axis) for axis in axes])))
+		mask = self.feasible(grids['ext_offset'], grids['width'], grids['voltage'], grids['prep_voltage'])
+		return np.broadcast_to(mask, tuple(len(axis) for axis in axes))
 
-		delta_t_glitch = self.I2C_CMD_TRANSMIT + gs['width']
-		max_voltage_drop_glitch = delta_t_glitch * self.SLEW_RATE / 1000
-		delta_v_glitch = abs(prep_voltage_v - voltage_v)
+class GlitchControllerTPS65094(GlitchControllerPMIC):
+	'''
+	Glitch controller for TPS65094 PMIC on Up Squared Pentium N4200 boards
+	'''
 
-		return max_voltage_drop_prep > delta_v_prep and max_voltage_drop_glitch > delta_v_glitch
+	def __init__(self, groups: list[str], parameters: list[str], nominal_voltage: float):
+		super().__init__(groups, parameters, nominal_voltage, TPS65094)
 
 
 class Picocoder:
@@ -352,6 +657,17 @@ class Picocoder:
 	_prep_voltage: int = None # type: ignore
 	_connected: bool = False
 
+	# Protocol version of the firmware, see version()
+	protocol: int|None = None
+
+	# Ship all settings and arm with a single P_CMD_ARM_SETTINGS frame. Set to False to use the
+	# per-setter path. None picks it on connection, according to the firmware (see version())
+	fast_arm: bool|None = None
+
+	# Per-phase timings of glitch(): 'setup' (settings and arm command), 'glitch' (wait for the
+	# result code) and 'readback' (return values). The caller owns begin() and end()
+	timer: PhaseTimer|None = None
+
 	def __init__(self, glitcher_port: str = '/dev/ttyACM0', baudrate: int = 115200, timeout: float = 1.0):
 		'''
 		Initialize the glitcher interface
@@ -361,14 +677,78 @@ class Picocoder:
 			glitcher_port (str, optional): The port for the glitcher device. Defaults to '/dev/ttyACM0'.
 			baudrate (int, optional): The baudrate for serial communication. Defaults to 115200.
 			timeout (float, optional): The timeout value for serial communication. Defaults to 1.0.
+				Actual timeouts adapt to the glitcher response times, see :py:attr:`~timeouts`
 			slow_target (bool, optional): If True, the target is slow and requires a longer ping timeout. Defaults to False.
 		'''
-		self.s = serial.Serial(glitcher_port, baudrate, timeout=timeout)
+		# Every read has its own deadline (see _read_into), the port only bounds each attempt
+		self.s = serial.Serial(glitcher_port, baudrate, timeout=READ_SLICE)
+		# Reusable receive buffer for result payloads and batch records (at most 255 return values)
+		self._rx = memoryview(bytearray(BATCH_RECORD_HEADER.size + 4 * 255))
+		self.default_timeout = timeout
+		self._timeouts: dict[type, TimeoutPolicy] = {}
 
 	def __del__(self):
 		if self.s is not None:
 			self.s.close()
 
+	@property
+	def timeouts(self) -> TimeoutPolicy:
+		'''
+		Adaptive timeouts for the current target type
+		'''
+		policy = self._timeouts.get(type(self.tc))
+		if policy is None:
+			policy = self._timeouts[type(self.tc)] = TimeoutPolicy(self.tc.is_slow, self.default_timeout)
+		return policy
+
+	def _read_into(self, buf: memoryview, timeout: float|None = None) -> int:
+		'''
+		Read into `buf` until it is full or `timeout` (default: the one the glitcher was opened with)
+		expires. The serial port keeps its short timeout (reconfiguring it costs system calls), reads
+		are repeated until the deadline instead. Returns the number of bytes received.
+		'''
+		deadline = time.perf_counter() + (self.default_timeout if timeout is None else timeout)
+		received = self.s.readinto(buf)
+		while received < len(buf) and time.perf_counter() < deadline:
+			received += self.s.readinto(buf[received:])
+		return received
+
+	def _read(self, size: int = 1, timeout: float|None = None) -> bytes:
+		'''
+		Read up to `size` bytes, see :py:meth:`~_read_into`
+		'''
+		buf = bytearray(size)
+		return bytes(buf[:self._read_into(memoryview(buf), timeout)])
+
+	def _readline(self) -> bytes:
+		deadline = time.perf_counter() + self.default_timeout
+		ret = self.s.readline()
+		while not ret.endswith(b'\n') and time.perf_counter() < deadline:
+			ret += self.s.readline()
+		return ret
+
+	def _expect(self, timeout: AdaptiveTimeout, size: int = 1) -> bytes:
+		'''
+		Read the `size` bytes answering the command just sent, waiting for the adaptive `timeout`.
+		An answer that started to arrive late is waited for up to the ceiling of `timeout`.
+		'''
+		buf = bytearray(size)
+		return bytes(buf[:self._expect_into(timeout, memoryview(buf))])
+
+	def _expect_into(self, timeout: AdaptiveTimeout, buf: memoryview) -> int:
+		'''
+		Same as :py:meth:`~_expect`, reading into `buf`. Returns the number of bytes received.
+		'''
+		start = time.perf_counter()
+		received = self._read_into(buf, timeout.value)
+		if received < len(buf):
+			timeout.expired()
+			if received:
+				received += self._read_into(buf[received:], max(timeout.ceiling - (time.perf_counter() - start), 0))
+		if received == len(buf):
+			timeout.observe(time.perf_counter() - start)
+		return received
+
 	@property
 	def ext_offset(self) -> int:
 		'''
@@ -376,21 +756,21 @@ class Picocoder:
 		the trigger signal is received (in us)
 		'''
 		if self._ext_offset is None:
-			# TODO get from device
-			raise NotImplementedError('No command to read this property from glitcher')
+			self.read_state() # Raises NotImplementedError with old firmware
 		return self._ext_offset
 	@ext_offset.setter
 	def ext_offset(self, value: int):
 		if self._ext_offset == value:
 			return
-		self._ext_offset = value
+		self._ext_offset = None # type: ignore # Unknown until the glitcher acknowledges
 		self.s.reset_input_buffer()
 		self.s.write(struct.pack('<BI', struct.unpack('B', P_CMD_SET_EXT_OFFST)[0], value))
-		ret = self.s.read(1)
+		ret = self._expect(self.timeouts.command)
 		if not ret:
 			raise ConnectionError('Could not set external offset: no response')
 		if ret != P_CMD_RETURN_OK:
 			raise ValueError(f'Could not set external offset. Received: 0x{ret.hex()}')
+		self._ext_offset = value
 
 	@property
 	def width(self) -> int:
@@ -398,21 +778,21 @@ class Picocoder:
 		Width: duration of the glitch pulse (in us)
 		'''
 		if self._width is None:
-			# TODO get from device
-			raise NotImplementedError('No command to read this property from glitcher')
+			self.read_state() # Raises NotImplementedError with old firmware
 		return self._width
 	@width.setter
 	def width(self, value: int):
 		if self._width == value:
 			return
-		self._width = value
+		self._width = None # type: ignore
 		self.s.reset_input_buffer()
 		self.s.write(struct.pack('<BI', struct.unpack('B', P_CMD_SET_WIDTH)[0], value))
-		ret = self.s.read(1)
+		ret = self._expect(self.timeouts.command)
 		if not ret:
 			raise ConnectionError('Could not set width: no response')
 		if ret != P_CMD_RETURN_OK:
 			raise ValueError(f'Could not set width. Received: 0x{ret.hex()}')
+		self._width = value
 
 	@property
 	def target_voltage(self) -> int:
@@ -420,22 +800,22 @@ class Picocoder:
 		Target glitch voltage (byte, as specified in TPS65094, Table 6-3)
 		'''
 		if self._voltage is None:
-			# TODO get from device
-			raise NotImplementedError('No command to read this property from glitcher')
+			self.read_state() # Raises NotImplementedError with old firmware
 		return self._voltage
 	@target_voltage.setter
 	def voltage(self, value: int):
 		if self._voltage == value:
 			return
-		self._voltage = value
+		self._voltage = None # type: ignore
 		self.s.reset_input_buffer()
 		self.s.write(struct.pack('<BB', struct.unpack('B', P_CMD_SET_VOLTAGE)[0], value))
-		ret = self.s.read(1)
+		ret = self._expect(self.timeouts.command)
 		if not ret:
 			raise ConnectionError('Could not set voltage: no response')
 		if ret != P_CMD_RETURN_OK:
-			reason = self.s.readline()
+			reason = self._readline()
 			raise ValueError(f'Could not set voltage. Received: 0x{ret.hex()}: {reason.decode("utf-8", errors="replace")}')
+		self._voltage = value
 
 	@property
 	def prep_voltage(self) -> int:
@@ -443,32 +823,105 @@ class Picocoder:
 		Preparation voltage Vp - see Voltpillager paper
 		'''
 		if self._prep_voltage is None:
-			# TODO get from device
-			raise NotImplementedError('No command to read this property from glitcher')
+			self.read_state() # Raises NotImplementedError with old firmware
 		return self._prep_voltage
 	@prep_voltage.setter
 	def prep_voltage(self, value: int):
 		if self._prep_voltage == value:
 			return
-		self._prep_voltage = value
+		self._prep_voltage = None # type: ignore
 		self.s.reset_input_buffer()
 		self.s.write(struct.pack('<BB', struct.unpack('B', P_CMD_SET_PREP_VOLTAGE)[0], value))
-		ret = self.s.read(1)
+		ret = self._expect(self.timeouts.command)
 		if not ret:
 			raise ConnectionError('Could not set preparation voltage: no response')
 		if ret != P_CMD_RETURN_OK:
 			raise ValueError(f'Could not set preparation voltage. Received: 0x{ret.hex()}')
+		self._prep_voltage = value
+
+	def read_state(self) -> GlitchSettings:
+		'''
+		Read back all glitch parameters from the glitcher with P_CMD_GET_STATE and seed the local
+		cache with them. Firmware older than protocol version 1 raises NotImplementedError.
+
+		Returns:
+			The settings currently loaded on the glitcher
+		'''
+		if self.version() < 1:
+			raise NotImplementedError('The glitcher firmware cannot read back its settings (P_CMD_GET_STATE), update it')
+		self.s.reset_input_buffer()
+		self.s.write(P_CMD_GET_STATE)
+		ret = self._expect(self.timeouts.command)
+		if not ret:
+			raise ConnectionError('Could not read state: no response')
+		if ret != P_CMD_RETURN_OK:
+			raise ValueError(f'Could not read state. Received: 0x{ret.hex()}')
+		data = self._read(STATE_FRAME.size)
+		if len(data) < STATE_FRAME.size:
+			raise ConnectionError('Truncated state from picocoder after P_CMD_GET_STATE')
+		state: GlitchSettings = dict(zip(STATE_PARAMS, STATE_FRAME.unpack(data))) # type: ignore
+		self._cache_settings(state)
+		return state
+
+	def verify_state(self) -> bool:
+		'''
+		Check the local cache against the glitcher state. The cache is reseeded from the glitcher
+		in any case.
+
+		Returns:
+			True if every cached parameter matched the glitcher
+		'''
+		cached = (self._ext_offset, self._width, self._voltage, self._prep_voltage)
+		state = self.read_state()
+		return cached == tuple(state.values())
 
 	def _apply_settings(self, glitch_setting: GlitchSettings) -> None:
+		if None in (self._ext_offset, self._width, self._voltage, self._prep_voltage) and self.version() >= 1:
+			self.read_state()
+		# Setters only talk to the glitcher when the value differs from the cached one (or it is unknown)
 		for param, value in glitch_setting.items():
-			try:
-				getattr(self, param)
-			# Will throw AttributeError (not caught) if the property does not exist
-			except NotImplementedError:
-				# This is expected behavior with some properties, they are set-only
-				pass
 			setattr(self, param, value)
 
+	def _arm_with_settings(self, glitch_setting: GlitchSettings) -> None:
+		'''
+		Send all glitch settings and the return count in a single P_CMD_ARM_SETTINGS frame.
+		The glitcher arms right away and answers with the glitch result, so a glitch costs
+		a single host <-> pico round-trip regardless of how many parameters changed.
+		'''
+		self.s.reset_input_buffer() # Clear any pending data, just in case
+		self.s.write(ARM_SETTINGS_FRAME.pack(
+			P_CMD_ARM_SETTINGS[0],
+			glitch_setting['ext_offset'],
+			glitch_setting['width'],
+			glitch_setting['voltage'],
+			glitch_setting['prep_voltage'],
+			self.tc.ret_count))
+		# Keep the cache coherent in case the per-setter path is used afterwards
+		self._cache_settings(glitch_setting)
+
+	def _cache_settings(self, glitch_setting: GlitchSettings) -> None:
+		self._ext_offset = glitch_setting['ext_offset']
+		self._width = glitch_setting['width']
+		self._voltage = glitch_setting['voltage']
+		self._prep_voltage = glitch_setting['prep_voltage']
+
+	def _read_chunks(self) -> bytes:
+		'''
+		Read the length-prefixed chunks sent after P_CMD_RESULT_ANSI_CTRL_CODE, until the empty one
+		'''
+		ret = b''
+		while True:
+			header = self._expect(self.timeouts.chunk, ANSI_CHUNK_HEADER.size)
+			if len(header) < ANSI_CHUNK_HEADER.size:
+				raise ConnectionError('Did not receive chunk length from picocoder after P_CMD_RESULT_ANSI_CTRL_CODE')
+			(length, ) = ANSI_CHUNK_HEADER.unpack(header)
+			if not length:
+				return ret
+			chunk = self._read(length)
+			if len(chunk) < length:
+				raise ConnectionError('Truncated chunk from picocoder after P_CMD_RESULT_ANSI_CTRL_CODE')
+			ret += chunk
+
 	def clear(self) -> None:
 		'''
 		Clear cached properties
@@ -476,6 +929,7 @@ class Picocoder:
 		self._ext_offset = None	# type: ignore
 		self._width = None		# type: ignore
 		self._voltage = None	# type: ignore
+		self._prep_voltage = None # type: ignore
 
 	def ping(self) -> bool:
 		'''
@@ -483,16 +937,58 @@ class Picocoder:
 		'''
 		self.s.reset_input_buffer()
 		self.s.write(P_CMD_PING)
-		if self.s.read(1) == P_CMD_PONG:
+		if self._expect(self.timeouts.command) == P_CMD_PONG:
 			return True
 		return False
 
+	def version(self) -> int:
+		'''
+		Protocol version of the glitcher firmware (see :py:data:`~PROTOCOL_VERSION`), 0 for firmware
+		that predates P_CMD_VERSION. Queried once and kept in :py:attr:`~protocol`.
+		'''
+		if self.protocol is not None:
+			return self.protocol
+		self.s.reset_input_buffer()
+		self.s.write(P_CMD_VERSION)
+		ret = self._expect(self.timeouts.command)
+		if not ret:
+			raise ConnectionError('Could not read firmware version: no response')
+		if ret == S_NAK:
+			self.protocol = 0
+		elif ret == P_CMD_RETURN_OK:
+			data = self._expect(self.timeouts.command)
+			if not data:
+				raise ConnectionError('Truncated firmware version from picocoder after P_CMD_VERSION')
+			self.protocol = data[0]
+		else:
+			raise ValueError(f'Could not read firmware version. Received: 0x{ret.hex()}')
+		return self.protocol
+
+	def _connect(self) -> None:
+		'''
+		Ping the glitcher before the first glitch and pick :py:attr:`~fast_arm` if it is not set,
+		according to the firmware version
+		'''
+		if self._connected:
+			return
+		if not self.ping():
+			raise ConnectionError('Could not connect to picocoder')
+		protocol = self.version()
+		if self.fast_arm is None:
+			self.fast_arm = protocol >= 1
+			if not self.fast_arm:
+				print(f'Glitcher firmware with protocol version {protocol} < {PROTOCOL_VERSION}: sending the settings one by one')
+		elif self.fast_arm and protocol < 1:
+			raise ValueError('The glitcher firmware cannot arm with a single frame (P_CMD_ARM_SETTINGS), update it or disable fast_arm')
+		self._connected = True
+
 	def ping_target(self, n = 15, delay = 0.1) -> bool:
 		'''
 		Ping target from picocoder.
 		At the glitcher end, the target ping funciton either returns within 7ms if the target is dead, or
 		after 350ms if the target is alive (gives VCore time to ramp up, in case the target just came up).
 		Therefore, this function could possibly take a considerable amount of time (0.5s) to execute.
+		The time a booting target takes to answer is learned in :py:attr:`~TimeoutPolicy.boot`.
 
 		NOTE: Right after boot the target CPU is slower than usual, so waiting for the target to perform some
 			  iterations of the loop before considering it alive is a good idea (implemented in firmware code)
@@ -501,23 +997,25 @@ class Picocoder:
 			n: number of attempts to ping the target
 			delay: delay between attempts
 		'''
-		old_timeout = self.s.timeout
-		self.s.timeout = 0.5 # This function might take some extra time on the pico side (wait for vcore to reach setpoint)
 		ret: bool = False
 
 		if not issubclass(type(self.tc) , Target):
 			raise ValueError('Set target type before trying to ping it')
 
-		for _ in range(n):
+		timeouts = self.timeouts
+		start = time.perf_counter()
+		for i in range(n):
 			self.s.reset_input_buffer()
 			self.s.write(P_CMD_TARGET_PING if not self.tc.is_slow else P_CMD_TARGET_PING_SLOW)
-			res = self.s.read(1)
+			# This might take some extra time on the pico side (wait for vcore to reach setpoint)
+			res = self._expect(timeouts.target_ping)
 			if int.from_bytes(res, 'little'):
 				ret = True
+				if i:
+					timeouts.boot.observe(time.perf_counter() - start) # Only learn from targets that were booting
 				break
 			time.sleep(delay)
 
-		self.s.timeout = old_timeout
 		return ret
 
 	def measure_loop_duration(self) -> int:
@@ -525,16 +1023,16 @@ class Picocoder:
 		Asks the picocoder to measure the length (in us) of opcode loop, aka the time between two
 		consecutive trigger signals.
 		'''
-		old_timeout = self.s.timeout	# This function might take a lot of time on the pico side,
-										# as it waits for the target to perform some iterations of the loop
-		self.s.timeout = 2
 		self.s.reset_input_buffer()
 		self.s.write(P_CMD_MEASURE_LOOP_DURATION)
-		data = self.s.read(4)
-		self.s.timeout = old_timeout
-		if not data:
+		# This might take a lot of time on the pico side, as it waits for the target to perform
+		# some iterations of the loop
+		data = self._expect(self.timeouts.measure_loop, 4)
+		if len(data) < 4:
 			raise ConnectionError('Did not get any data from picocoder after P_CMD_MEASURE_LOOP_DURATION')
-		return struct.unpack('<i', data)[0]
+		loop_duration = struct.unpack('<i', data)[0]
+		self.timeouts.set_loop_duration(loop_duration)
+		return loop_duration
 
 	def uart_toggle_debug_pin(self) -> None:
 		'''
@@ -543,7 +1041,7 @@ class Picocoder:
 		'''
 		self.s.reset_input_buffer()
 		self.s.write(P_CMD_UART_TOGGLE_DEBUG_PIN)
-		data = self.s.read(1)
+		data = self._expect(self.timeouts.command)
 		if not data:
 			raise ConnectionError('Could not toggle debug pin: no response')
 		if not bool(data):
@@ -562,68 +1060,102 @@ class Picocoder:
 			be it:
 				- TODO
 		'''
-		if not self._connected:
-			ping = self.ping()
-			if not ping:
-				raise ConnectionError('Could not connect to picocoder')
-			self._connected = ping
+		self._connect()
 
-		self._apply_settings(glitch_setting)
-
-		self.s.reset_input_buffer() # Clear any pending data, just in case
-		self.s.write(P_CMD_ARM)
 		if self.tc.ret_count > 255:
 			raise ValueError('Too many return values')
-		self.s.write(self.tc.ret_count.to_bytes(1, 'little'))
 
-		data = self.s.read(1)
+		if self.fast_arm:
+			self._arm_with_settings(glitch_setting)
+		else:
+			self._apply_settings(glitch_setting)
+			self.s.reset_input_buffer() # Clear any pending data, just in case
+			self.s.write(P_CMD_ARM)
+			self.s.write(self.tc.ret_count.to_bytes(1, 'little'))
+		if self.timer is not None:
+			self.timer.lap('setup')
+
+		data = self._expect(self.timeouts.glitch)
+		if self.timer is not None:
+			self.timer.lap('glitch')
 		if not data:
 			raise ConnectionError('Could not connect to picocoder')
+		if data == P_CMD_RETURN_KO:
+			# Only P_CMD_ARM_SETTINGS can refuse the settings, the result codes are in a different range
+			self.clear() # The glitcher did not apply any of the settings we cached
+			reason = self._readline()
+			raise ValueError(f'Could not apply settings. Received: 0x{data.hex()}: {reason.decode("utf-8", errors="replace")}')
+
+		if data == P_CMD_RESULT_ANSI_CTRL_CODE:
+			payload = self._read_chunks()
+		else:
+			size = result_payload_len(self.tc, data)
+			payload = self._rx[:self._read_into(self._rx[:size])] if size else b''
+		ret = decode_result(self.tc, data, payload)
+		if self.timer is not None:
+			self.timer.lap('readback')
+		return ret
+
+	def glitch_batch(self, settings: Sequence[GlitchSettings]) -> list[tuple[GlitchResult, tuple|bytes|None]]:
+		'''
+		Upload a block of settings to the glitcher, which runs them back to back and streams back
+		one fixed-size record per attempt.
+
+		The glitcher stops early after a result that requires the target to be power cycled
+		(reset, unreachable, PMIC failure or crash info), so the returned list can be shorter
+		than `settings`. The i-th result always belongs to `settings[i]`.
+
+		Args:
+			settings: Settings for each attempt, at most :py:attr:`~GLITCH_BATCH_MAX`
 
-		if data == P_CMD_RESULT_UNREACHABLE:
-			# No trigger received
-			return GlitchResult.BROKEN, data
-		elif data == P_CMD_RESULT_PMIC_FAIL:
-			# Could not send command to PMIC
-			return GlitchResult.BROKEN, data
-		elif data == P_CMD_RESULT_RESET:
-			# Target died during the glitch
-			return GlitchResult.RESET, None
-		elif data == P_CMD_RESULT_ALIVE:
-			# Target is alive
-			retlist = []
-			for retval in self.tc.ret_vars:
-				data = self.s.read(4)
-				if not data:
-					raise ConnectionError(f'Did not receive expected value {retval} from picocoder after P_CMD_RESULT_ALIVE')
-				retlist.append(struct.unpack('<I', data)[0])
-			ret = tuple(retlist)
-			if self.tc.is_success(ret):
-				return GlitchResult.SUCCESS, ret
+		Returns:
+			Same as :py:meth:`~glitch`, for each performed attempt
+		'''
+		self._connect()
+
+		if self.tc.ret_count > 255:
+			raise ValueError('Too many return values')
+		if self.version() < 1:
+			raise ValueError('The glitcher firmware cannot run batches (P_CMD_ARM_BATCH), update it')
+		if len(settings) > GLITCH_BATCH_MAX:
+			raise ValueError(f'Too many settings in a batch: {len(settings)} > {GLITCH_BATCH_MAX}')
+		if not settings:
+			return []
+
+		frame = bytearray(ARM_BATCH_HEADER.pack(P_CMD_ARM_BATCH[0], len(settings), self.tc.ret_count))
+		for gs in settings:
+			frame += ARM_BATCH_ENTRY.pack(gs['ext_offset'], gs['width'], gs['voltage'], gs['prep_voltage'])
+		self.s.reset_input_buffer() # Clear any pending data, just in case
+		self.s.write(frame)
+
+		record_size = BATCH_RECORD_HEADER.size + self.tc.ret_struct.size
+		record = self._rx[:record_size]
+		results: list[tuple[GlitchResult, tuple|bytes|None]] = []
+		for i in range(len(settings)):
+			received = self._expect_into(self.timeouts.glitch, record)
+			if not received:
+				raise ConnectionError('Could not connect to picocoder')
+			if i == 0 and record[0] == P_CMD_RETURN_KO[0]:
+				# The first record starts with index 0, it cannot be mistaken for P_CMD_RETURN_KO
+				reason = bytes(record[1:received]) + self._readline()
+				raise ValueError(f'Could not run batch. Received: 0x{P_CMD_RETURN_KO.hex()}: {reason.decode("utf-8", errors="replace")}')
+			if received < record_size:
+				raise ConnectionError(f'Truncated record {i} from picocoder after P_CMD_ARM_BATCH')
+			index, code, extra = BATCH_RECORD_HEADER.unpack_from(record)
+			if index != i:
+				raise ConnectionError(f'Unexpected record {index} from picocoder after P_CMD_ARM_BATCH, expected {i}')
+			data = code.to_bytes(1, 'little')
+			if data == P_CMD_RESULT_ALIVE:
+				payload = record[BATCH_RECORD_HEADER.size:]
+			elif data == P_CMD_RESULT_ZOMBIE:
+				payload = extra.to_bytes(1, 'little')
+			elif data == P_CMD_RESULT_ANSI_CTRL_CODE:
+				payload = self._read_chunks()
 			else:
-				return GlitchResult.NORMAL, ret
-		elif data == P_CMD_RESULT_DATA_TIMEOUT:
-			# Target is alive, but it did not send (all) expected data back after glitch
-			return GlitchResult.WEIRD, None
-		elif data == P_CMD_RESULT_ZOMBIE:
-			# Target sent some other unexpected data
-			unexpected_data = self.s.read(1)
-			if not unexpected_data:
-				raise ConnectionError('Did not receive unexpected data from picocoder after P_CMD_RESULT_ZOMBIE')
-			return GlitchResult.WEIRD, unexpected_data
-		elif data == P_CMD_RESULT_ANSI_CTRL_CODE:
-			ret_data = b''
-			# Target sent an ANSI control code, data will follow
-			# Set shorter timeout and read one byte at a time
-			time.sleep(2) # HACK Wait for pico to retrieve data from target
-			timeout_old = self.s.timeout
-			self.s.timeout = 0.2
-			while True:
-				read_data = self.s.read(1)
-				if not read_data:
-					break
-				ret_data += read_data
-			self.s.timeout = timeout_old
-			return GlitchResult.WEIRD, ret_data
-		else:
-			return GlitchResult.WEIRD, data
+				payload = b''
+			results.append(decode_result(self.tc, data, payload))
+			if data in BATCH_STOP_RESULTS:
+				break
+		# The glitcher keeps the settings of the last attempt
+		self._cache_settings(settings[len(results) - 1])
+		return results
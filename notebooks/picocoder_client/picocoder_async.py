@@ -0,0 +1,352 @@
+'''
+asyncio-native interface with the firmware running on the glitcher.
+
+Requires pyserial-asyncio. This module is not imported by the package `__init__`,
+import it explicitly: `from picocoder_client.picocoder_async import AsyncPicocoder`
+'''
+
+import asyncio
+import struct
+import time
+
+import serial_asyncio
+
+from . import Target, TargetType
+from .picocoder import (
+	GlitchResult, GlitchSettings, decode_result, result_payload_len, ANSI_CHUNK_HEADER, ARM_SETTINGS_FRAME, STATE_FRAME, STATE_PARAMS,
+	P_CMD_ARM, P_CMD_ARM_SETTINGS, P_CMD_GET_STATE, P_CMD_SET_EXT_OFFST, P_CMD_SET_WIDTH, P_CMD_SET_VOLTAGE, P_CMD_SET_PREP_VOLTAGE,
+	P_CMD_PING, P_CMD_TARGET_PING, P_CMD_TARGET_PING_SLOW, P_CMD_MEASURE_LOOP_DURATION, P_CMD_VERSION,
+	P_CMD_RESULT_ANSI_CTRL_CODE, P_CMD_RETURN_OK, P_CMD_RETURN_KO, P_CMD_PONG, S_NAK, PROTOCOL_VERSION,
+)
+from .timeouts import AdaptiveTimeout, TimeoutPolicy
+
+class _SerialBuffer(asyncio.Protocol):
+	'''
+	Accumulates everything received from the glitcher, readers wait on :py:attr:`~changed`
+	'''
+	def __init__(self):
+		self.buf = bytearray()
+		self.changed = asyncio.Event()
+		self.transport: serial_asyncio.SerialTransport = None # type: ignore
+		self.lost: Exception|None = None
+
+	def connection_made(self, transport):
+		self.transport = transport
+
+	def data_received(self, data: bytes):
+		self.buf += data
+		self.changed.set()
+
+	def connection_lost(self, exc):
+		self.lost = exc if exc is not None else ConnectionError('Glitcher serial port closed')
+		self.changed.set()
+
+class AsyncPicocoder:
+	'''
+	asyncio interface with firmware running on the glitcher.
+	Same command set and result decoding as :py:class:`~Picocoder`, but every command that waits
+	for the glitcher is a coroutine, so the event loop keeps running while the target is glitched.
+
+	Create instances with :py:meth:`~open`.
+	'''
+
+	tc: TargetType = Target()
+
+	# Protocol version of the firmware, see version()
+	protocol: int|None = None
+
+	# Ship all settings and arm with a single P_CMD_ARM_SETTINGS frame (see Picocoder.fast_arm)
+	fast_arm: bool|None = None
+
+	def __init__(self, protocol: _SerialBuffer, timeout: float = 1.0):
+		self._p = protocol
+		self.timeout = timeout
+		self._connected = False
+		self._lock = asyncio.Lock() # One command in flight at a time
+		self._timeouts: dict[type, TimeoutPolicy] = {}
+		# Locally cached properties
+		self._settings: dict[str, int] = {}
+
+	@classmethod
+	async def open(cls, glitcher_port: str = '/dev/ttyACM0', baudrate: int = 115200, timeout: float = 1.0) -> 'AsyncPicocoder':
+		'''
+		Open the glitcher serial port
+
+		Args:
+			glitcher_port: The port for the glitcher device
+			baudrate: The baudrate for serial communication
+			timeout: Default timeout waiting for an answer from the glitcher (in s)
+		'''
+		loop = asyncio.get_running_loop()
+		transport, protocol = await serial_asyncio.create_serial_connection(loop, _SerialBuffer, glitcher_port, baudrate)
+		protocol.transport = transport # connection_made() is only scheduled at this point
+		return cls(protocol, timeout)
+
+	def close(self) -> None:
+		if self._p.transport is not None:
+			self._p.transport.close()
+
+	def clear(self) -> None:
+		'''
+		Clear cached properties
+		'''
+		self._settings = {}
+
+	def _reset_input_buffer(self) -> None:
+		self._p.transport.serial.reset_input_buffer()
+		self._p.buf.clear()
+
+	def _write(self, data: bytes) -> None:
+		self._p.transport.write(data)
+
+	async def _read(self, size: int = 1, timeout: float|None = None) -> bytes:
+		'''
+		Read up to `size` bytes. Like `serial.Serial.read`, returns what was received so far when
+		the timeout expires.
+		'''
+		loop = asyncio.get_running_loop()
+		deadline = loop.time() + (self.timeout if timeout is None else timeout)
+		while len(self._p.buf) < size:
+			if self._p.lost is not None:
+				raise self._p.lost
+			remaining = deadline - loop.time()
+			if remaining <= 0:
+				break
+			self._p.changed.clear()
+			try:
+				await asyncio.wait_for(self._p.changed.wait(), remaining)
+			except asyncio.TimeoutError:
+				break
+		ret = bytes(self._p.buf[:size])
+		del self._p.buf[:size]
+		return ret
+
+	@property
+	def timeouts(self) -> TimeoutPolicy:
+		'''
+		Adaptive timeouts for the current target type, see :py:attr:`~Picocoder.timeouts`
+		'''
+		policy = self._timeouts.get(type(self.tc))
+		if policy is None:
+			policy = self._timeouts[type(self.tc)] = TimeoutPolicy(self.tc.is_slow, self.timeout)
+		return policy
+
+	async def _expect(self, timeout: AdaptiveTimeout, size: int = 1) -> bytes:
+		'''
+		Read the answer to the command just sent, see :py:meth:`~Picocoder._expect`
+		'''
+		start = time.perf_counter()
+		data = await self._read(size, timeout.value)
+		if len(data) < size:
+			timeout.expired()
+			if data:
+				data += await self._read(size - len(data), max(timeout.ceiling - (time.perf_counter() - start), 0))
+		if len(data) == size:
+			timeout.observe(time.perf_counter() - start)
+		return data
+
+	async def _readline(self) -> bytes:
+		ret = b''
+		while not ret.endswith(b'\n'):
+			c = await self._read(1)
+			if not c:
+				break
+			ret += c
+		return ret
+
+	async def _read_chunks(self) -> bytes:
+		'''
+		Read the length-prefixed chunks sent after P_CMD_RESULT_ANSI_CTRL_CODE, until the empty one
+		'''
+		ret = b''
+		while True:
+			header = await self._expect(self.timeouts.chunk, ANSI_CHUNK_HEADER.size)
+			if len(header) < ANSI_CHUNK_HEADER.size:
+				raise ConnectionError('Did not receive chunk length from picocoder after P_CMD_RESULT_ANSI_CTRL_CODE')
+			(length, ) = ANSI_CHUNK_HEADER.unpack(header)
+			if not length:
+				return ret
+			chunk = await self._read(length)
+			if len(chunk) < length:
+				raise ConnectionError('Truncated chunk from picocoder after P_CMD_RESULT_ANSI_CTRL_CODE')
+			ret += chunk
+
+	async def ping(self) -> bool:
+		'''
+		Ping picocoder
+		'''
+		async with self._lock:
+			self._reset_input_buffer()
+			self._write(P_CMD_PING)
+			return await self._expect(self.timeouts.command) == P_CMD_PONG
+
+	async def version(self) -> int:
+		'''
+		Protocol version of the glitcher firmware, see :py:meth:`~Picocoder.version`
+		'''
+		if self.protocol is not None:
+			return self.protocol
+		async with self._lock:
+			self._reset_input_buffer()
+			self._write(P_CMD_VERSION)
+			ret = await self._expect(self.timeouts.command)
+			if not ret:
+				raise ConnectionError('Could not read firmware version: no response')
+			if ret == S_NAK:
+				self.protocol = 0
+			elif ret == P_CMD_RETURN_OK:
+				data = await self._expect(self.timeouts.command)
+				if not data:
+					raise ConnectionError('Truncated firmware version from picocoder after P_CMD_VERSION')
+				self.protocol = data[0]
+			else:
+				raise ValueError(f'Could not read firmware version. Received: 0x{ret.hex()}')
+		return self.protocol
+
+	async def _connect(self) -> None:
+		'''
+		Ping the glitcher before the first glitch and pick :py:attr:`~fast_arm`, see :py:meth:`~Picocoder._connect`
+		'''
+		if self._connected:
+			return
+		if not await self.ping():
+			raise ConnectionError('Could not connect to picocoder')
+		protocol = await self.version()
+		if self.fast_arm is None:
+			self.fast_arm = protocol >= 1
+			if not self.fast_arm:
+				print(f'Glitcher firmware with protocol version {protocol} < {PROTOCOL_VERSION}: sending the settings one by one')
+		elif self.fast_arm and protocol < 1:
+			raise ValueError('The glitcher firmware cannot arm with a single frame (P_CMD_ARM_SETTINGS), update it or disable fast_arm')
+		self._connected = True
+
+	async def ping_target(self, n = 15, delay = 0.1) -> bool:
+		'''
+		Ping target from picocoder, see :py:meth:`~Picocoder.ping_target`
+
+		Args:
+			n: number of attempts to ping the target
+			delay: delay between attempts
+		'''
+		if not issubclass(type(self.tc) , Target):
+			raise ValueError('Set target type before trying to ping it')
+
+		timeouts = self.timeouts
+		start = time.perf_counter()
+		for i in range(n):
+			async with self._lock:
+				self._reset_input_buffer()
+				self._write(P_CMD_TARGET_PING if not self.tc.is_slow else P_CMD_TARGET_PING_SLOW)
+				# The glitcher might take some extra time (wait for vcore to reach setpoint)
+				res = await self._expect(timeouts.target_ping)
+			if int.from_bytes(res, 'little'):
+				if i:
+					timeouts.boot.observe(time.perf_counter() - start) # Only learn from targets that were booting
+				return True
+			await asyncio.sleep(delay)
+		return False
+
+	async def measure_loop_duration(self) -> int:
+		'''
+		Asks the picocoder to measure the length (in us) of opcode loop, aka the time between two
+		consecutive trigger signals.
+		'''
+		async with self._lock:
+			self._reset_input_buffer()
+			self._write(P_CMD_MEASURE_LOOP_DURATION)
+			# The glitcher waits for the target to perform some iterations of the loop
+			data = await self._expect(self.timeouts.measure_loop, 4)
+		if len(data) < 4:
+			raise ConnectionError('Did not get any data from picocoder after P_CMD_MEASURE_LOOP_DURATION')
+		loop_duration = struct.unpack('<i', data)[0]
+		self.timeouts.set_loop_duration(loop_duration)
+		return loop_duration
+
+	async def _read_state(self) -> GlitchSettings:
+		self._reset_input_buffer()
+		self._write(P_CMD_GET_STATE)
+		ret = await self._expect(self.timeouts.command)
+		if not ret:
+			raise ConnectionError('Could not read state: no response')
+		if ret != P_CMD_RETURN_OK:
+			raise ValueError(f'Could not read state. Received: 0x{ret.hex()}')
+		data = await self._read(STATE_FRAME.size)
+		if len(data) < STATE_FRAME.size:
+			raise ConnectionError('Truncated state from picocoder after P_CMD_GET_STATE')
+		state: GlitchSettings = dict(zip(STATE_PARAMS, STATE_FRAME.unpack(data))) # type: ignore
+		self._settings = dict(state)
+		return state
+
+	async def read_state(self) -> GlitchSettings:
+		'''
+		Read back all glitch parameters from the glitcher and seed the local cache, see
+		:py:meth:`~Picocoder.read_state`
+		'''
+		if await self.version() < 1:
+			raise NotImplementedError('The glitcher firmware cannot read back its settings (P_CMD_GET_STATE), update it')
+		async with self._lock:
+			return await self._read_state()
+
+	async def _set(self, param: str, cmd: bytes, fmt: str, value: int) -> None:
+		if self._settings.get(param) == value:
+			return
+		self._reset_input_buffer()
+		self._write(cmd + struct.pack(fmt, value))
+		ret = await self._expect(self.timeouts.command)
+		if not ret:
+			raise ConnectionError(f'Could not set {param}: no response')
+		if ret != P_CMD_RETURN_OK:
+			self._settings.pop(param, None)
+			reason = await self._readline() if ret == P_CMD_RETURN_KO else b''
+			raise ValueError(f'Could not set {param}. Received: 0x{ret.hex()}: {reason.decode("utf-8", errors="replace")}')
+		self._settings[param] = value
+
+	async def _apply_settings(self, glitch_setting: GlitchSettings) -> None:
+		if any(param not in self._settings for param in STATE_PARAMS) and self.protocol:
+			await self._read_state() # Seed the cache, only changed parameters are sent below
+		await self._set('ext_offset', P_CMD_SET_EXT_OFFST, '<I', glitch_setting['ext_offset'])
+		await self._set('width', P_CMD_SET_WIDTH, '<I', glitch_setting['width'])
+		await self._set('voltage', P_CMD_SET_VOLTAGE, '<B', glitch_setting['voltage'])
+		await self._set('prep_voltage', P_CMD_SET_PREP_VOLTAGE, '<B', glitch_setting['prep_voltage'])
+
+	async def glitch(self, glitch_setting: GlitchSettings) -> tuple[GlitchResult, tuple|bytes|None]:
+		'''
+		Perform a glitch with the given settings, see :py:meth:`~Picocoder.glitch`
+
+		Args:
+			glitch_setting: Settings for this attempt
+		'''
+		await self._connect()
+
+		if self.tc.ret_count > 255:
+			raise ValueError('Too many return values')
+
+		async with self._lock:
+			if self.fast_arm:
+				self._reset_input_buffer() # Clear any pending data, just in case
+				self._write(ARM_SETTINGS_FRAME.pack(
+					P_CMD_ARM_SETTINGS[0],
+					glitch_setting['ext_offset'],
+					glitch_setting['width'],
+					glitch_setting['voltage'],
+					glitch_setting['prep_voltage'],
+					self.tc.ret_count))
+				self._settings = dict(glitch_setting)
+			else:
+				await self._apply_settings(glitch_setting)
+				self._reset_input_buffer()
+				self._write(P_CMD_ARM + self.tc.ret_count.to_bytes(1, 'little'))
+
+			data = await self._expect(self.timeouts.glitch)
+			if not data:
+				raise ConnectionError('Could not connect to picocoder')
+			if data == P_CMD_RETURN_KO:
+				self.clear() # The glitcher did not apply any of the settings we cached
+				reason = await self._readline()
+				raise ValueError(f'Could not apply settings. Received: 0x{data.hex()}: {reason.decode("utf-8", errors="replace")}')
+
+			if data == P_CMD_RESULT_ANSI_CTRL_CODE:
+				payload = await self._read_chunks()
+			else:
+				payload = await self._read(result_payload_len(self.tc, data))
+		return decode_result(self.tc, data, payload)
@@ -0,0 +1,177 @@
+'''
+Live plot of the results of a glitch campaign.
+'''
+
+import time
+
+import matplotlib.axes
+import matplotlib.backend_bases
+import matplotlib.figure
+import matplotlib.lines
+import matplotlib.pyplot as plt
+from matplotlib.ticker import MaxNLocator
+import numpy as np
+
+from .results import ResultStore
+
+class LivePlot:
+	'''
+	Scatter plot of two glitch parameters that follows a :py:class:`~ResultStore`. There is one
+	markers-only artist per result class, every refresh appends the rows added to the store since
+	the previous one to the points of their class, and only these artists are redrawn over a cached
+	background (blitting). The axes and the background are only redrawn when the new points fall
+	outside the current limits.
+
+	Refreshes happen at most `max_fps` times per second, from :py:meth:`~update`, which drops the
+	calls that come too early. The acquisition loop usually keeps the kernel busy, so a timer of
+	the figure canvas (e.g. ipympl, Qt) cannot fire meanwhile: it only draws the results left
+	over by the last dropped call once the loop is idle.
+	'''
+
+	MARGIN = 0.05 # Share of the data range added around it when the limits are extended
+
+	def __init__(self, results: ResultStore, xparam: str, yparam: str, integer_axis: bool = True,
+			max_fps: float = 5.0, max_points: int|None = 100_000):
+		'''
+		Args:
+			results: Store to plot, its classes must be matplotlib format strings (e.g. :py:class:`~GlitchResult`)
+			xparam: The parameter to use as the x-axis
+			yparam: The parameter to use as the y-axis
+			integer_axis: If True, the axis ticks will be integer-only (default: True)
+			max_fps: Maximum number of refreshes per second
+			max_points: Only the latest `max_points` results of each class are drawn (default: 100000,
+				None draws them all), bounds the memory and time of a refresh
+		'''
+		if xparam not in results.params:
+			raise ValueError(f'Parameter {xparam} not found')
+		if yparam not in results.params:
+			raise ValueError(f'Parameter {yparam} not found')
+		self.results = results
+		self.xparam = xparam
+		self.yparam = yparam
+		self.interval = 1 / max_fps
+		self.max_points = max_points
+		self.fig: matplotlib.figure.Figure
+		self.ax: matplotlib.axes.Axes
+		self.fig, self.ax = plt.subplots()
+		if integer_axis:
+			self.ax.yaxis.set_major_locator(MaxNLocator(integer=True))
+			self.ax.xaxis.set_major_locator(MaxNLocator(integer=True))
+		self.lines: list[matplotlib.lines.Line2D] = [
+			self.ax.plot([], [], str(result.value), animated=True)[0] for result in results.classes
+		]
+		self.dirty = False
+		self._last_refresh = 0.0
+		self._rows = 0 # Rows of the store already in the points
+		self._points = [np.empty((2, 0), dtype=np.int32) for _ in self.lines] # x and y of each class, with spare capacity
+		self._counts = [0] * len(self.lines) # Points of each class
+		self._background = None
+		self._scaled = False # The limits are still matplotlib's defaults
+		self._draw_cid = self.fig.canvas.mpl_connect('draw_event', self._on_draw)
+		self.timer = self.fig.canvas.new_timer(interval=int(self.interval * 1000))
+		if type(self.timer) is matplotlib.backend_bases.TimerBase:
+			self.timer = None # Non-interactive backend, its timers never fire
+		else:
+			self.timer.add_callback(self._on_timer)
+			self.timer.start()
+
+	def _on_draw(self, event) -> None:
+		self._background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+		self._draw_lines()
+
+	def _on_timer(self) -> None:
+		if self.dirty:
+			self.refresh()
+
+	def _draw_lines(self) -> None:
+		for line in self.lines:
+			self.ax.draw_artist(line)
+
+	def _append(self, code: int, x: np.ndarray, y: np.ndarray) -> None:
+		'''
+		Append points to a class. When its buffer is full, only the latest `max_points` are kept
+		and the capacity is doubled, so appending copies each point a bounded number of times.
+		'''
+		points, n = self._points[code], self._counts[code]
+		if n + len(x) > points.shape[1]:
+			keep = n if self.max_points is None else min(n, self.max_points)
+			grown = np.empty((2, max(2 * (keep + len(x)), 1024)), dtype=np.int32)
+			grown[:, :keep] = points[:, n - keep:n]
+			points = self._points[code] = grown
+			n = keep
+		points[0, n:n + len(x)] = x
+		points[1, n:n + len(x)] = y
+		self._counts[code] = n + len(x)
+
+	def _update_data(self) -> bool:
+		'''
+		Feed the results added since the last refresh to the artists, returns whether the axes
+		limits had to change
+		'''
+		if len(self.results) < self._rows: # The store was cleared
+			self._rows = 0
+			self._counts = [0] * len(self.lines)
+			self._scaled = False
+		x = self.results.column(self.xparam)[self._rows:]
+		y = self.results.column(self.yparam)[self._rows:]
+		codes = self.results.codes[self._rows:]
+		self._rows += len(codes)
+		for code in np.unique(codes):
+			rows = codes == code
+			self._append(int(code), x[rows], y[rows])
+		for code, line in enumerate(self.lines):
+			n = self._counts[code]
+			start = 0 if self.max_points is None else max(0, n - self.max_points)
+			line.set_data(self._points[code][0, start:n], self._points[code][1, start:n])
+		if not len(x):
+			return False
+		rescaled = False
+		for values, get_lim, set_lim in ((x, self.ax.get_xlim, self.ax.set_xlim), (y, self.ax.get_ylim, self.ax.set_ylim)):
+			lo, hi = int(values.min()), int(values.max())
+			cur_lo, cur_hi = get_lim() if self._scaled else (np.inf, -np.inf)
+			if lo < cur_lo or hi > cur_hi:
+				lo, hi = min(lo, cur_lo), max(hi, cur_hi)
+				margin = max(1, (hi - lo) * self.MARGIN)
+				set_lim(lo - margin, hi + margin)
+				rescaled = True
+		self._scaled = True
+		return rescaled
+
+	def refresh(self) -> None:
+		'''
+		Draw the results added since the last refresh
+		'''
+		self.dirty = False
+		self._last_refresh = time.monotonic()
+		canvas = self.fig.canvas
+		if self._update_data() or self._background is None or not canvas.supports_blit:
+			canvas.draw() # Also takes a new background, see _on_draw()
+		else:
+			canvas.restore_region(self._background)
+			self._draw_lines()
+			canvas.blit(self.fig.bbox)
+		canvas.flush_events()
+
+	def update(self) -> None:
+		'''
+		Signal new results: refresh now if the last refresh is old enough, otherwise leave them
+		to the next call or to the timer
+		'''
+		self.dirty = True
+		if time.monotonic() - self._last_refresh >= self.interval:
+			self.refresh()
+
+	def redraw(self) -> None:
+		'''
+		Full redraw of the figure with all the current results
+		'''
+		self.dirty = False
+		self._last_refresh = time.monotonic()
+		self._update_data()
+		self.fig.canvas.draw()
+
+	def close(self) -> None:
+		if self.timer is not None:
+			self.timer.stop()
+		self.fig.canvas.mpl_disconnect(self._draw_cid)
+		plt.close(self.fig)
@@ -0,0 +1,78 @@
+'''
+Models of the PMICs driven by the glitcher, used to tell which voltage drops are achievable.
+'''
+
+from dataclasses import dataclass, field
+
+import numpy as np
+
+__all__ = ['PMICModel', 'TPS65094', 'PMIC_MODELS']
+
+@dataclass(frozen=True, eq=False)
+class PMICModel:
+	'''
+	Voltage regulator whose output the glitcher sets over I2C: a VID -> millivolts lookup table,
+	the time needed to transmit a voltage command and the slew rate of the output. All methods
+	take scalars or NumPy arrays, broadcast against each other.
+	'''
+	name: str
+	vid_mv: np.ndarray = field(repr=False) # Output voltage (mV) of every VID, indexed by VID
+	transmit_time: float # Time to send a voltage command over I2C (us)
+	slew_rate: float # Output slew rate (mV/us)
+
+	def __post_init__(self):
+		table = np.array(self.vid_mv, dtype=np.int32)
+		table.flags.writeable = False
+		object.__setattr__(self, 'vid_mv', table)
+
+	@classmethod
+	def linear(cls, name: str, vids: int, offset_mv: int, step_mv: int, transmit_time: float, slew_rate: float) -> 'PMICModel':
+		'''
+		Model of a PMIC where VID 0 turns the rail off and VID n sets `offset_mv + (n - 1) * step_mv`
+
+		Args:
+			vids: Number of VIDs
+		'''
+		vid = np.arange(vids)
+		return cls(name, np.where(vid == 0, 0, offset_mv + (vid - 1) * step_mv), transmit_time, slew_rate)
+
+	def to_mv(self, vid: int|np.ndarray) -> np.ndarray:
+		'''
+		Convert VIDs to millivolts
+		'''
+		vid = np.asarray(vid)
+		if vid.size and (vid.min() < 0 or vid.max() >= len(self.vid_mv)):
+			raise ValueError(f'VID out of range for {self.name}: valid VIDs are 0 to {len(self.vid_mv) - 1}')
+		return self.vid_mv[vid]
+
+	def swing(self, time: float|np.ndarray) -> np.ndarray:
+		'''
+		Largest voltage change (mV) achievable within `time` us from the start of a voltage command
+		(the transmit time overlaps with the previous phase of the glitch)
+		'''
+		return (self.transmit_time + np.asarray(time)) * self.slew_rate
+
+	def min_reachable_mv(self, start_mv: float|np.ndarray, time: float|np.ndarray) -> np.ndarray:
+		'''
+		Lowest voltage (mV) the output can drop to from `start_mv` within `time` us
+		'''
+		return np.maximum(0, np.asarray(start_mv) - self.swing(time))
+
+	def reachable(self, start_mv: float|np.ndarray, target_mv: float|np.ndarray, time: float|np.ndarray) -> np.ndarray:
+		'''
+		Whether the output can move from `start_mv` to `target_mv` within `time` us
+		'''
+		return np.abs(np.asarray(start_mv) - np.asarray(target_mv)) < self.swing(time)
+
+	def required_time(self, start_mv: float|np.ndarray, target_mv: float|np.ndarray) -> np.ndarray:
+		'''
+		Conservative time (integer us) to move the output from `start_mv` to `target_mv`, used to
+		warn about unreachable ranges
+		'''
+		delta = np.abs(np.asarray(start_mv) - np.asarray(target_mv))
+		return np.ceil(delta / self.slew_rate - 2 * self.transmit_time).astype(np.int64)
+
+# TPS65094 on Up Squared Pentium N4200 boards: 7-bit VIDs in 10mV steps from 0.5V
+TPS65094 = PMICModel.linear('TPS65094', vids=128, offset_mv=500, step_mv=10, transmit_time=36, slew_rate=3)
+
+PMIC_MODELS: dict[str, PMICModel] = {model.name: model for model in (TPS65094,)}
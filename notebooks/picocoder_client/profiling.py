@@ -0,0 +1,188 @@
+'''
+Low-overhead per-phase latency measurements for glitch campaigns.
+'''
+
+import json
+import time
+from typing import Callable
+
+__all__ = ['LatencyHistogram', 'PhaseTimer']
+
+class LatencyHistogram:
+	'''
+	HDR-style histogram of durations in ns: values below 2**(SUB_BITS+1) ns have their own bucket,
+	larger ones share a bucket with values within 1/2**SUB_BITS of them (~3% with SUB_BITS = 5).
+	Buckets are kept sparse, recording a value is a couple of integer operations.
+	'''
+
+	SUB_BITS = 5
+
+	def __init__(self):
+		self.buckets: dict[int, int] = {}
+		self.count = 0
+		self.total = 0
+		self.min = 0
+		self.max = 0
+
+	@classmethod
+	def bucket(cls, value: int) -> int:
+		'''
+		Index of the bucket holding `value`, indexes grow with the value
+		'''
+		shift = value.bit_length() - cls.SUB_BITS - 1
+		if shift <= 0:
+			return value
+		return (shift << cls.SUB_BITS) + (value >> shift)
+
+	@classmethod
+	def bucket_bounds(cls, index: int) -> tuple[int, int]:
+		'''
+		Lowest and highest value that fall in bucket `index`
+		'''
+		if index < 1 << (cls.SUB_BITS + 1):
+			return index, index
+		shift = (index >> cls.SUB_BITS) - 1
+		mantissa = index - (shift << cls.SUB_BITS)
+		return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+	def record(self, value: int) -> None:
+		'''
+		Args:
+			value: Duration in ns
+		'''
+		index = self.bucket(value)
+		self.buckets[index] = self.buckets.get(index, 0) + 1
+		if not self.count or value < self.min:
+			self.min = value
+		if value > self.max:
+			self.max = value
+		self.count += 1
+		self.total += value
+
+	def percentile(self, p: float) -> int:
+		'''
+		Upper bound of the bucket that holds the `p`-th percentile (in ns)
+		'''
+		if not self.count:
+			return 0
+		rank = p / 100 * self.count
+		seen = 0
+		for index in sorted(self.buckets):
+			seen += self.buckets[index]
+			if seen >= rank:
+				return min(self.bucket_bounds(index)[1], self.max)
+		return self.max
+
+	def to_dict(self) -> dict:
+		'''
+		Summary in us, buckets are listed by their lowest value (in ns)
+		'''
+		return {
+			'count': self.count,
+			'total_us': self.total / 1000,
+			'mean_us': self.total / self.count / 1000 if self.count else 0,
+			'min_us': self.min / 1000,
+			'max_us': self.max / 1000,
+			'p50_us': self.percentile(50) / 1000,
+			'p90_us': self.percentile(90) / 1000,
+			'p99_us': self.percentile(99) / 1000,
+			'buckets': {self.bucket_bounds(i)[0]: n for i, n in sorted(self.buckets.items())},
+		}
+
+class PhaseTimer:
+	'''
+	Times the phases of every glitch attempt and aggregates them in one
+	:py:class:`~LatencyHistogram` per (phase, result class).
+
+	The result of an attempt is only known once it is over, so laps are buffered and assigned to
+	the result class by :py:meth:`~end`:
+
+		timer.begin()
+		...						# e.g. P_CMD_SET_* commands
+		timer.lap('setup')
+		...
+		timer.end(result.name)
+	'''
+
+	def __init__(self, path: str|None = None, interval: float = 10.0, callback: Callable[[dict], None]|None = None):
+		'''
+		Args:
+			path: JSON file the histograms are dumped to (optional)
+			interval: Minimum time between two periodic dumps (in s)
+			callback: Called with the same dictionary written to `path` on every dump, e.g. to chart it live
+		'''
+		self.path = path
+		self.interval = interval
+		self.callback = callback
+		self.histograms: dict[str, dict[str, LatencyHistogram]] = {}
+		self._laps: list[tuple[str, int]] = []
+		self._t = 0
+		self._start = time.monotonic()
+		self._last_dump = self._start
+
+	def begin(self) -> None:
+		'''
+		Start timing a new attempt
+		'''
+		self._laps.clear()
+		self._t = time.perf_counter_ns()
+
+	def lap(self, phase: str) -> None:
+		'''
+		Close `phase`: it lasted since the previous lap (or :py:meth:`~begin`)
+		'''
+		now = time.perf_counter_ns()
+		self._laps.append((phase, now - self._t))
+		self._t = now
+
+	def end(self, result: str) -> None:
+		'''
+		Record the laps of the current attempt under `result` and dump if `interval` elapsed
+		'''
+		for phase, duration in self._laps:
+			per_result = self.histograms.setdefault(phase, {})
+			if result not in per_result:
+				per_result[result] = LatencyHistogram()
+			per_result[result].record(duration)
+		self._laps.clear()
+		if (self.path or self.callback) and time.monotonic() - self._last_dump >= self.interval:
+			self.dump()
+
+	def to_dict(self) -> dict:
+		return {
+			'elapsed_s': time.monotonic() - self._start,
+			'phases': {
+				phase: {result: h.to_dict() for result, h in per_result.items()}
+				for phase, per_result in self.histograms.items()
+			},
+		}
+
+	def dump(self) -> None:
+		'''
+		Write the histograms to :py:attr:`~path` and pass them to :py:attr:`~callback`
+		'''
+		self._last_dump = time.monotonic()
+		snapshot = self.to_dict()
+		if self.path:
+			with open(self.path, 'w') as f:
+				json.dump(snapshot, f, indent=1)
+		if self.callback:
+			self.callback(snapshot)
+
+	def summary(self) -> str:
+		'''
+		One line per phase: share of the total time and mean/p99 over all result classes
+		'''
+		totals = {phase: sum(h.total for h in per_result.values()) for phase, per_result in self.histograms.items()}
+		grand_total = sum(totals.values()) or 1
+		lines = []
+		for phase, per_result in self.histograms.items():
+			merged = LatencyHistogram()
+			for h in per_result.values():
+				for index, n in h.buckets.items():
+					merged.buckets[index] = merged.buckets.get(index, 0) + n
+				merged.count += h.count
+				merged.total += h.total
+				merged.max = max(merged.max, h.max)
+			lines.append(f'{phase:<10} {100 * totals[phase] / grand_total:5.1f}%  mean {merged.total / max(merged.count, 1) / 1000:9.1f}us  p99 {merged.percentile(99) / 1000:9.1f}us')
+		return '\n'.join(lines)
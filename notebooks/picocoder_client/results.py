@@ -0,0 +1,168 @@
+'''
+Columnar storage of glitch results.
+'''
+
+from collections.abc import Sequence
+from typing import Any, Iterator
+
+import numpy as np
+
+__all__ = ['ResultStore']
+
+class ResultStore(Sequence):
+	'''
+	Glitch results kept in growable typed arrays: one int32 column per glitch parameter, a uint8
+	result code, a fixed-width uint32 matrix for the values returned by the target and a blob heap
+	with an offset table for variable-length data (e.g. crash info). Capacity doubles when full,
+	so appending does not allocate per attempt.
+
+	Columns are exposed as NumPy views of the first :py:func:`len` rows, without copies; a view
+	keeps pointing to the old arrays once the store grows, take a new one after appending.
+
+	Indexing and iterating yield `(glitch_values, result, data)` tuples, like the list this class
+	replaces in :py:class:`~GlitchController`.
+	'''
+
+	NONE, VALUES, BLOB = 0, 1, 2 # Kinds of data attached to a result
+
+	def __init__(self, params: Sequence[str], classes: Sequence[Any], capacity: int = 1024):
+		'''
+		Args:
+			params: Names of the glitch parameters
+			classes: Possible results (e.g. `list(GlitchResult)`), a result is stored as its index
+			capacity: Initial number of rows
+		'''
+		if len(classes) > 256:
+			raise ValueError(f'Too many result classes ({len(classes)}), at most 256 fit in a uint8 code')
+		self.params = list(params)
+		self.classes = list(classes)
+		self._codes = {c: i for i, c in enumerate(self.classes)}
+		self._len = 0
+		self._capacity = max(1, capacity)
+		self._params = {param: np.zeros(self._capacity, dtype=np.int32) for param in self.params}
+		self._result = np.zeros(self._capacity, dtype=np.uint8)
+		self._kind = np.zeros(self._capacity, dtype=np.uint8)
+		self._values = np.zeros((self._capacity, 0), dtype=np.uint32)
+		self._offsets = np.zeros(self._capacity + 1, dtype=np.int64) # Row i owns _blob[_offsets[i]:_offsets[i + 1]]
+		self._blob = bytearray()
+
+	def _grow(self, capacity: int) -> None:
+		def grown(array: np.ndarray, rows: int) -> np.ndarray:
+			ret = np.zeros((rows,) + array.shape[1:], dtype=array.dtype)
+			ret[:len(array)] = array
+			return ret
+		self._params = {param: grown(column, capacity) for param, column in self._params.items()}
+		self._result = grown(self._result, capacity)
+		self._kind = grown(self._kind, capacity)
+		self._values = grown(self._values, capacity)
+		self._offsets = grown(self._offsets, capacity + 1)
+		self._capacity = capacity
+
+	def add(self, glitch_values: dict[str, int], result: Any, data: tuple|bytes|None = None) -> None:
+		'''
+		Append a result
+
+		Args:
+			glitch_values: Value of every parameter
+			result: One of :py:attr:`~classes`
+			data: Values returned by the target (all results of a store must return as many), raw
+				bytes, or nothing
+		'''
+		i = self._len
+		if i == self._capacity:
+			self._grow(2 * self._capacity)
+		for param, column in self._params.items():
+			column[i] = glitch_values[param]
+		self._result[i] = self._codes[result]
+		offset = self._offsets[i]
+		if data is None:
+			self._kind[i] = self.NONE
+		elif isinstance(data, (bytes, bytearray, memoryview)):
+			self._kind[i] = self.BLOB
+			self._blob += data
+			offset += len(data)
+		else:
+			if self._values.shape[1] != len(data):
+				if i and self._values.shape[1]:
+					raise ValueError(f'Expected {self._values.shape[1]} values from the target, got {len(data)}')
+				self._values = np.zeros((self._capacity, len(data)), dtype=np.uint32)
+			self._kind[i] = self.VALUES
+			self._values[i] = data
+		self._offsets[i + 1] = offset
+		self._len = i + 1
+
+	def append(self, item: tuple[dict[str, int], Any, tuple|bytes|None]) -> None:
+		'''
+		List-style :py:meth:`~add` of a `(glitch_values, result, data)` tuple
+		'''
+		self.add(*item)
+
+	def clear(self) -> None:
+		self._len = 0
+		self._blob.clear()
+
+	def column(self, param: str) -> np.ndarray:
+		'''
+		Values of a glitch parameter (int32 view)
+		'''
+		return self._params[param][:self._len]
+
+	@property
+	def codes(self) -> np.ndarray:
+		'''
+		Result of every row, as an index in :py:attr:`~classes` (uint8 view)
+		'''
+		return self._result[:self._len]
+
+	@property
+	def values(self) -> np.ndarray:
+		'''
+		Values returned by the target (uint32 view, one row per result, only meaningful where
+		:py:attr:`~kinds` is :py:attr:`~VALUES`)
+		'''
+		return self._values[:self._len]
+
+	@property
+	def kinds(self) -> np.ndarray:
+		'''
+		Kind of data attached to every row: :py:attr:`~NONE`, :py:attr:`~VALUES` or :py:attr:`~BLOB` (uint8 view)
+		'''
+		return self._kind[:self._len]
+
+	def mask(self, result: Any) -> np.ndarray:
+		'''
+		Rows with the given result
+		'''
+		return self.codes == self._codes[result]
+
+	def blob(self, index: int) -> bytes:
+		'''
+		Raw data attached to a row
+		'''
+		return bytes(self._blob[self._offsets[index]:self._offsets[index + 1]])
+
+	def _row(self, i: int) -> tuple[dict[str, int], Any, tuple|bytes|None]:
+		glitch_values = {param: int(column[i]) for param, column in self._params.items()}
+		kind = self._kind[i]
+		if kind == self.VALUES:
+			data = tuple(int(v) for v in self._values[i])
+		elif kind == self.BLOB:
+			data = self.blob(i)
+		else:
+			data = None
+		return glitch_values, self.classes[self._result[i]], data
+
+	def __len__(self) -> int:
+		return self._len
+
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			return [self._row(i) for i in range(*index.indices(self._len))]
+		if index < 0:
+			index += self._len
+		if not 0 <= index < self._len:
+			raise IndexError('Result index out of range')
+		return self._row(index)
+
+	def __iter__(self) -> Iterator[tuple[dict[str, int], Any, tuple|bytes|None]]:
+		return (self._row(i) for i in range(self._len))
@@ -0,0 +1,870 @@
+'''
+Samplers of the glitch parameter lattice and their orderings.
+'''
+
+from itertools import islice
+import math
+import random
+from typing import Callable, Iterator, Sequence, TypeVar
+
+import numpy as np
+
+class FeistelPermutation:
+	'''
+	Pseudo-random bijection of [0, size), computed on the fly in O(1) memory: a balanced Feistel
+	network permutes the smallest even power of two >= size, and cycle walking maps the result back
+	into [0, size) (on average less than 4 rounds of the network per value).
+	'''
+
+	ROUNDS = 4
+	_MIX = 0x9E3779B97F4A7C15 # 2**64 / golden ratio
+
+	def __init__(self, size: int, seed: int|None = None):
+		'''
+		Args:
+			size: Number of elements to permute
+			seed: The same seed always yields the same permutation (default: random)
+		'''
+		if size < 1:
+			raise ValueError(f'Invalid permutation size {size}')
+		self.size = size
+		self.half_bits = max(1, ((size - 1).bit_length() + 1) // 2)
+		self.mask = (1 << self.half_bits) - 1
+		rng = random.Random(seed)
+		self.keys = [rng.getrandbits(64) for _ in range(self.ROUNDS)]
+
+	def _round(self, value: int, key: int) -> int:
+		value = ((value ^ key) * self._MIX) & 0xFFFFFFFFFFFFFFFF
+		value ^= value >> 29
+		return value & self.mask
+
+	def _encrypt(self, value: int) -> int:
+		left, right = value >> self.half_bits, value & self.mask
+		for key in self.keys:
+			left, right = right, left ^ self._round(right, key)
+		return (left << self.half_bits) | right
+
+	def __getitem__(self, index: int) -> int:
+		'''
+		Value at position `index` of the permutation
+		'''
+		if not 0 <= index < self.size:
+			raise IndexError(f'Index {index} out of range [0, {self.size})')
+		value = self._encrypt(index)
+		while value >= self.size:
+			value = self._encrypt(value)
+		return value
+
+	def __len__(self) -> int:
+		return self.size
+
+	def __iter__(self) -> Iterator[int]:
+		return (self[i] for i in range(self.size))
+
+class SnakeOrder:
+	'''
+	Boustrophedon walk of a lattice: the fastest axis is swept back and forth, and every slower
+	axis reverses its direction whenever the axes above it move. This is the reflected mixed-radix
+	Gray code of the lattice, so consecutive points differ in exactly one coordinate, by one step.
+	Points are computed on the fly, in chunks, in O(1) memory.
+	'''
+
+	def __init__(self, shape: Sequence[int], order: Sequence[int]|None = None):
+		'''
+		Args:
+			shape: Number of points along every axis
+			order: Axes from the slowest to the fastest changing (default: the last axis changes fastest)
+		'''
+		self.shape = tuple(shape)
+		self.order = tuple(order) if order is not None else tuple(range(len(self.shape)))
+		if sorted(self.order) != list(range(len(self.shape))):
+			raise ValueError(f'Invalid axes order {self.order} for a lattice with {len(self.shape)} axes')
+		self.size = int(np.prod(self.shape))
+		# Number of positions spent on every value of an axis, in walk order
+		self._blocks = [int(np.prod([self.shape[a] for a in self.order[j + 1:]])) for j in range(len(self.order))]
+
+	def points(self, start: int, stop: int) -> np.ndarray:
+		'''
+		Lattice indexes of the positions [start, stop) of the walk, one row per position and one
+		column per axis (in lattice order, not walk order)
+		'''
+		positions = np.arange(start, min(stop, self.size), dtype=np.int64)
+		ret = np.empty((len(positions), len(self.shape)), dtype=np.int64)
+		for axis, block in zip(self.order, self._blocks):
+			n = self.shape[axis]
+			prefix, digit = np.divmod(positions // block, n)
+			ret[:, axis] = np.where(prefix & 1, n - 1 - digit, digit) # Reflected when the slower axes moved an odd number of times
+		return ret
+
+	def __getitem__(self, index: int) -> int:
+		'''
+		Flat index (in the C order of the lattice) of the point at position `index` of the walk
+		'''
+		if not 0 <= index < self.size:
+			raise IndexError(f'Index {index} out of range [0, {self.size})')
+		return int(np.ravel_multi_index(tuple(self.points(index, index + 1)[0]), self.shape))
+
+	def __len__(self) -> int:
+		return self.size
+
+def changed_coordinates(points: np.ndarray, previous: np.ndarray|None = None) -> int:
+	'''
+	Number of coordinates that change along a sequence of points, e.g. the setter round-trips
+	needed to walk them when unchanged settings are not sent again
+
+	Args:
+		points: One row per point
+		previous: Point before the first one, if any (otherwise the first point counts as unchanged)
+	'''
+	if previous is not None:
+		points = np.vstack((previous, points))
+	return int(np.count_nonzero(np.diff(points, axis=0)))
+
+def unravel(index: int, axes: Sequence[range]) -> list[int]:
+	'''
+	Lattice point at position `index` of the flattened lattice (the last axis changes fastest)
+
+	Args:
+		index: Flattened index, in [0, product of the axes lengths)
+		axes: Values of every parameter
+	'''
+	ret = [0] * len(axes)
+	for i in range(len(axes) - 1, -1, -1):
+		index, rem = divmod(index, len(axes[i]))
+		ret[i] = axes[i][rem]
+	return ret
+
+T = TypeVar('T')
+
+def block_any(mask: np.ndarray, sizes: Sequence[int]) -> np.ndarray:
+	'''
+	Whether each cell of a grid over `mask` holds at least one True point
+
+	Args:
+		mask: Boolean array over the lattice
+		sizes: Lattice points per cell along every axis, the last cells may be smaller
+	'''
+	shape = [-(-n // c) for n, c in zip(mask.shape, sizes)]
+	padded = np.zeros([n * c for n, c in zip(shape, sizes)], dtype=bool)
+	padded[tuple(slice(0, n) for n in mask.shape)] = mask
+	blocks = padded.reshape([x for n, c in zip(shape, sizes) for x in (n, c)])
+	return blocks.any(axis=tuple(range(1, 2 * len(shape), 2)))
+
+def halves(bounds: Sequence[tuple[int, int]]) -> list[tuple[int, list[tuple[int, int]]]]:
+	'''
+	Sub-boxes of a box of the lattice halved along every axis longer than one point
+
+	Args:
+		bounds: [lo, hi) index interval on every axis
+
+	Returns:
+		(bits, bounds) of every sub-box, bit `i` of `bits` is set for the upper half of axis `i`
+	'''
+	children: list[tuple[int, list[tuple[int, int]]]] = [(0, [])]
+	for axis, (lo, hi) in enumerate(bounds):
+		if hi - lo > 1:
+			mid = (lo + hi) // 2
+			children = [(bits | half << axis, box + [part]) for bits, box in children for half, part in enumerate(((lo, mid), (mid, hi)))]
+		else:
+			children = [(bits, box + [(lo, hi)]) for bits, box in children]
+	return children
+
+def random_round_trips(mask: np.ndarray) -> float:
+	'''
+	Expected number of coordinates that change between two points drawn uniformly among the True
+	points of `mask`, e.g. the setter round-trips per attempt of :py:class:`~RandomSampler`
+	'''
+	total = np.count_nonzero(mask)
+	ret = 0.0
+	for axis in range(mask.ndim):
+		p = mask.sum(axis=tuple(a for a in range(mask.ndim) if a != axis)) / total
+		ret += 1 - float(np.sum(p ** 2))
+	return ret
+
+class Lattice:
+	'''
+	Glitch settings space seen by the samplers: the values of every parameter and which of their
+	combinations can be achieved, as a mask over the whole lattice or point by point
+	'''
+
+	def __init__(self, names: Sequence[str], axes: Sequence[range], mask: Callable[[], np.ndarray], check: Callable[[list[int]], bool]):
+		'''
+		Args:
+			names: Name of every parameter
+			axes: Values of every parameter
+			mask: Computes :py:attr:`~mask`, only called on first use
+			check: Whether a point, as values of every parameter, can be achieved
+		'''
+		self.names = list(names)
+		self.axes = list(axes)
+		self.shape = tuple(len(axis) for axis in self.axes)
+		self.size = math.prod(self.shape)
+		self.check = check
+		self._compute_mask = mask
+		self._mask: np.ndarray|None = None
+
+	@property
+	def mask(self) -> np.ndarray:
+		'''
+		Boolean array of shape :py:attr:`~shape`, True where the point can be achieved
+		'''
+		if self._mask is None:
+			self._mask = self._compute_mask()
+		return self._mask
+
+	def index(self, values: Sequence[int]) -> tuple[int, ...]|None:
+		'''
+		Indexes of a point along every axis, None if it is not on the lattice
+		'''
+		point = []
+		for axis, value in zip(self.axes, values):
+			i, rem = divmod(value - axis.start, axis.step)
+			if rem or not 0 <= i < len(axis):
+				return None
+			point.append(i)
+		return tuple(point)
+
+	def values(self, point: Sequence[int]) -> list[int]:
+		'''
+		Values of every parameter of the point at these indexes
+		'''
+		return [axis[i] for axis, i in zip(self.axes, point)]
+
+	def cells(self, sizes: dict[str, int]|None, count: int) -> list[int]:
+		'''
+		Lattice points per cell of a grid along every axis
+
+		Args:
+			sizes: Lattice points per cell for some parameters
+			count: Number of cells along the axes of the other parameters
+		'''
+		sizes = sizes or {}
+		return [sizes.get(name, -(-len(axis) // count)) for name, axis in zip(self.names, self.axes)]
+
+class Sampler:
+	'''
+	Source of the points of a :py:class:`~Lattice` to attempt. The results of the previous runs of
+	a campaign are fed with :py:meth:`~replay` before the first draw from :py:meth:`~points`, the
+	results of the points it hands out with :py:meth:`~update`. :py:meth:`~checkpoint` returns the
+	state that :py:meth:`~resume` restores, after the replay, in a sampler built with the same
+	lattice, seed and options.
+	'''
+
+	HIT, RESET, OTHER = 0, 1, 2 # Outcome classes of an attempt: (half) success, target reset, anything else
+
+	def __init__(self, lattice: Lattice, seed: int|None = None):
+		'''
+		Args:
+			lattice: Points to sample
+			seed: Seed of the sampler
+		'''
+		self.lattice = lattice
+		self.axes = lattice.axes
+		self.seed = seed
+
+	def points(self) -> Iterator[list[int]]:
+		'''
+		Points to attempt, as values of every parameter
+		'''
+		raise NotImplementedError('Use a specific sampler')
+
+	def replay(self, values: Sequence[int], outcome: int) -> None:
+		'''
+		Report the outcome of an attempt of a previous run, as if this sampler had handed it out
+		'''
+
+	def update(self, values: Sequence[int], outcome: int, cost: float|None = None) -> None:
+		'''
+		Report the outcome of an attempt
+
+		Args:
+			values: Values of every parameter, as returned by :py:meth:`~points`
+			outcome: :py:attr:`~HIT`, :py:attr:`~RESET` or :py:attr:`~OTHER`
+			cost: Time spent on the attempt, including the recovery it caused (s), None if it was
+				not measured
+		'''
+
+	def checkpoint(self) -> dict:
+		'''
+		State to restore with :py:meth:`~resume`, JSON serializable. The statistics learned from
+		the results are not included, :py:meth:`~replay` rebuilds them.
+		'''
+		return {}
+
+	def resume(self, state: dict) -> None:
+		'''
+		Restore a state saved with :py:meth:`~checkpoint`, after the replay
+		'''
+
+class RandomSampler(Sampler):
+	'''
+	Uniformly random feasible points, forever (repetitions are possible)
+	'''
+
+	def __init__(self, lattice: Lattice, seed: int|None = None):
+		super().__init__(lattice, seed)
+		self.rng = random.Random(seed)
+
+	def points(self) -> Iterator[list[int]]:
+		mask = self.lattice.mask
+		while True:
+			point = tuple(self.rng.randrange(n) for n in self.lattice.shape)
+			if mask[point]:
+				yield self.lattice.values(point)
+
+	def checkpoint(self) -> dict:
+		return {'rng': self.rng.getstate()}
+
+	def resume(self, state: dict) -> None:
+		if 'rng' in state:
+			version, internal, gauss = state['rng']
+			self.rng.setstate((version, tuple(internal), gauss))
+
+class _Walk(Sampler):
+	'''
+	Every feasible point of the lattice exactly once, in the order of :py:meth:`~_walk`, then
+	stops. Replayed points are skipped and the walk resumes from the first position handed out
+	without a result.
+	'''
+
+	def __init__(self, lattice: Lattice, seed: int|None = None):
+		super().__init__(lattice, seed)
+		self.done: set[int] = set() # Replayed points, as flat indexes in the C order of the lattice
+		self.start = 0 # Positions of the walk to skip
+		self.position = 0 # Positions of the walk gone through
+		self.outstanding: dict[int, int] = {} # Points handed out without a result: flat index -> position
+
+	def _flat(self, values: Sequence[int]) -> int|None:
+		point = self.lattice.index(values)
+		return None if point is None else int(np.ravel_multi_index(point, self.lattice.shape))
+
+	def _walk(self) -> Iterator[tuple[int, int, list[int]]]:
+		'''
+		(position, flat index, values) of the points to hand out, from :py:attr:`~start`
+		'''
+		raise NotImplementedError('Use a specific sampler')
+
+	def points(self) -> Iterator[list[int]]:
+		self.outstanding.clear()
+		for position, index, values in self._walk():
+			self.position = position + 1
+			self.outstanding[index] = position
+			yield values
+		self.position = self.lattice.size
+
+	def replay(self, values: Sequence[int], outcome: int) -> None:
+		index = self._flat(values)
+		if index is not None:
+			self.done.add(index)
+
+	def update(self, values: Sequence[int], outcome: int, cost: float|None = None) -> None:
+		index = self._flat(values)
+		if index is not None:
+			self.outstanding.pop(index, None)
+
+	def checkpoint(self) -> dict:
+		# Every point before this position has a result
+		return {'position': min(self.outstanding.values(), default=self.position)}
+
+	def resume(self, state: dict) -> None:
+		self.start = max(self.start, state.get('position', 0))
+
+class ExhaustiveSampler(_Walk):
+	'''
+	Every feasible point of the lattice exactly once, in a pseudo-random order (see
+	:py:class:`~FeistelPermutation`), then stops. Feasibility is checked point by point while
+	walking the permutation, so memory usage does not depend on the size of the lattice (it grows
+	with the replayed points only). The points rejected so far are counted in :py:attr:`~skipped`.
+	'''
+
+	def __init__(self, lattice: Lattice, seed: int|None = None):
+		super().__init__(lattice, seed)
+		self.checked = 0 # Points checked for feasibility by this run
+		self.skipped = 0 # Unfeasible ones among them
+
+	@property
+	def discarded(self) -> float:
+		'''
+		Share of the checked points that were unfeasible
+		'''
+		return self.skipped / self.checked if self.checked else 0.0
+
+	def _walk(self) -> Iterator[tuple[int, int, list[int]]]:
+		permutation = FeistelPermutation(self.lattice.size, self.seed)
+		for position in range(self.start, len(permutation)):
+			index = permutation[position]
+			if index in self.done:
+				continue
+			values = unravel(index, self.axes)
+			self.checked += 1
+			if not self.lattice.check(values):
+				self.skipped += 1
+				continue
+			yield position, index, values
+		if self.skipped:
+			print(f'Skipped {self.skipped} of {self.checked} glitch settings ({self.discarded:.1%}): the required voltage drops cannot be achieved')
+
+class SweepSampler(_Walk):
+	'''
+	Every feasible point of the lattice exactly once, in boustrophedon order (see
+	:py:class:`~SnakeOrder`), then stops. Consecutive points differ in as few parameters as
+	possible, so a glitcher that only sends the changed settings needs about one setter
+	round-trip per attempt instead of one per parameter. The expected number is stored in
+	:py:attr:`~round_trips` and printed.
+	'''
+
+	CHUNK = 4096 # Lattice points computed at a time
+
+	def __init__(self, lattice: Lattice, seed: int|None = None, order: Sequence[str]|None = None):
+		'''
+		Args:
+			lattice: Points to sample
+			seed: Unused, the order only depends on the lattice
+			order: Parameters from the slowest to the fastest changing (default: the last parameter changes slowest)
+		'''
+		super().__init__(lattice, seed)
+		self.order = list(order) if order else lattice.names[::-1]
+		if sorted(self.order) != sorted(lattice.names):
+			raise ValueError(f'The sweep order must list every parameter once, got {self.order}')
+		self.walk = SnakeOrder(lattice.shape, [lattice.names.index(name) for name in self.order])
+		self.round_trips: float|None = None # Expected setter round-trips per attempt
+
+	def _round_trips(self, flat: np.ndarray) -> float:
+		'''
+		Average number of parameters that change between two consecutive points of the walk
+		where `flat` (the raveled mask) is True
+		'''
+		changes, count, previous = 0, 0, None
+		for chunk in range(0, self.walk.size, self.CHUNK):
+			points = self.walk.points(chunk, chunk + self.CHUNK)
+			points = points[flat[np.ravel_multi_index(tuple(points.T), self.walk.shape)]]
+			if not len(points):
+				continue
+			changes += changed_coordinates(points, previous)
+			count += len(points)
+			previous = points[-1]
+		return changes / max(1, count - 1)
+
+	def _walk(self) -> Iterator[tuple[int, int, list[int]]]:
+		mask = self.lattice.mask
+		if self.done:
+			mask = mask.copy()
+			mask.flat[np.fromiter(self.done, dtype=np.int64, count=len(self.done))] = False
+			print(f'{np.count_nonzero(mask)} glitch settings left to attempt')
+		flat = mask.ravel()
+		self.round_trips = self._round_trips(flat)
+		print(f'Sweeping {", ".join(self.order)}: {self.round_trips:.2f} setter round-trips per attempt (random sampler: {random_round_trips(mask):.2f})')
+		for chunk in range(self.start, self.walk.size, self.CHUNK):
+			points = self.walk.points(chunk, chunk + self.CHUNK)
+			indexes = np.ravel_multi_index(tuple(points.T), mask.shape)
+			for row in np.flatnonzero(flat[indexes]).tolist():
+				yield chunk + row, int(indexes[row]), self.lattice.values(points[row].tolist())
+
+class _Cell:
+	'''
+	Box of the lattice, `bounds` are [lo, hi) index intervals on every axis
+	'''
+	__slots__ = ('bounds', 'depth', 'issued', 'attempts', 'hits', 'children')
+
+	def __init__(self, bounds: list[tuple[int, int]], depth: int):
+		self.bounds = bounds
+		self.depth = depth
+		self.issued = 0		# Points handed out, results may still be pending
+		self.attempts = 0
+		self.hits = 0
+		self.children: list['_Cell'] = []
+
+	def contains(self, point: Sequence[int]) -> bool:
+		return all(lo <= i < hi for i, (lo, hi) in zip(point, self.bounds))
+
+	@property
+	def splittable(self) -> bool:
+		return any(hi - lo > 1 for lo, hi in self.bounds)
+
+	def split(self) -> list['_Cell']:
+		'''
+		Halve every axis longer than one point
+		'''
+		self.children = [_Cell(bounds, self.depth + 1) for _, bounds in halves(self.bounds)]
+		return self.children
+
+class ZoomSampler(Sampler):
+	'''
+	Multi-resolution sampler: sweeps a coarse grid of cells, then recursively halves the cells whose
+	hit rate reaches `threshold` and concentrates the attempts on them. A share `explore` of the
+	attempts is always spent on uniformly random points of the whole lattice.
+	'''
+
+	CELLS = 4 # Default number of coarse cells along every axis
+	DRAW_TRIES = 64 # Random draws in a cell before giving up on finding a feasible point
+
+	def __init__(self, lattice: Lattice, seed: int|None = None, coarse: dict[str, int]|None = None, threshold: float = 0.02,
+			explore: float = 0.2, min_attempts: int = 20, max_depth: int = 4):
+		'''
+		Args:
+			lattice: Points to sample, cells without feasible ones are never swept
+			seed: Seed of the sampler
+			coarse: Lattice points per coarse cell for some parameters (default: :py:attr:`~CELLS` cells per axis)
+			threshold: Hit rate above which a cell is refined
+			explore: Share of attempts spent on random points of the whole lattice
+			min_attempts: Attempts in a cell before its hit rate is trusted
+			max_depth: Maximum number of refinements of a coarse cell
+		'''
+		super().__init__(lattice, seed)
+		self.mask = lattice.mask
+		self.coarse = [max(1, c) for c in lattice.cells(coarse, self.CELLS)]
+		self.threshold = threshold
+		self.explore = explore
+		self.min_attempts = min_attempts
+		self.max_depth = max_depth
+		self.rng = random.Random(seed)
+		self.roots: list[_Cell] = []
+		grid = [[]]
+		for axis, c in zip(self.axes, self.coarse):
+			grid = [g + [(lo, min(lo + c, len(axis)))] for g in grid for lo in range(0, len(axis), c)]
+		self.roots = [_Cell(bounds, 0) for bounds in grid]
+		self.sweep: list[_Cell] = [cell for cell in self.roots if self._feasible(cell)] # Cells that still need min_attempts points handed out
+		self.rng.shuffle(self.sweep)
+		self.promising: list[_Cell] = [] # Leaves with a hit rate above threshold
+
+	def _root(self, point: Sequence[int]) -> _Cell:
+		index = 0
+		for i, axis, c in zip(point, self.axes, self.coarse):
+			index = index * -(-len(axis) // c) + i // c
+		return self.roots[index]
+
+	def _leaf(self, point: Sequence[int]) -> _Cell:
+		cell = self._root(point)
+		while cell.children:
+			cell = next(child for child in cell.children if child.contains(point))
+		return cell
+
+	def _feasible(self, cell: _Cell) -> bool:
+		return bool(self.mask[tuple(slice(lo, hi) for lo, hi in cell.bounds)].any())
+
+	def _point_in(self, bounds: Sequence[tuple[int, int]]) -> list[int]:
+		for _ in range(self.DRAW_TRIES):
+			point = [self.rng.randrange(lo, hi) for lo, hi in bounds]
+			if self.mask[tuple(point)]:
+				break
+		return point
+
+	def _next(self) -> list[int]:
+		'''
+		Indexes of the next point to attempt, it may be unfeasible if its cell has few feasible points
+		'''
+		while self.sweep and (self.sweep[-1].issued >= self.min_attempts or self.sweep[-1].children):
+			self.sweep.pop() # Swept by results replayed with replay()
+		if self.sweep:
+			cell = self.sweep[-1]
+			cell.issued += 1
+			if cell.issued >= self.min_attempts:
+				self.sweep.pop()
+			return self._point_in(cell.bounds)
+		if self.promising and self.rng.random() >= self.explore:
+			weights = [(c.hits + 1) / (c.attempts + 2) for c in self.promising]
+			cell = self.rng.choices(self.promising, weights)[0]
+			cell.issued += 1
+			return self._point_in(cell.bounds)
+		return self._point_in([(0, len(axis)) for axis in self.axes])
+
+	def points(self) -> Iterator[list[int]]:
+		while True:
+			point = self._next()
+			if self.mask[tuple(point)]:
+				yield self.lattice.values(point)
+
+	def replay(self, values: Sequence[int], outcome: int) -> None:
+		point = self.lattice.index(values)
+		if point is not None:
+			self._leaf(point).issued += 1
+			self.update(values, outcome)
+
+	def update(self, values: Sequence[int], outcome: int, cost: float|None = None) -> None:
+		point = self.lattice.index(values)
+		if point is None:
+			return
+		cell = self._leaf(point)
+		cell.attempts += 1
+
+		cell.hits += outcome == self.HIT
+		if cell.attempts < self.min_attempts:
+			return
+		rate = cell.hits / cell.attempts
+		if rate < self.threshold:
+			if cell in self.promising:
+				self.promising.remove(cell)
+			return
+		if cell.depth < self.max_depth and cell.splittable:
+			if cell in self.promising:
+				self.promising.remove(cell)
+			children = [child for child in cell.split() if self._feasible(child)]
+			self.rng.shuffle(children)
+			self.sweep.extend(children)
+		elif cell not in self.promising:
+			self.promising.append(cell)
+
+	def checkpoint(self) -> dict:
+		return {'rng': self.rng.getstate()}
+
+	def resume(self, state: dict) -> None:
+		if 'rng' in state:
+			version, internal, gauss = state['rng']
+			self.rng.setstate((version, tuple(internal), gauss))
+
+class ThompsonSampler(Sampler):
+	'''
+	Bandit that maximises (half) successes per second. The lattice is covered by a grid of cells,
+	and every cell is halved along every axis up to `max_depth` times. Every cell keeps a Dirichlet
+	posterior over the outcome classes HIT, RESET and OTHER of the attempts that fell in it.
+	Each draw samples the probabilities of the coarse cells and picks the one with the highest
+	sampled hit probability / expected cost of an attempt, then descends the finer levels the same
+	way among the halves of the chosen one, and returns a random point of the finest cell.
+	Coarse cells are kept in a dense array, finer ones are only stored once attempted.
+
+	The cost of each outcome class is a moving average of the costs measured by the caller and
+	passed to :py:meth:`~update`, which include the recovery an attempt caused (e.g. a power cycle
+	after a RESET).
+	'''
+
+	CELLS = 4 # Default number of coarse cells along every axis
+	DRAW_TRIES = 64 # Random draws in a cell before giving up on finding a feasible point
+	COST_GAIN = 1 / 16	# Gain of the moving average of the outcome costs
+
+	def __init__(self, lattice: Lattice, seed: int|None = None, cell: dict[str, int]|None = None, costs: Sequence[float] = (0.02, 1.5, 0.02),
+			prior: Sequence[float] = (0.02, 0.5, 1.0), max_depth: int = 4):
+		'''
+		Args:
+			lattice: Points to sample, cells without feasible ones are never picked
+			seed: Seed of the sampler
+			cell: Lattice points per coarse cell for some parameters (default: :py:attr:`~CELLS` cells per axis)
+			costs: Initial cost of an attempt with a HIT, RESET and OTHER outcome (s)
+			prior: Dirichlet prior of every cell for HIT, RESET and OTHER, a low hit prior makes
+				the sampler drop barren cells faster
+			max_depth: Number of times coarse cells are halved
+		'''
+		super().__init__(lattice, seed)
+		self.mask = lattice.mask
+		self.cell = [max(1, c) for c in lattice.cells(cell, self.CELLS)] # Lattice points per coarse cell along every axis
+		self.shape = tuple(-(-len(axis) // c) for axis, c in zip(self.axes, self.cell))
+		self.fanout = 1 << len(self.axes) # A fine cell is keyed by the key of its parent * fanout + its bits (see halves())
+		self.rng = np.random.default_rng(seed)
+		self.prior = np.array(prior, dtype=np.float64)
+		self.coarse = np.tile(self.prior, (int(np.prod(self.shape)), 1))
+		self.fine: list[dict[int, np.ndarray]] = [{} for _ in range(max_depth)] # Counts of the cells of every finer level, by key
+		self.costs = np.array(costs, dtype=np.float64)
+		self.reachable = block_any(self.mask, self.cell).ravel() # Coarse cells with at least one feasible point
+		self._reachable: dict[tuple[int, int], bool] = {} # Same for the fine cells, by (level, key), filled on demand
+
+	def _coarse_bounds(self, index: int) -> list[tuple[int, int]]:
+		cell = np.unravel_index(index, self.shape)
+		return [(int(i) * c, min((int(i) + 1) * c, len(axis))) for i, c, axis in zip(cell, self.cell, self.axes)]
+
+	def _feasible(self, level: int, key: int, bounds: Sequence[tuple[int, int]]) -> bool:
+		if (level, key) not in self._reachable:
+			self._reachable[level, key] = bool(self.mask[tuple(slice(lo, hi) for lo, hi in bounds)].any())
+		return self._reachable[level, key]
+
+	def _best(self, counts: np.ndarray, reachable: np.ndarray) -> int:
+		draws = self.rng.gamma(counts)
+		draws /= draws.sum(axis=1, keepdims=True)
+		score = draws[:, self.HIT] / (draws @ self.costs)
+		score[~reachable] = -1
+		return int(np.argmax(score))
+
+	def _next(self) -> list[int]:
+		'''
+		Indexes of the next point to attempt, it may be unfeasible if its cell has few feasible points
+		'''
+		key = self._best(self.coarse, self.reachable)
+		bounds = self._coarse_bounds(key)
+		for level, fine in enumerate(self.fine):
+			children = halves(bounds)
+			if len(children) == 1:
+				break # Single point
+			keys = [key * self.fanout + bits for bits, _ in children]
+			counts = np.array([fine.get(k, self.prior) for k in keys])
+			reachable = np.array([self._feasible(level, k, box) for k, (_, box) in zip(keys, children)])
+			j = self._best(counts, reachable)
+			key, bounds = keys[j], children[j][1]
+		for _ in range(self.DRAW_TRIES):
+			point = [int(self.rng.integers(lo, hi)) for lo, hi in bounds]
+			if self.mask[tuple(point)]:
+				break
+		return point
+
+	def points(self) -> Iterator[list[int]]:
+		while True:
+			point = self._next()
+			if self.mask[tuple(point)]:
+				yield self.lattice.values(point)
+
+	def replay(self, values: Sequence[int], outcome: int) -> None:
+		self.update(values, outcome)
+
+	def update(self, values: Sequence[int], outcome: int, cost: float|None = None) -> None:
+		if cost is not None:
+			self.costs[outcome] += self.COST_GAIN * (cost - self.costs[outcome])
+		point = self.lattice.index(values)
+		if point is None:
+			return
+		key = 0
+		for i, c, n in zip(point, self.cell, self.shape):
+			key = key * n + i // c
+		self.coarse[key, outcome] += 1
+		bounds = self._coarse_bounds(key)
+		for fine in self.fine:
+			if all(hi - lo == 1 for lo, hi in bounds):
+				break # Single point
+			bits = 0
+			for axis, (i, (lo, hi)) in enumerate(zip(point, bounds)):
+				if hi - lo > 1:
+					mid = (lo + hi) // 2
+					bits |= (i >= mid) << axis
+					bounds[axis] = (mid, hi) if i >= mid else (lo, mid)
+			key = key * self.fanout + bits
+			if key not in fine:
+				fine[key] = self.prior.copy()
+			fine[key][outcome] += 1
+
+	def checkpoint(self) -> dict:
+		return {'rng': self.rng.bit_generator.state, 'costs': self.costs.tolist()}
+
+	def resume(self, state: dict) -> None:
+		if 'rng' in state:
+			self.rng.bit_generator.state = state['rng']
+			self.costs[:] = state['costs']
+
+# Samplers by name, see GlitchController.set_sampler()
+SAMPLER_TYPES: dict[str, type[Sampler]] = {
+	'random'		: RandomSampler,
+	'exhaustive'	: ExhaustiveSampler,
+	'sweep'			: SweepSampler,
+	'zoom'			: ZoomSampler,
+	'bandit'		: ThompsonSampler,
+}
+
+class ResetScheduler:
+	'''
+	Orders upcoming attempts by their probability of ending with a reset of the target, learned
+	per cell of a grid over the lattice (Beta posterior of resets vs other outcomes). Settings are
+	pulled from a sampler a window at a time and split in batches, safest first: a batch ends
+	with the setting that brings the probability that none of its attempts resets the target below
+	`survival`, so likely-safe settings run together in long batches and each likely-reset one ends
+	a batch, where a reset does not cut any other attempt. Every pulled setting is handed out
+	exactly once, the coverage of the sampler does not change.
+	'''
+
+	CELLS = 8 # Default number of cells along every axis
+	COST_GAIN = 1 / 16 # Gain of the moving averages of the costs
+
+	def __init__(self, lattice: Lattice, window: int = 256, survival: float = 0.1, cell: dict[str, int]|None = None,
+			prior: Sequence[float] = (0.5, 4.5), costs: Sequence[float] = (0.02, 1.5)):
+		'''
+		Args:
+			lattice: Points the settings are drawn from, its mask is not used
+			window: Settings pulled from the sampler and ordered together
+			survival: A batch is closed once the probability that it runs without a reset drops below this
+			cell: Lattice points per cell for some parameters (default: :py:attr:`~CELLS` cells per axis)
+			prior: Beta prior of every cell (resets, other outcomes)
+			costs: Initial cost of an attempt and of a target reset (s), see :py:meth:`~observe_attempts`
+				and :py:meth:`~observe_reset`
+		'''
+		self.lattice = lattice
+		self.cell = [max(1, c) for c in lattice.cells(cell, self.CELLS)]
+		self.shape = tuple(-(-n // c) for n, c in zip(lattice.shape, self.cell))
+		self.window = window
+		self.survival = survival
+		self.counts = np.tile(np.array(prior, dtype=np.float64), (int(np.prod(self.shape)), 1))
+		self.attempt_cost, self.reset_cost = costs
+		self.expected_reset = prior[0] / sum(prior) # Mean reset probability of the last window
+
+	def _index(self, values: Sequence[int]) -> int|None:
+		point = self.lattice.index(values)
+		if point is None:
+			return None
+		index = 0
+		for i, c, n in zip(point, self.cell, self.shape):
+			index = index * n + i // c
+		return index
+
+	def p_reset(self, values: Sequence[int]) -> float:
+		'''
+		Estimated probability that an attempt with these values ends with a reset
+		'''
+		index = self._index(values)
+		if index is None:
+			return self.expected_reset
+		resets, others = self.counts[index]
+		return resets / (resets + others)
+
+	@property
+	def expected_cost(self) -> float:
+		'''
+		Expected cost of an attempt of the last window, including the resets it causes (s)
+		'''
+		return self.attempt_cost + self.expected_reset * self.reset_cost
+
+	def plan(self, items: Iterator[T], key: Callable[[T], Sequence[int]], batch_size: int) -> Iterator[list[T]]:
+		'''
+		Batches of at most `batch_size` items, ordered by increasing reset probability
+
+		Args:
+			items: Settings to attempt, e.g. from a sampler
+			key: Values of every axis of an item
+			batch_size: Maximum length of a batch
+		'''
+		while True:
+			window = list(islice(items, self.window))
+			if not window:
+				return
+			risks = [self.p_reset(key(item)) for item in window]
+			self.expected_reset = sum(risks) / len(risks)
+			batch: list[T] = []
+			survival = 1.0
+			for j in sorted(range(len(window)), key=risks.__getitem__):
+				if batch and (len(batch) == batch_size or survival < self.survival):
+					yield batch
+					batch = []
+					survival = 1.0
+				batch.append(window[j])
+				survival *= 1 - risks[j]
+			yield batch
+
+	def update(self, values: Sequence[int], reset: bool) -> None:
+		'''
+		Report the outcome of an attempt
+
+		Args:
+			values: Values of every axis
+			reset: The target had to be reset after the attempt
+		'''
+		index = self._index(values)
+		if index is not None:
+			self.counts[index, 0 if reset else 1] += 1
+
+	def observe_attempts(self, elapsed: float, count: int) -> None:
+		'''
+		Account for `count` attempts that took `elapsed` seconds overall
+		'''
+		if count:
+			self.attempt_cost += self.COST_GAIN * (elapsed / count - self.attempt_cost)
+
+	def observe_reset(self, elapsed: float) -> None:
+		'''
+		Account for a target reset that took `elapsed` seconds
+		'''
+		self.reset_cost += self.COST_GAIN * (elapsed - self.reset_cost)
+
+	def checkpoint(self) -> dict:
+		'''
+		Learned costs, to restore with :py:meth:`~resume`. JSON serializable.
+		'''
+		return {'costs': [self.attempt_cost, self.reset_cost]}
+
+	def resume(self, state: dict) -> None:
+		'''
+		Restore the costs saved with :py:meth:`~checkpoint`
+		'''
+		if 'costs' in state:
+			self.attempt_cost, self.reset_cost = state['costs']
@@ -0,0 +1,125 @@
+'''
+Serial timeouts that adapt to the observed response times of the glitcher.
+'''
+
+from math import ceil
+
+__all__ = ['PING_VCORE_STABLE_TIME', 'TARGET_REACHABLE', 'CRASH_INFO_TIMEOUT', 'SLOW_TARGET_FACTOR', 'READ_SLICE', 'AdaptiveTimeout', 'TimeoutPolicy']
+
+# Mirrors of the firmware timings (see glitch.h)
+PING_VCORE_STABLE_TIME	= 0.35	# Time the glitcher waits before answering a ping to a live target (s)
+TARGET_REACHABLE		= 0.009	# If the target is silent for this long, the glitcher considers it dead (s)
+CRASH_INFO_TIMEOUT		= 1.0	# Maximum duration of the crash info stream after P_CMD_RESULT_ANSI_CTRL_CODE (s)
+
+SLOW_TARGET_FACTOR = 4 # Multiplier of the boot time for targets with `is_slow`
+
+READ_SLICE = 0.005 # Timeout of each read on the serial port (s), reads are repeated until their own deadline
+
+class AdaptiveTimeout:
+	'''
+	Timeout for one kind of answer from the glitcher, estimated online from the response times
+	with the smoothed mean + 4 * mean deviation rule used for TCP retransmissions (RFC 6298),
+	within [floor, ceiling]. When the timeout expires it is doubled (capped at `ceiling`).
+	'''
+
+	ALPHA = 1 / 8	# Gain of the smoothed response time
+	BETA = 1 / 4	# Gain of the mean deviation
+	K = 4			# Deviations above the mean
+	GRANULARITY = 0.005 # Values are rounded up to this (s)
+
+	def __init__(self, initial: float, floor: float, ceiling: float):
+		'''
+		Args:
+			initial: Timeout until the first answer is observed (s)
+			floor: Lowest timeout (s)
+			ceiling: Highest timeout (s), only an answer that is already arriving is waited for up to this
+		'''
+		self.floor = floor
+		self.ceiling = ceiling
+		self.srtt: float|None = None
+		self.rttvar = 0.0
+		self.value = self._bound(initial)
+
+	def _bound(self, value: float) -> float:
+		value = ceil(value / self.GRANULARITY) * self.GRANULARITY
+		return min(max(value, self.floor), self.ceiling)
+
+	def set_bounds(self, floor: float, ceiling: float) -> None:
+		'''
+		Change the range of the timeout, the current value is brought within it
+
+		Args:
+			floor: Lowest timeout (s)
+			ceiling: Highest timeout (s)
+		'''
+		self.floor = floor
+		self.ceiling = ceiling
+		self.value = self._bound(self.value)
+
+	def observe(self, elapsed: float) -> None:
+		'''
+		Account for an answer received `elapsed` seconds after the command was sent
+		'''
+		if self.srtt is None:
+			self.srtt = elapsed
+			self.rttvar = elapsed / 2
+		else:
+			self.rttvar += self.BETA * (abs(self.srtt - elapsed) - self.rttvar)
+			self.srtt += self.ALPHA * (elapsed - self.srtt)
+		self.value = self._bound(self.srtt + self.K * self.rttvar)
+
+	def expired(self) -> None:
+		'''
+		Account for an answer that did not arrive in time
+		'''
+		self.value = self._bound(self.value * 2)
+
+	def __repr__(self) -> str:
+		srtt = f'{self.srtt * 1000:.1f}ms' if self.srtt is not None else '-'
+		return f'AdaptiveTimeout({self.value * 1000:.0f}ms, srtt {srtt}, floor {self.floor * 1000:.0f}ms, ceiling {self.ceiling * 1000:.0f}ms)'
+
+class TimeoutPolicy:
+	'''
+	Timeouts of all the glitcher answers for one target type, none above the fixed timeouts used
+	before they adapted:
+		- command: plain commands, only the host <-> glitcher round-trip (ping, setters)
+		- target_ping: P_CMD_TARGET_PING(_SLOW)
+		- measure_loop: P_CMD_MEASURE_LOOP_DURATION
+		- glitch: result of a glitch attempt (P_CMD_ARM*, and every record of a batch)
+		- chunk: each chunk of the crash info stream
+		- boot: time for the target to answer pings after a power cycle, learned by
+		  :py:meth:`~Picocoder.ping_target`
+	'''
+
+	def __init__(self, is_slow: bool, default: float):
+		'''
+		Args:
+			is_slow: The target is slow (see :py:attr:`~Target.is_slow`)
+			default: Timeout the glitcher was opened with (s), upper bound for plain commands
+		'''
+		slow = SLOW_TARGET_FACTOR if is_slow else 1
+		self.default = default
+		self.command = AdaptiveTimeout(default, 0.02, default)
+		self.target_ping = AdaptiveTimeout(0.5, PING_VCORE_STABLE_TIME + 0.05, 0.5)
+		self.measure_loop = AdaptiveTimeout(2.0, 0.05, 2.0)
+		self.glitch = AdaptiveTimeout(default, 0.05, default)
+		# The gaps of the crash info stream depend on what the target prints, do not learn them
+		self.chunk = AdaptiveTimeout(default, min(CRASH_INFO_TIMEOUT, default), default)
+		self.boot = AdaptiveTimeout(1.5 * slow, 2 * PING_VCORE_STABLE_TIME, 6.0 * slow)
+
+	def set_loop_duration(self, loop_duration: int) -> None:
+		'''
+		Derive the floor of the glitch timeout from the measured loop duration: the glitcher waits
+		for the trigger (the target sends it at least every TARGET_REACHABLE), up to a loop for the
+		glitch, then a few TARGET_REACHABLE periods for the target answer.
+
+		Args:
+			loop_duration: Duration of a target loop iteration (in us), see :py:meth:`~Picocoder.measure_loop_duration`
+		'''
+		if loop_duration <= 0:
+			return
+		expected = loop_duration / 1e6 + 4 * TARGET_REACHABLE
+		self.glitch.set_bounds(min(max(expected, 0.05), self.default), self.default)
+
+	def __repr__(self) -> str:
+		return '\n'.join(f'{name}: {getattr(self, name)!r}' for name in ('command', 'target_ping', 'measure_loop', 'glitch', 'chunk', 'boot'))
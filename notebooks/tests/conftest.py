@@ -0,0 +1,54 @@
+'''
+Fixtures serving the virtual picocoder (see `picocoder_client/emulator.py`) on pseudo-terminals
+'''
+
+from typing import Callable, Iterator
+
+import pytest
+
+from picocoder_client import Picocoder, TargetMul, PROTOCOL_VERSION
+from picocoder_client.emulator import EmulatedTarget, PicocoderEmulator, TargetProfile, TARGET_PROFILES
+
+def profile(**weights: float) -> TargetProfile:
+	'''
+	Profile of the `mul` target that only produces the given outcomes (see :py:attr:`~TargetProfile.weights`)
+	'''
+	base = TARGET_PROFILES[TargetMul]
+	return TargetProfile(base.normal, base.success, weights=weights)
+
+@pytest.fixture
+def emulator() -> Iterator[Callable[..., PicocoderEmulator]]:
+	'''
+	Factory of emulated glitchers answering as fast as possible, closed at the end of the test
+
+	Args:
+		profile: Behavior of the target (default: the `mul` entry of :py:attr:`~TARGET_PROFILES`)
+		seed: Seed of the glitch outcomes (default 1)
+		protocol: Protocol version of the emulated firmware (default: the current one)
+	'''
+	started: list[PicocoderEmulator] = []
+	def start(profile: TargetProfile|None = None, seed: int = 1, protocol: int = PROTOCOL_VERSION) -> PicocoderEmulator:
+		device = PicocoderEmulator(EmulatedTarget(TargetMul(), profile), time_scale=0, seed=seed, protocol=protocol)
+		device.start()
+		started.append(device)
+		return device
+	yield start
+	for device in started:
+		device.close()
+
+@pytest.fixture
+def glitcher(emulator) -> Iterator[Callable[..., Picocoder]]:
+	'''
+	Factory of :py:class:`~Picocoder` connected to a new emulated glitcher, same arguments as `emulator`
+	'''
+	opened: list[Picocoder] = []
+	def connect(profile: TargetProfile|None = None, seed: int = 1, protocol: int = PROTOCOL_VERSION) -> Picocoder:
+		device = emulator(profile, seed, protocol)
+		ret = Picocoder(device.port)
+		ret.tc = TargetMul()
+		ret.emulator = device # type: ignore
+		opened.append(ret)
+		return ret
+	yield connect
+	for g in opened:
+		g.s.close()
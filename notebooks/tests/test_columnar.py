@@ -0,0 +1,38 @@
+'''
+Parquet export of a campaign and the filtered reads of its columns
+'''
+
+import sqlite3
+
+import pytest
+
+pytest.importorskip('pyarrow')
+
+import columnar
+from picocoder_client import GlitchResult
+
+from test_db import campaign_db
+
+def test_export_round_trip(tmp_path):
+	campaign_db(tmp_path / 'campaign.db')
+	conn = sqlite3.connect(tmp_path / 'campaign.db')
+	assert columnar.export_campaign(conn, 'mul_campaign', tmp_path / 'out', chunk_size=16, rows_per_file=40) == 100
+	conn.close()
+	assert len(list(columnar.campaign_dir(tmp_path / 'out', 'mul_campaign').glob('part-*.parquet'))) == 3
+
+	columns = columnar.load_columns(tmp_path / 'out', 'mul_campaign')
+	assert list(columns) == ['ext_offset', 'width', 'voltage', 'prep_voltage', 'result', 'data', 'fault_count']
+	assert columns['ext_offset'].tolist() == list(range(100))
+	assert columns['width'].tolist() == [i % 5 for i in range(100)]
+	assert columns['result'].tolist() == ['NORMAL' if i % 3 else 'WEIRD' for i in range(100)]
+	assert columns['fault_count'].tolist() == [i % 2 if i % 3 else 0 for i in range(100)] # Missing values read as 0
+
+	weird = columnar.load_columns(tmp_path / 'out', 'mul_campaign', ['ext_offset', 'data'],
+		filters=[('result', '==', 'WEIRD'), ('ext_offset', '<', 50)])
+	assert weird['ext_offset'].tolist() == list(range(0, 50, 3))
+	assert set(weird['data'].tolist()) == {b'R'}
+
+	names, rows = columnar.load_rows(tmp_path / 'out', 'mul_campaign', exclude=GlitchResult.WEIRD)
+	rows = list(rows)
+	assert names == list(columns) and len(rows) == 66
+	assert rows[0] == (1, 1, 30, 42, 'NORMAL', b'', 1)
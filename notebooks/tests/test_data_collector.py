@@ -0,0 +1,66 @@
+'''
+Acquisition loops of the data collector against an emulated rig
+'''
+
+from argparse import Namespace
+import sqlite3
+
+from data_collector import GlitchSQLite, glitch_loop, make_controller
+from picocoder_client import KA3305P, GlitchResult, PhaseTimer, TargetMul, RESET_RESULTS
+from picocoder_client.emulator import KA3305PEmulator
+
+from conftest import profile
+
+RANGES = Namespace(ext_offset=[0, 100, 10], width=[10, 30, 10], voltage=[30, 40, 2], prep_voltage=[42, 42, 1],
+	sampler='exhaustive', sampler_seed=1, sweep_order=None)
+
+def test_glitch_loop_timings(glitcher, tmp_path):
+	g = glitcher(profile(normal=12, reset=1, ansi=1, success=1))
+	db = GlitchSQLite(str(tmp_path / 'campaign.db'), 'test', '', '')
+	db.create_campaign(TargetMul())
+	timer = PhaseTimer()
+	with KA3305PEmulator(g.emulator.target) as device:
+		ps = KA3305P(device.port, cycle_wait=0)
+		ps.con()
+		assert glitch_loop(db, ps, make_controller(RANGES), g, False, True, timer) == 0
+		ps.dis()
+	counts = {result.name: n for result, n in db.result_counts().items()}
+	db.close()
+
+	# The attempt that stopped the campaign is timed too
+	assert counts[GlitchResult.SUCCESS.name] == 1
+	for phase in ('setup', 'glitch', 'readback', 'insert', 'controller'):
+		assert {result: h.count for result, h in timer.histograms[phase].items()} == counts
+	assert {result: h.count for result, h in timer.histograms['reset'].items()} == \
+		{result.name: counts[result.name] for result in RESET_RESULTS if result.name in counts}
+
+def test_interrupted_loop_stores_queued_results(glitcher, tmp_path, monkeypatch):
+	g = glitcher(profile(normal=1))
+	db_file = str(tmp_path / 'campaign.db')
+	db = GlitchSQLite(db_file, 'test', '', '')
+	db.create_campaign(TargetMul())
+	db.start_writer(commit_rows=10**6, commit_interval=60)
+	lock = sqlite3.connect(db_file, isolation_level=None)
+	lock.execute('BEGIN IMMEDIATE') # The writer thread blocks on its first row
+	glitch = g.glitch
+	depths = []
+	def interrupted(gs):
+		if len(depths) == 20:
+			lock.execute('COMMIT')
+			raise KeyboardInterrupt
+		depths.append(db.queue_depth)
+		return glitch(gs)
+	monkeypatch.setattr(g, 'glitch', interrupted)
+	with KA3305PEmulator(g.emulator.target) as device:
+		ps = KA3305P(device.port, cycle_wait=0)
+		ps.con()
+		assert glitch_loop(db, ps, make_controller(RANGES), g, False, False) == 0
+		ps.dis()
+	assert depths[-1] >= 18 # Queued behind the blocked row
+	db.close()
+	lock.close()
+
+	conn = sqlite3.connect(db_file)
+	assert conn.execute('SELECT COUNT(*) FROM attempts').fetchone() == (20, )
+	assert conn.execute('SELECT runtime FROM campaigns').fetchone()[0] > 0
+	conn.close()
@@ -0,0 +1,151 @@
+'''
+Database tools: conversion of legacy databases and merges of databases
+'''
+
+from argparse import Namespace
+import hashlib
+import sqlite3
+
+import pytest
+
+from data_collector import GlitchSQLite, attempt_uuid
+import merge_db
+import migrate_db
+from picocoder_client import GlitchResult, TargetMul
+
+def legacy_db(path, name: str = 'mul_campaign', rows: int = 100) -> None:
+	'''
+	Database in the legacy one-table-per-campaign layout
+	'''
+	conn = sqlite3.connect(path)
+	conn.execute('CREATE TABLE settings (table_name TEXT, settings TEXT, extra TEXT)')
+	conn.execute('CREATE TABLE runtimes (table_name TEXT, runtime REAL)')
+	conn.execute(f'CREATE TABLE {name} (ext_offset INTEGER, width INTEGER, voltage INTEGER, prep_voltage INTEGER, result TEXT, data BLOB, fault_count INTEGER)')
+	conn.execute('INSERT INTO settings VALUES (?, ?, ?)', (name, 'ext_offset=0:99(1),width=0:4(1),voltage=30,prep_voltage=42', 'test'))
+	conn.execute('INSERT INTO runtimes VALUES (?, ?)', (name, 12.5))
+	conn.executemany(f'INSERT INTO {name} VALUES (?, ?, ?, ?, ?, ?, ?)',
+		[(i, i % 5, 30, 42, 'NORMAL' if i % 3 else 'WEIRD', b'' if i % 3 else b'R', i % 2) for i in range(rows)])
+	conn.commit()
+	conn.close()
+
+def campaign_db(path, name: str = 'mul_campaign', rows: int = 100) -> None:
+	'''
+	Database with one campaign, filled as the data collector does
+	'''
+	db = GlitchSQLite(str(path), name, 'ext_offset=0:99(1)', 'test')
+	db.create_campaign(TargetMul())
+	for i in range(rows):
+		db.insert_result(TargetMul(), i, i % 5, 30, 42, GlitchResult.NORMAL if i % 3 else GlitchResult.WEIRD, (i % 2, ) if i % 3 else b'R')
+	db.set_runtime(10.0)
+	db.close()
+
+def attempts(path) -> list[tuple]:
+	conn = sqlite3.connect(path)
+	ret = conn.execute('SELECT c.name, a.ext_offset, a.width, a.result, a.data, a.ret0, a.uuid FROM attempts a JOIN campaigns c ON c.id = a.campaign ORDER BY a.rowid').fetchall()
+	conn.close()
+	return ret
+
+def migrate(src, dst) -> int:
+	return migrate_db.main(Namespace(src=str(src), dst=str(dst), chunk_size=16))
+
+def test_migrate(tmp_path):
+	legacy_db(tmp_path / 'legacy.db')
+	assert migrate(tmp_path / 'legacy.db', tmp_path / 'a.db') == 0
+	rows = attempts(tmp_path / 'a.db')
+	assert len(rows) == 100
+	assert rows[1][4:6] == (None, 1) and rows[3][4:6] == (b'R', None) # NORMAL with its value, WEIRD with its data
+	# The uuids only depend on the legacy table
+	assert rows[0][-1] == attempt_uuid(migrate_db.campaign_key('mul_campaign', 'ext_offset=0:99(1),width=0:4(1),voltage=30,prep_voltage=42', 'test'), 1, 0, 0, 30, 42)
+	assert migrate(tmp_path / 'legacy.db', tmp_path / 'b.db') == 0
+	assert attempts(tmp_path / 'b.db') == rows
+
+	db = GlitchSQLite(str(tmp_path / 'a.db'), 'mul_campaign', '', '')
+	assert db.count_rows() == 100
+	assert db.c.execute('SELECT runtime, checkpoint FROM campaigns').fetchone() == (12.5, None)
+	db.close()
+
+def test_migrate_interrupted(tmp_path, monkeypatch):
+	legacy_db(tmp_path / 'legacy.db')
+	calls = 0
+	def failing(*args):
+		nonlocal calls
+		calls += 1
+		if calls > 50:
+			raise ValueError('Interrupted')
+		return attempt_uuid(*args)
+	original = GlitchSQLite.__init__
+	def init(self, *args):
+		original(self, *args)
+		self.conn.create_function('attempt_uuid', 6, failing)
+	monkeypatch.setattr(GlitchSQLite, '__init__', init)
+	with pytest.raises(sqlite3.OperationalError):
+		migrate(tmp_path / 'legacy.db', tmp_path / 'a.db')
+	monkeypatch.undo()
+
+	# No partial campaign is left behind, the conversion is completed by running it again
+	assert attempts(tmp_path / 'a.db') == []
+	assert migrate(tmp_path / 'legacy.db', tmp_path / 'a.db') == 0
+	assert len(attempts(tmp_path / 'a.db')) == 100
+
+def merge(dst, *src, campaigns: list[str] = []) -> int:
+	return merge_db.main(Namespace(dst=str(dst), src=[str(path) for path in src], campaigns=campaigns, chunk_size=16))
+
+def digest(path) -> str:
+	return hashlib.sha256(path.read_bytes()).hexdigest()
+
+def test_merge(tmp_path):
+	# Two rigs attempting the same settings in the same order
+	campaign_db(tmp_path / 'rig1.db')
+	campaign_db(tmp_path / 'rig2.db')
+	sources = {path: digest(path) for path in (tmp_path / 'rig1.db', tmp_path / 'rig2.db')}
+	assert merge(tmp_path / 'merged.db', *sources) == 0
+	rows = attempts(tmp_path / 'merged.db')
+	assert len(rows) == 200
+	assert sorted(rows) == sorted(attempts(tmp_path / 'rig1.db') + attempts(tmp_path / 'rig2.db'))
+	assert {path: digest(path) for path in sources} == sources # Attached read-only
+
+	# Merging again copies nothing, into a larger destination the indexes are kept
+	assert merge(tmp_path / 'merged.db', tmp_path / 'rig1.db') == 0
+	campaign_db(tmp_path / 'rig3.db', rows=10)
+	assert merge(tmp_path / 'merged.db', tmp_path / 'rig3.db') == 0
+	db = GlitchSQLite(str(tmp_path / 'merged.db'), 'mul_campaign', '', '')
+	assert db.count_rows() == 210
+	assert db.result_counts() == {GlitchResult.NORMAL: 138, GlitchResult.WEIRD: 72}
+	assert db.c.execute('SELECT runtime FROM campaigns').fetchone() == (30.0, )
+	indexes = {name for (name, ) in db.c.execute('SELECT name FROM sqlite_master WHERE type="index" AND tbl_name="attempts"')}
+	assert {'attempts_by_result', 'attempts_by_settings', 'attempts_by_uuid'} <= indexes
+	db.close()
+
+def test_merge_migrated(tmp_path):
+	legacy_db(tmp_path / 'legacy.db')
+	migrate(tmp_path / 'legacy.db', tmp_path / 'a.db')
+	migrate(tmp_path / 'legacy.db', tmp_path / 'b.db')
+	assert merge(tmp_path / 'merged.db', tmp_path / 'a.db', tmp_path / 'b.db') == 0
+	assert attempts(tmp_path / 'merged.db') == attempts(tmp_path / 'a.db')
+
+def test_merge_refuses_legacy(tmp_path):
+	legacy_db(tmp_path / 'legacy.db')
+	before = digest(tmp_path / 'legacy.db')
+	assert merge(tmp_path / 'merged.db', tmp_path / 'legacy.db') == 1
+	assert digest(tmp_path / 'legacy.db') == before
+	assert not (tmp_path / 'merged.db').exists()
+
+def test_rollups(tmp_path):
+	db = GlitchSQLite(str(tmp_path / 'a.db'), 'mul_campaign', 'ext_offset=0:99(1)', 'test')
+	db.create_campaign(TargetMul())
+	for value in (4, -2, 7):
+		db.insert_result(TargetMul(), 5, 1, 30, 42, GlitchResult.NORMAL, (value, ))
+	db.insert_result(TargetMul(), 5, 1, 30, 42, GlitchResult.NORMAL, b'') # No return values
+	db.insert_result(TargetMul(), 5, 1, 30, 42, GlitchResult.WEIRD, b'R')
+	db.insert_result(TargetMul(), 6, 1, 30, 42, GlitchResult.NORMAL, (3, ))
+	query = 'SELECT ext_offset, result, count, returned, ret0_min, ret0_max, ret0_sum FROM rollups ORDER BY ext_offset, result'
+	rows = db.c.execute(query).fetchall()
+	normal, weird = (db.c.execute('SELECT code FROM result_codes WHERE name=?', (result.name, )).fetchone()[0] for result in (GlitchResult.NORMAL, GlitchResult.WEIRD))
+	assert sorted(rows) == sorted([(5, normal, 4, 3, -2, 7, 9), (5, weird, 1, 0, None, None, 0), (6, normal, 1, 1, 3, 3, 3)])
+	assert db.count_rows() == 6
+	assert db.result_counts() == {GlitchResult.NORMAL: 5, GlitchResult.WEIRD: 1}
+
+	# The trigger agrees with the roll-ups computed from the attempts
+	db.rebuild_rollups()
+	assert db.c.execute(query).fetchall() == rows
+	db.close()
@@ -0,0 +1,60 @@
+'''
+Campaigns on several emulated rigs: every glitch setting is stored once, also when a rig fails
+'''
+
+from argparse import Namespace
+import json
+from pathlib import Path
+import sqlite3
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from data_collector import make_controller
+
+RANGES = {
+	'ext_offset': [0, 200, 50],
+	'width': [10, 50, 20],
+	'voltage': [30, 40, 2],
+	'prep_voltage': [42, 42, 1],
+}
+
+def feasible() -> set[tuple]:
+	gc = make_controller(Namespace(**RANGES, sampler='exhaustive', sampler_seed=1, sweep_order=None))
+	lattice = gc.lattice()
+	grid = np.meshgrid(*[np.asarray(axis) for axis in lattice.axes], indexing='ij')
+	return set(zip(*[g[lattice.mask].tolist() for g in grid]))
+
+def orchestrator(db_file: Path, *extra: str, stdin: bytes = b'') -> subprocess.CompletedProcess:
+	args = [sys.executable, 'orchestrator.py', str(db_file), 'test', 'mul', '--emulate', '2', '--time-scale', '0', '--seed', '1',
+		'--sampler', 'exhaustive', '--cycle-wait', '0', '--chunk-size', '4', *extra]
+	for param, values in RANGES.items():
+		args += [f'--{param.replace("_", "-")}'] + [str(v) for v in values]
+	return subprocess.run(args, cwd=Path(__file__).parent.parent, input=stdin, capture_output=True, timeout=120)
+
+def check_campaign(db_file: Path) -> None:
+	conn = sqlite3.connect(db_file)
+	stored = conn.execute('SELECT ext_offset, width, voltage, prep_voltage FROM attempts').fetchall()
+	(checkpoint, ) = conn.execute('SELECT checkpoint FROM campaigns').fetchone()
+	conn.close()
+	assert len(stored) == len(set(stored))
+	assert set(stored) == feasible()
+	assert json.loads(checkpoint)['results'] == len(stored)
+
+@pytest.mark.parametrize('broken_rig', [False, True])
+def test_exhaustive_campaign(tmp_path, broken_rig):
+	db_file = tmp_path / 'campaign.db'
+	extra = ['--rig', f'{tmp_path / "missing"},{tmp_path / "missing"}'] if broken_rig else [] # Its settings go to the emulated rigs
+	ret = orchestrator(db_file, *extra)
+	assert ret.returncode == (1 if broken_rig else 0), ret.stderr.decode()
+	check_campaign(db_file)
+
+def test_resumed_campaign(tmp_path):
+	db_file = tmp_path / 'campaign.db'
+	ret = orchestrator(db_file, '--iterations', '10')
+	assert ret.returncode == 0, ret.stderr.decode()
+	ret = orchestrator(db_file, stdin=b'y\n')
+	assert ret.returncode == 0, ret.stderr.decode()
+	check_campaign(db_file)
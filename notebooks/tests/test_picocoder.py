@@ -0,0 +1,148 @@
+'''
+Picocoder client against the emulated glitcher: every way of arming and every kind of result
+'''
+
+import time
+
+import pytest
+
+from picocoder_client import GlitchResult, Picocoder, Target, TargetMul
+from picocoder_client.emulator import EmulatedTarget, PicocoderEmulator, TARGET_PROFILES
+
+from conftest import profile
+
+SETTINGS = [
+	{'ext_offset': 100 + i, 'width': 50 + i % 7, 'voltage': 30 + i % 3, 'prep_voltage': 42}
+	for i in range(64)
+]
+MUL = TARGET_PROFILES[TargetMul]
+
+def test_glitch(glitcher):
+	g = glitcher(profile(normal=1, success=1))
+	results = [g.glitch(gs) for gs in SETTINGS]
+	assert {result for result, _ in results} == {GlitchResult.NORMAL, GlitchResult.SUCCESS}
+	for result, data in results:
+		assert data == (MUL.success if result == GlitchResult.SUCCESS else MUL.normal)
+	emulated = g.emulator
+	assert (emulated.ext_offset, emulated.width, emulated.voltage, emulated.prep_voltage) == tuple(SETTINGS[-1].values())
+
+def test_glitch_per_setter(glitcher):
+	g = glitcher(profile(normal=1))
+	g.fast_arm = False
+	for gs in SETTINGS[:8]:
+		assert g.glitch(gs) == (GlitchResult.NORMAL, MUL.normal)
+		emulated = g.emulator
+		assert (emulated.ext_offset, emulated.width, emulated.voltage, emulated.prep_voltage) == tuple(gs.values())
+
+def test_old_firmware(glitcher):
+	g = glitcher(profile(normal=1), protocol=0)
+	for gs in SETTINGS[:8]:
+		assert g.glitch(gs) == (GlitchResult.NORMAL, MUL.normal)
+		emulated = g.emulator
+		assert (emulated.ext_offset, emulated.width, emulated.voltage, emulated.prep_voltage) == tuple(gs.values())
+	assert g.protocol == 0 and g.fast_arm is False
+	with pytest.raises(NotImplementedError):
+		g.read_state()
+	with pytest.raises(ValueError):
+		g.glitch_batch(SETTINGS[:2])
+	assert g.glitch(SETTINGS[8]) == (GlitchResult.NORMAL, MUL.normal)
+
+def test_old_firmware_fast_arm(glitcher):
+	g = glitcher(profile(normal=1), protocol=0)
+	g.fast_arm = True
+	with pytest.raises(ValueError):
+		g.glitch(SETTINGS[0])
+
+def test_read_state(glitcher):
+	g = glitcher(profile(normal=1))
+	g.glitch(SETTINGS[3])
+	g.clear()
+	assert g.read_state() == SETTINGS[3]
+	assert g.verify_state()
+
+def test_refused_settings(glitcher):
+	g = glitcher(profile(normal=1))
+	with pytest.raises(ValueError):
+		g.glitch({**SETTINGS[0], 'voltage': 0xFF})
+	assert g.glitch(SETTINGS[0]) == (GlitchResult.NORMAL, MUL.normal)
+
+def test_zombie(glitcher):
+	g = glitcher(profile(zombie=1))
+	assert g.glitch(SETTINGS[0]) == (GlitchResult.WEIRD, b'R')
+
+def test_ansi_crash_stream(glitcher):
+	g = glitcher(profile(ansi=1))
+	result, data = g.glitch(SETTINGS[0])
+	assert result == GlitchResult.WEIRD
+	assert data.startswith(b'\x1b[0m[ERROR]') and data.endswith(b'Halting\n')
+	assert len(data) % len(b'\x1b[0m[ERROR]  Unexpected Exception: 6 @ 10:000a0ecd - Halting\n') == 0
+	# The whole stream was consumed, the target is now dead
+	assert g.glitch(SETTINGS[1]) == (GlitchResult.BROKEN, b'\x54')
+
+def test_glitch_batch(glitcher):
+	g = glitcher(profile(normal=4, success=1, zombie=1, data_timeout=1))
+	results = g.glitch_batch(SETTINGS)
+	assert len(results) == len(SETTINGS)
+	assert {result for result, _ in results} == {GlitchResult.NORMAL, GlitchResult.SUCCESS, GlitchResult.WEIRD}
+	for result, data in results:
+		if result == GlitchResult.NORMAL:
+			assert data == MUL.normal
+		elif result == GlitchResult.SUCCESS:
+			assert data == MUL.success
+		else:
+			assert data in (b'R', None)
+
+class TargetSilent(Target):
+	'''
+	Target that returns no values
+	'''
+
+	op_name = 'silent'
+
+	def is_success(self, from_target: tuple) -> bool:
+		return False
+
+def test_glitch_batch_without_values(glitcher):
+	g = glitcher(profile(normal=1, zombie=1))
+	g.tc = TargetSilent()
+	results = g.glitch_batch(SETTINGS)
+	assert len(results) == len(SETTINGS)
+	assert set(results) == {(GlitchResult.NORMAL, ()), (GlitchResult.WEIRD, b'R')}
+
+def test_glitch_batch_stops_at_reset(glitcher):
+	g = glitcher(profile(normal=8, reset=1))
+	results = g.glitch_batch(SETTINGS)
+	assert 0 < len(results) < len(SETTINGS)
+	assert results[-1] == (GlitchResult.RESET, None)
+	assert all(result == GlitchResult.NORMAL for result, _ in results[:-1])
+	# The glitcher keeps the settings of the last attempt
+	assert g.read_state() == SETTINGS[len(results) - 1]
+
+def test_glitch_batch_ansi(glitcher):
+	g = glitcher(profile(normal=4, ansi=1))
+	results = g.glitch_batch(SETTINGS)
+	result, data = results[-1]
+	assert result == GlitchResult.WEIRD and data.endswith(b'Halting\n')
+	assert g.ping()
+
+def test_glitch_batch_refused(glitcher):
+	g = glitcher(profile(normal=1))
+	with pytest.raises(ValueError):
+		g.glitch_batch([{**SETTINGS[0], 'prep_voltage': 0xFF}])
+	assert g.glitch_batch(SETTINGS[:2]) == [(GlitchResult.NORMAL, MUL.normal)] * 2
+
+def test_silent_glitcher():
+	device = PicocoderEmulator(EmulatedTarget(TargetMul()), time_scale=0) # Not started: nothing answers
+	g = Picocoder(device.port)
+	g.tc = TargetMul()
+	timeout = g.timeouts.command
+	timeout.value = 0.1
+	try:
+		for expected in (0.1, 0.2):
+			start = time.perf_counter()
+			assert not g.ping()
+			assert expected <= time.perf_counter() - start < expected + 0.1 # Not up to the ceiling
+			assert timeout.value == pytest.approx(2 * expected)
+	finally:
+		g.s.close()
+		device.close()
@@ -0,0 +1,78 @@
+'''
+asyncio client against the emulated glitcher
+'''
+
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip('serial_asyncio')
+
+from picocoder_client import GlitchResult, TargetMul
+from picocoder_client.emulator import EmulatedTarget, PicocoderEmulator, TARGET_PROFILES
+from picocoder_client.picocoder_async import AsyncPicocoder
+
+from conftest import profile
+from test_picocoder import SETTINGS
+
+MUL = TARGET_PROFILES[TargetMul]
+
+async def run(port: str, fast_arm: bool|None = None) -> list:
+	g = await AsyncPicocoder.open(port)
+	g.tc = TargetMul()
+	g.fast_arm = fast_arm
+	try:
+		return [await g.glitch(gs) for gs in SETTINGS[:16]]
+	finally:
+		g.close()
+
+def test_glitch(emulator):
+	device = emulator(profile(normal=1, success=1, zombie=1))
+	results = asyncio.run(run(device.port))
+	assert {result for result, _ in results} == {GlitchResult.NORMAL, GlitchResult.SUCCESS, GlitchResult.WEIRD}
+	for result, data in results:
+		if result == GlitchResult.WEIRD:
+			assert data == b'R'
+	assert (device.ext_offset, device.width, device.voltage, device.prep_voltage) == tuple(SETTINGS[15].values())
+
+def test_glitch_per_setter(emulator):
+	device = emulator(profile(normal=1))
+	assert asyncio.run(run(device.port, fast_arm=False)) == [(GlitchResult.NORMAL, MUL.normal)] * 16
+	assert (device.ext_offset, device.width, device.voltage, device.prep_voltage) == tuple(SETTINGS[15].values())
+
+def test_old_firmware(emulator):
+	device = emulator(profile(normal=1), protocol=0)
+	assert asyncio.run(run(device.port)) == [(GlitchResult.NORMAL, MUL.normal)] * 16
+	assert (device.ext_offset, device.width, device.voltage, device.prep_voltage) == tuple(SETTINGS[15].values())
+
+def test_ansi_crash_stream(emulator):
+	device = emulator(profile(ansi=1))
+	results = asyncio.run(run(device.port))
+	result, data = results[0]
+	assert result == GlitchResult.WEIRD and data.endswith(b'Halting\n')
+	assert results[1:] == [(GlitchResult.BROKEN, b'\x54')] * 15
+
+async def silent_pings(port: str) -> list[tuple[float, float]]:
+	g = await AsyncPicocoder.open(port)
+	g.tc = TargetMul()
+	g.timeouts.command.value = 0.1
+	ret = []
+	try:
+		for _ in range(2):
+			start = time.perf_counter()
+			assert not await g.ping()
+			ret.append((time.perf_counter() - start, g.timeouts.command.value))
+	finally:
+		g.close()
+	return ret
+
+def test_silent_glitcher():
+	device = PicocoderEmulator(EmulatedTarget(TargetMul()), time_scale=0) # Not started: nothing answers
+	try:
+		waits = asyncio.run(silent_pings(device.port))
+	finally:
+		device.close()
+	for (elapsed, value), expected in zip(waits, (0.1, 0.2)):
+		assert expected <= elapsed < expected + 0.1 # Not up to the ceiling
+		assert value == pytest.approx(2 * expected)
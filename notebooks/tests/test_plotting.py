@@ -0,0 +1,52 @@
+'''
+Live plot of a result store, without an interactive backend
+'''
+
+import matplotlib
+matplotlib.use('Agg')
+
+from picocoder_client import GlitchResult, ResultStore
+from picocoder_client import plotting
+from picocoder_client.plotting import LivePlot
+
+def test_live_plot_rate_limit(monkeypatch):
+	now = 100.0
+	monkeypatch.setattr(plotting.time, 'monotonic', lambda: now)
+	store = ResultStore(['ext_offset', 'width'], list(GlitchResult))
+	plot = LivePlot(store, 'ext_offset', 'width', max_fps=5, max_points=100)
+	refreshes = 0
+	def refresh():
+		nonlocal refreshes
+		refreshes += 1
+		LivePlot.refresh(plot)
+	monkeypatch.setattr(plot, 'refresh', refresh)
+	def points(result: GlitchResult) -> list[tuple[int, int]]:
+		x, y = plot.lines[store.classes.index(result)].get_data()
+		return list(zip(x.tolist(), y.tolist()))
+
+	for i in range(10):
+		store.add({'ext_offset': i, 'width': 1}, GlitchResult.NORMAL if i % 2 else GlitchResult.SUCCESS)
+		plot.update()
+	assert refreshes == 1 and plot.dirty # The calls within the interval were dropped
+	assert points(GlitchResult.SUCCESS) == [(0, 1)]
+
+	now += plot.interval
+	store.add({'ext_offset': 10, 'width': 2}, GlitchResult.RESET)
+	plot.update()
+	assert refreshes == 2 and not plot.dirty
+	assert points(GlitchResult.SUCCESS) == [(i, 1) for i in range(0, 10, 2)]
+	assert points(GlitchResult.NORMAL) == [(i, 1) for i in range(1, 10, 2)]
+	assert points(GlitchResult.RESET) == [(10, 2)]
+
+	# Only the latest max_points of a class are drawn
+	for i in range(2000):
+		store.add({'ext_offset': i, 'width': 3}, GlitchResult.NORMAL)
+	now += plot.interval
+	plot.update()
+	assert points(GlitchResult.NORMAL) == [(i, 3) for i in range(1900, 2000)]
+	assert plot.ax.get_xlim()[1] >= 1999
+
+	store.clear()
+	plot.redraw()
+	assert points(GlitchResult.NORMAL) == []
+	plot.close()
@@ -0,0 +1,32 @@
+'''
+PMIC model and the feasibility of glitch settings derived from it
+'''
+
+from itertools import product
+
+import numpy as np
+import pytest
+
+from picocoder_client import GlitchControllerTPS65094, TPS65094
+
+def test_tps65094():
+	assert TPS65094.to_mv([0, 1, 42, 127]).tolist() == [0, 500, 910, 1760]
+	with pytest.raises(ValueError):
+		TPS65094.to_mv(128)
+
+	# (36us transmit + 10us) * 3mV/us = 138mV
+	assert TPS65094.swing(10) == 138
+	assert TPS65094.reachable(1240, [1110, 1100, 1370, 1380], 10).tolist() == [True, False, True, False]
+	assert TPS65094.reachable(1240, 1100, np.array([[10], [20]])).tolist() == [[False], [True]]
+	assert TPS65094.min_reachable_mv([1240, 100], 10).tolist() == [1102, 0]
+	assert TPS65094.required_time(1240, 910) == 38 and TPS65094.required_time(910, 1240) == 38
+
+def test_feasibility_mask():
+	gc = GlitchControllerTPS65094(['NORMAL'], ['ext_offset', 'width', 'voltage', 'prep_voltage'], nominal_voltage=1.24)
+	axes = [range(0, 200, 20), range(10, 100, 10), range(1, 40, 3), range(30, 43, 4)]
+	mask = gc.feasibility_mask(axes)
+	assert mask.shape == tuple(len(axis) for axis in axes)
+	assert 0 < np.count_nonzero(mask) < mask.size
+	for index in product(*[range(len(axis)) for axis in axes]):
+		gs = dict(zip(gc.params, [axis[i] for axis, i in zip(axes, index)]))
+		assert mask[index] == gc.check_settings(gs) # type: ignore
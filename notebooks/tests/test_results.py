@@ -0,0 +1,37 @@
+'''
+Columnar result store: growth, column types and the list-like interface
+'''
+
+import numpy as np
+import pytest
+
+from picocoder_client import GlitchResult, ResultStore
+
+def test_result_store():
+	store = ResultStore(['ext_offset', 'width'], list(GlitchResult), capacity=2)
+	for i in range(10):
+		if i % 3 == 0:
+			store.add({'ext_offset': i, 'width': -i}, GlitchResult.WEIRD, b'R' * i)
+		elif i % 3 == 1:
+			store.add({'ext_offset': i, 'width': -i}, GlitchResult.NORMAL, (i, 2**32 - 1))
+		else:
+			store.add({'ext_offset': i, 'width': -i}, GlitchResult.RESET)
+	assert len(store) == 10 and store._capacity == 16 # Doubled when full
+
+	assert store.column('width').dtype == np.int32 and store.column('width').tolist() == [-i for i in range(10)]
+	assert store.codes.dtype == np.uint8 and store.values.dtype == np.uint32
+	assert store.mask(GlitchResult.NORMAL).tolist() == [i % 3 == 1 for i in range(10)]
+	assert store.kinds.tolist() == [[ResultStore.BLOB, ResultStore.VALUES, ResultStore.NONE][i % 3] for i in range(10)]
+	assert store[4] == ({'ext_offset': 4, 'width': -4}, GlitchResult.NORMAL, (4, 2**32 - 1))
+	assert store[-1] == ({'ext_offset': 9, 'width': -9}, GlitchResult.WEIRD, b'R' * 9)
+	assert store[0][2] == b'' and store[2][2] is None
+	assert list(store)[1:3] == store[1:3]
+	with pytest.raises(IndexError):
+		store[10]
+	with pytest.raises(ValueError):
+		store.add({'ext_offset': 0, 'width': 0}, GlitchResult.NORMAL, (1, 2, 3))
+
+	store.clear()
+	assert len(store) == 0 and list(store) == []
+	store.append(({'ext_offset': 1, 'width': 1}, GlitchResult.SUCCESS, b'ok'))
+	assert store[0] == ({'ext_offset': 1, 'width': 1}, GlitchResult.SUCCESS, b'ok')
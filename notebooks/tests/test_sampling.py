@@ -0,0 +1,146 @@
+'''
+Samplers of the GlitchController: coverage of the finite ones across interruptions
+'''
+
+from itertools import islice
+import json
+
+import numpy as np
+import pytest
+
+from picocoder_client import GlitchControllerTPS65094, GlitchResult
+from picocoder_client.sampling import Lattice, ResetScheduler, ThompsonSampler, halves
+
+RANGES = {
+	'ext_offset': (0, 200, 20),
+	'width': (10, 100, 10),
+	'voltage': (1, 40, 1),
+	'prep_voltage': (30, 42, 4),
+}
+
+def controller(sampler: str, seed: int|None = None) -> GlitchControllerTPS65094:
+	gc = GlitchControllerTPS65094([r.name for r in GlitchResult], list(RANGES), nominal_voltage=1.24)
+	for param, (start, end, step) in RANGES.items():
+		gc.set_range(param, start, end)
+		gc.set_step(param, step)
+	gc.set_sampler(sampler, seed)
+	return gc
+
+def feasible(gc: GlitchControllerTPS65094) -> set[tuple]:
+	lattice = gc.lattice()
+	grid = np.meshgrid(*[np.asarray(axis) for axis in lattice.axes], indexing='ij')
+	return set(zip(*[g[lattice.mask].tolist() for g in grid]))
+
+def key(gs) -> tuple:
+	return tuple(gs[param] for param in RANGES)
+
+@pytest.mark.parametrize('sampler', ['exhaustive', 'sweep'])
+@pytest.mark.parametrize('seed', [None, 7])
+def test_resume_covers_every_setting(sampler, seed):
+	gc = controller(sampler, seed)
+	expected = feasible(gc)
+	history = []
+	values = gc.glitch_values()
+	drawn = list(islice(values, 300))
+	for gs in drawn[:290]: # The last ones were handed out but the run stopped before their results
+		gc.add_result(gs, GlitchResult.NORMAL)
+		history.append((gs, GlitchResult.NORMAL))
+	checkpoint = json.loads(json.dumps(gc.checkpoint())) # As stored in the database
+
+	gc = controller(sampler, seed) # Same command line, e.g. without --sampler-seed
+	gc.resume(checkpoint, iter(history))
+	rest = [key(gs) for gs in gc.glitch_values()]
+	assert len(rest) == len(set(rest))
+	attempted = {key(gs) for gs, _ in history}
+	assert attempted.isdisjoint(rest)
+	assert attempted | set(rest) == expected
+
+def test_exhaustive_seed():
+	first = [key(gs) for gs in islice(controller('exhaustive', 3).glitch_values(), 50)]
+	assert first == [key(gs) for gs in islice(controller('exhaustive', 3).glitch_values(), 50)]
+	gc = controller('exhaustive')
+	values = list(islice(gc.glitch_values(), 50))
+	assert gc.seed is not None and gc.checkpoint()['seed'] == gc.seed
+	assert [key(gs) for gs in values] == [key(gs) for gs in islice(controller('exhaustive', gc.seed).glitch_values(), 50)]
+
+@pytest.mark.parametrize('sampler', ['random', 'bandit'])
+def test_resume_continues_draws(sampler):
+	gc = controller(sampler, 5)
+	values = gc.glitch_values()
+	history = [(gs, GlitchResult.SUCCESS if i % 7 == 0 else GlitchResult.NORMAL) for i, gs in enumerate(islice(values, 200))]
+	for gs, result in history:
+		gc.add_result(gs, result)
+	checkpoint = json.loads(json.dumps(gc.checkpoint()))
+	expected = [key(gs) for gs in islice(values, 50)]
+
+	gc = controller(sampler)
+	gc.resume(checkpoint, iter(history))
+	assert [key(gs) for gs in islice(gc.glitch_values(), 50)] == expected
+
+def test_bandit_cells_halve_their_parent():
+	axes = [range(0, 201, 20), range(10, 101, 10), range(1, 41), range(30, 43, 4)]
+	shape = tuple(len(axis) for axis in axes)
+	lattice = Lattice(list(RANGES), axes, lambda: np.ones(shape, dtype=bool), lambda values: True)
+	bandit = ThompsonSampler(lattice, 1, cell={'ext_offset': 5, 'width': 3, 'voltage': 13, 'prep_voltage': 3})
+	rng = np.random.default_rng(2)
+	for point in rng.integers(0, shape, size=(200, len(shape))).tolist():
+		bandit.update(lattice.values(point), ThompsonSampler.HIT)
+		key = int(np.ravel_multi_index([i // c for i, c in zip(point, bandit.cell)], bandit.shape))
+		bounds = bandit._coarse_bounds(key)
+		for fine in bandit.fine:
+			children = halves(bounds)
+			if len(children) == 1:
+				break
+			bits, bounds = next(child for child in children if all(lo <= i < hi for i, (lo, hi) in zip(point, child[1])))
+			key = key * bandit.fanout + bits
+			assert fine[key][ThompsonSampler.HIT] >= 1
+
+def test_bandit_learns_given_costs():
+	gc = controller('bandit', 1)
+	values = gc.glitch_values()
+	drawn = list(islice(values, 100))
+	bandit = gc.active
+	assert isinstance(bandit, ThompsonSampler)
+	initial = bandit.costs.copy()
+	for gs in drawn: # Back to back, as bulk callers do
+		gc.add_result(gs, GlitchResult.NORMAL)
+	assert (bandit.costs == initial).all() # No measured cost, nothing learned
+	for gs in islice(values, 200):
+		gc.add_result(gs, GlitchResult.RESET, cost=3.0)
+	assert bandit.costs[ThompsonSampler.RESET] == pytest.approx(3.0, rel=0.01)
+	assert bandit.costs[ThompsonSampler.OTHER] == initial[ThompsonSampler.OTHER]
+
+def test_exhaustive_counts_skipped(capsys):
+	reference = controller('exhaustive', 3)
+	expected = feasible(reference)
+	assert 0 < reference.discarded < 1
+
+	gc = controller('exhaustive', 3)
+	values = gc.glitch_values()
+	drawn = list(islice(values, 100))
+	gc.checkpoint()
+	assert gc.discarded == gc.active.skipped / gc.active.checked
+	drawn += list(values)
+	assert {key(gs) for gs in drawn} == expected
+	assert gc.active.checked == gc.lattice().size and gc.active.skipped == gc.lattice().size - len(expected)
+	assert gc.discarded == pytest.approx(reference.discarded)
+	assert f'Skipped {gc.active.skipped} of {gc.active.checked} glitch settings' in capsys.readouterr().out
+
+def test_reset_scheduler_batches():
+	lattice = Lattice(['x'], [range(16)], lambda: np.ones(16, dtype=bool), lambda values: True)
+	scheduler = ResetScheduler(lattice, window=16, survival=0.1, cell={'x': 8})
+	for _ in range(50):
+		scheduler.update([1], False)
+		scheduler.update([9], True)
+	assert scheduler.p_reset([0]) < 0.01 and scheduler.p_reset([15]) > 0.9
+	items = [[i] for i in range(16)]
+
+	# Safe settings first and together, each likely reset ends a batch
+	batches = list(scheduler.plan(iter(items), lambda values: values, batch_size=16))
+	assert [len(batch) for batch in batches] == [9] + [1] * 7
+	assert sorted(x for (x, ) in batches[0][:8]) == list(range(8)) and batches[0][8][0] >= 8
+	assert sorted(item for batch in batches for item in batch) == items # Every setting exactly once
+	assert scheduler.expected_reset == pytest.approx((scheduler.p_reset([0]) + scheduler.p_reset([15])) / 2)
+
+	batches = list(scheduler.plan(iter(items), lambda values: values, batch_size=4))
+	assert [len(batch) for batch in batches] == [4, 4, 1, 1, 1, 1, 1, 1, 1, 1]